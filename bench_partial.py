@@ -0,0 +1,37 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+# Host cost of a partial refresh on the epd4in2 (UC8176) against the size of
+# the refreshed rectangle. Runs on the null backend, so the numbers are the
+# time spent in Python extracting the old and new regions and handing them to
+# the transport, without any SPI or BUSY time:
+#
+#     python bench_partial.py [repeats]
+
+import os, sys, time
+
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, 'lib'))
+
+from waveshare_epd import epdconfig, packing, panels
+
+# (width, height) in pixels of the rectangles timed, up to the whole panel
+SIZES = [(8, 8), (32, 16), (64, 64), (128, 100), (200, 150), (400, 300)]
+
+def main(repeats):
+    epdconfig.select_backend('null')
+    epd = panels.create('epd4in2')
+    frame = bytes(packing.linewidth(epd.width) * epd.height)
+    print("%10s %8s %12s %12s" % ("region", "bytes", "us/update", "ns/byte"))
+    for width, height in SIZES:
+        rect = (0, 0, width, height)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            epd.EPD_4IN2_PartialDisplay(*rect, frame)
+        elapsed = (time.perf_counter() - start) / repeats
+        size = packing.linewidth(width) * height
+        print("%10s %8d %12.1f %12.2f" % ("%dx%d" % (width, height), size,
+                                          elapsed * 1e6, elapsed * 1e9 / size))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
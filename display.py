@@ -1,31 +1,114 @@
 # -*- coding:utf-8 -*-
 
 from PIL import Image, ImageDraw, ImageFont
-import math
+from waveshare_epd import bmp, dither, packing, panels
+import io, math
 
-def text(text, epd, font):
-    image = Image.new('1', (epd.height, epd.width), 255)
+import render_cache
+
+# encoded images larger than this many bytes, or whose header announces more
+# pixels, are refused before decoding (set_image_limits())
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 24 * 1000 * 1000
+
+class ImageTooLarge(ValueError):
+    pass
+
+def set_image_limits(max_pixels, max_bytes):
+    global MAX_IMAGE_PIXELS, MAX_IMAGE_BYTES
+    MAX_IMAGE_PIXELS = int(max_pixels)
+    MAX_IMAGE_BYTES = int(max_bytes)
+
+# `screen` is the refresh.Screen of the panel
+def text(text, screen, font):
+    image = Image.new('1', canvas_size(screen), 255)
     draw = ImageDraw.Draw(image)
     draw.text((0, 0), text, font=font, fill=0)
-    upside_down(image, epd)
+    show(image, screen)
 
-def upside_down(image, epd):
-    image = image.rotate(180)
-    epd.display(epd.getbuffer(image))
+# `dither_mode`, here and below, overrides the screen's dither mode for one
+# image, see waveshare_epd.dither.MODES
+def show(image, screen, dither_mode=None):
+    screen.display(frame(image, screen, dither_mode))
 
-def scale_image_letterboxed(image, new_width, new_height):
+# size of the images drawn for the screen: its panel's native width x height,
+# or height x width when the orientation turns them by 90 or 270 degrees
+def canvas_size(screen):
+    epd = screen.epd
+    if screen.orientation[0] in (90, 270):
+        return epd.height, epd.width
+    return epd.width, epd.height
+
+# the dither mode an image is drawn with on the screen
+def dither_mode_of(screen, dither_mode=None):
+    if dither_mode is None:
+        return screen.dither_mode
+    dither.check(dither_mode)
+    return dither_mode
+
+# the frame buffers epd.display() takes for `image`, an image of
+# canvas_size(screen) turned by the screen's orientation; the color planes of
+# two-plane (black/red) panels are left empty.
+# The image is dithered to the panel's colors once. 1 bit images need no
+# dithering and are turned and packed in one pass. With floyd-steinberg, the
+# drivers' own dithering, landscape images are handed to getbuffer() turned
+# to landscape, and it dithers them and turns them the last 90 degrees in the
+# order it always did, so the frames are the ones it always gave. The other
+# modes dither after one transpose to the panel's orientation, and
+# getbuffer() passes the dithered image through. Frames for a panel's 4-gray
+# mode are always dithered here, the drivers only round to the nearest level.
+def frame(image, screen, dither_mode=None):
+    epd = screen.epd
+    rotation, mirror = screen.orientation
+    panel = panels.of(epd)
+    dither_mode = dither_mode_of(screen, dither_mode)
+    if screen.gray:
+        method = packing.transpose_method(rotation, mirror)
+        if method is not None:
+            image = image.transpose(method)
+        return [epd.getbuffer_4Gray(dither.apply(image, panel, dither_mode, gray=True))]
+    if panel.bits == 1 and epd.PACKED_1BPP and image.mode == '1':
+        return blank_planes(packing.pack_1bpp_oriented(image, rotation, mirror), screen)
+    own = dither_mode == dither.DRIVER_MODE
+    if own and rotation in (90, 270) and epd.width != epd.height and epd.TURNS_LANDSCAPE:
+        rotation -= 90
+    method = packing.transpose_method(rotation, mirror)
+    if method is not None:
+        image = image.transpose(method)
+    if not own:
+        image = dither.apply(image, panel, dither_mode)
+    return blank_planes(epd.getbuffer(image), screen)
+
+# the frame buffers for the black/white buffer `buf`, with the empty color
+# planes of two-plane panels after it
+def blank_planes(buf, screen):
+    epd = screen.epd
+    panel = panels.of(epd)
+    buffers = [buf]
+    if panel.planes > 1:
+        if epd.PACKED_1BPP:
+            blank = packing.solid(0xFF, packing.linewidth(epd.width) * epd.height)
+        else:
+            blank = epd.getbuffer(Image.new('1', (epd.width, epd.height), 255))
+        buffers += [blank] * (panel.planes - 1)
+    return buffers
+
+# size an image of `size` is scaled to so that it fits new_width x new_height,
+# at least 1 pixel each way
+def letterboxed_size(size, new_width, new_height):
+    width, height = size
     # first compute the scale factor based on the height
-    scaleFactor = new_height / image.height
+    scaleFactor = new_height / height
 
     # if the height-based scale factor would result in a width that is still too
     # large, update the scale factor to be based on the width
-    if math.trunc(image.width * scaleFactor) > new_width:
-        scaleFactor = new_width / image.width
+    if math.trunc(width * scaleFactor) > new_width:
+        scaleFactor = new_width / width
 
-    image = image.resize((
-        math.trunc(image.width * scaleFactor),
-        math.trunc(image.height * scaleFactor)
-    ))
+    return max(1, math.trunc(width * scaleFactor)), max(1, math.trunc(height * scaleFactor))
+
+def scale_image_letterboxed(image, new_width, new_height):
+    image = image.resize(letterboxed_size(image.size, new_width, new_height))
 
     # if we ended up with an image the exact desired dimensions, just return it.
     # otherwise, we need to paste the scaled image into the center of a new
@@ -33,7 +116,11 @@ def scale_image_letterboxed(image, new_width, new_height):
     if image.width == new_width and image.height == new_height:
         return image
 
-    newImage = Image.new('1', (new_width, new_height), 255)
+    # white margins in the image's own mode, so the image is only dithered
+    # in frame()
+    if image.mode not in ('1', 'L', 'RGB'):
+        image = image.convert('RGB')
+    newImage = Image.new(image.mode, (new_width, new_height), 'white')
 
     newImage.paste(image, (
         math.trunc((new_width / 2) - (image.width / 2)),
@@ -42,13 +129,85 @@ def scale_image_letterboxed(image, new_width, new_height):
 
     return newImage
 
-# scale, rotate, and put put the image on the screen
-def image_full(image, epd):
-    if image.height != 122 or image.width != 250:
-            image = scale_image_letterboxed(image, 250, 122)
-    epd.init()
-    upside_down(image, epd)
-    epd.sleep()
+# scale, rotate, and put put the image on the screen. `screen` is the
+# refresh.Screen of the panel, which decides between a full and a partial
+# refresh and, through its power.PowerManager, when it needs init() and sleep()
+def image_full(image, screen, dither_mode=None):
+    show(fit(image, screen), screen, dither_mode)
+
+# `image` letterboxed to the canvas of the screen
+def fit(image, screen):
+    width, height = canvas_size(screen)
+    if image.height != height or image.width != width:
+            image = scale_image_letterboxed(image, width, height)
+    return image
+
+# render_cache key of the frame the encoded image `bytes` gives on the screen
+def frame_key(bytes, screen, dither_mode=None):
+    return render_cache.key(bytes, screen.panel.name, screen.orientation,
+                            dither_mode_of(screen, dither_mode))
+
+# like image_full() for an encoded image. With a render_cache.RenderCache the
+# packed frame is looked up by content first and stored after rendering.
+# Returns the cache key, None without a cache.
+def image_from_bytes(bytes, screen, cache=None, dither_mode=None):
+    check_bytes(bytes)
+    if cache is None:
+        screen.display(render(bytes, screen, dither_mode))
+        return None
+    key = frame_key(bytes, screen, dither_mode)
+    buffers = cache.get(key)
+    if buffers is None:
+        buffers = cache.put(key, render(bytes, screen, dither_mode))
+    screen.display(list(buffers))
+    return key
+
+# the frame buffers for an encoded image. 1 bit BMPs of the canvas size are
+# unpacked straight from the payload into the panel's packed layout
+# (waveshare_epd.bmp), they need no dithering; anything else is decoded by
+# PIL, letterboxed, dithered and packed by frame().
+def render(bytes, screen, dither_mode=None):
+    epd = screen.epd
+    if panels.of(epd).bits == 1 and epd.PACKED_1BPP:
+        width, height = canvas_size(screen)
+        buf = bmp.decode_1bpp(memoryview(bytes), width, height, *screen.orientation)
+        if buf is not None:
+            return blank_planes(buf, screen)
+    return frame(fit(decode(bytes, screen), screen), screen, dither_mode)
+
+# raises ImageTooLarge for an encoded image of more than MAX_IMAGE_BYTES
+def check_bytes(bytes):
+    if len(bytes) > MAX_IMAGE_BYTES:
+        raise ImageTooLarge("Image of %d bytes, at most %d are accepted"
+                            % (len(bytes), MAX_IMAGE_BYTES))
+
+# the encoded image `bytes` opened by PIL with only its header read; raises
+# ImageTooLarge when it is beyond MAX_IMAGE_BYTES or MAX_IMAGE_PIXELS
+def open_image(bytes):
+    check_bytes(bytes)
+    try:
+        image = Image.open(io.BytesIO(bytes))
+    except Image.DecompressionBombError as error:
+        # beyond twice Pillow's own limit, which it checks before ours
+        raise ImageTooLarge(str(error))
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge("Image of %dx%d pixels, at most %d are accepted"
+                            % (image.width, image.height, MAX_IMAGE_PIXELS))
+    return image
 
-def image_from_bytes(bytes, epd):
-    image_full(Image.open(io.BytesIO(bytes)), epd)
\ No newline at end of file
+# the encoded image `bytes` decoded at no more than about the size it is
+# letterboxed to on the screen: JPEGs are decoded scaled down by up to 8 (and
+# in grayscale for 1bpp panels) with draft(), what is still at least twice the
+# size is reduced by the largest integer factor that keeps it at least that
+# large, leaving a less than 2x resize to fit()
+def decode(bytes, screen):
+    image = open_image(bytes)
+    width, height = letterboxed_size(image.size, *canvas_size(screen))
+    if image.format == 'JPEG':
+        image.draft('L' if panels.of(screen.epd).bits == 1 else 'RGB', (width, height))
+    factor = min(image.width // width, image.height // height)
+    # reduce() has no 1 bit, palette or 16 bit integer variant, fit() resizes
+    # those on its own
+    if factor > 1 and image.mode not in ('1', 'P') and not image.mode.startswith('I;16'):
+        image = image.reduce(factor)
+    return image
@@ -0,0 +1,110 @@
+# /*****************************************************************************
+# * | File        :	  bmp.py
+# * | Function    :   Fast path for 1-bit BMP images
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Date        :   2026-10-18
+# * | Info        :
+# ******************************************************************************
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import struct
+
+from . import packing
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# compression of uncompressed BMPs
+BI_RGB = 0
+
+
+def header(data):
+    """Parse the headers of a BMP image
+
+    Returns (width, height, bits per pixel, compression, offset of the pixel
+    data, palette as a list of (r, g, b)), height negative for top-down
+    images, or None if `data` does not start like a BMP.
+    """
+    if len(data) < 26 or bytes(data[0:2]) != b'BM':
+        return None
+    offset, size = struct.unpack_from('<II', data, 10)
+    if size == 12:
+        # BITMAPCOREHEADER, 3 byte palette entries
+        width, height, planes, bits = struct.unpack_from('<HHHH', data, 18)
+        compression, colors, entry = BI_RGB, 0, 3
+    elif size >= 40 and len(data) >= 14 + 40:
+        width, height, planes, bits, compression = struct.unpack_from('<iiHHI', data, 18)
+        colors = struct.unpack_from('<I', data, 46)[0]
+        entry = 4
+    else:
+        return None
+    palette = []
+    if bits <= 8:
+        start = 14 + size
+        for index in range(colors or 1 << bits):
+            if start + (index + 1) * entry > len(data):
+                return None
+            b, g, r = struct.unpack_from('<BBB', data, start + index * entry)
+            palette.append((r, g, b))
+    return width, height, bits, compression, offset, palette
+
+
+def _luma(color):
+    # what Image.convert('L') makes of an RGB color
+    r, g, b = color
+    return (r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16
+
+
+def decode_1bpp(data, width, height, rotation=0, mirror=False):
+    """Pack an uncompressed 1 bit BMP of exactly width x height, turned by an orientation
+
+    `data` is the encoded BMP (bytes or a memoryview, not copied). The rows
+    are read in place, bottom-up or top-down, their padding dropped and the
+    palette applied, then they are turned and packed like
+    packing.pack_1bpp_oriented() does, in one pass.
+    Returns the packed frame, or None when the image needs the general path:
+    another size or format, a palette other than black and white, or no NumPy.
+    """
+    if np is None:
+        return None
+    info = header(data)
+    if info is None:
+        return None
+    bmp_width, bmp_height, bits, compression, offset, palette = info
+    if bits != 1 or compression != BI_RGB or bmp_width != width or abs(bmp_height) != height:
+        return None
+    levels = [_luma(color) for color in palette[:2]]
+    if sorted(levels) != [0, 255]:
+        return None
+    stride = (width + 31) // 32 * 4
+    if offset + stride * height > len(data):
+        return None
+    rows = np.frombuffer(data, np.uint8, stride * height, offset).reshape(height, stride)
+    if bmp_height > 0:
+        rows = rows[::-1]
+    pixels = np.unpackbits(rows, axis=1, count=width)
+    if levels[0] == 255:
+        # index 0 is white
+        pixels ^= 1
+    return packing.pack_pixels_oriented(pixels, rotation, mirror)
@@ -0,0 +1,207 @@
+# /*****************************************************************************
+# * | File        :	  controller.py
+# * | Function    :   Base classes for the e-Paper controller families
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Date        :   2026-10-18
+# * | Info        :
+# ******************************************************************************
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import logging
+from . import epdconfig
+from . import packing
+
+logger = logging.getLogger(__name__)
+
+class Controller:
+    """Transport shared by every driver.
+
+    The drivers' EPD classes derive from one of the family classes below and
+    only set the class attributes that differ for their panel.
+    """
+    # reset pulse: high for RESET_MS[0], then RESET_PULSES times low for
+    # RESET_MS[1] and high for RESET_MS[2]
+    RESET_MS = (200, 2, 200)
+    RESET_PULSES = 1
+    # BUSY pin level while the controller is busy and the poll interval
+    BUSY_LEVEL = 1
+    BUSY_POLL_MS = 100
+    # command sent before and while polling BUSY (0x71 get status), None for none
+    BUSY_COMMAND = None
+    # delay after BUSY is released
+    BUSY_SETTLE_MS = 0
+    # RAM write opcodes, black/white plane first
+    RAM = ()
+    # getbuffer() of a width x height image gives packing.pack_1bpp()'s layout
+    # (1 = white, MSB first), so frames can be turned in the packed domain
+    PACKED_1BPP = True
+    # getbuffer() of a height x width (landscape) image turns it 90 degrees
+    # counter-clockwise onto the panel
+    TURNS_LANDSCAPE = True
+
+    '''
+    function :Hardware reset
+    parameter:
+    '''
+    def reset(self):
+        epdconfig.digital_write(self.reset_pin, 1)
+        epdconfig.delay_ms(self.RESET_MS[0])
+        for _ in range(self.RESET_PULSES):
+            epdconfig.digital_write(self.reset_pin, 0)
+            epdconfig.delay_ms(self.RESET_MS[1])
+            epdconfig.digital_write(self.reset_pin, 1)
+            epdconfig.delay_ms(self.RESET_MS[2])
+
+    '''
+    function :send command
+    parameter:
+     command : Command register
+    '''
+    def send_command(self, command):
+        epdconfig.send_command(command)
+
+    '''
+    function :send data
+    parameter:
+     data : Write data
+    '''
+    def send_data(self, data):
+        epdconfig.send_data(data)
+
+    # send a lot of data
+    def send_data2(self, data):
+        epdconfig.send_data2(data)
+
+    '''
+    function :Wait until the busy_pin is released
+    parameter:
+    '''
+    def ReadBusy(self):
+        logger.debug("e-Paper busy")
+        if self.BUSY_COMMAND is None:
+            epdconfig.wait_busy(self.busy_pin, self.BUSY_LEVEL, self.BUSY_POLL_MS)
+        else:
+            command = self.BUSY_COMMAND
+            self.send_command(command)
+            epdconfig.wait_busy(self.busy_pin, self.BUSY_LEVEL, self.BUSY_POLL_MS,
+                                poll=lambda: self.send_command(command))
+        if self.BUSY_SETTLE_MS:
+            epdconfig.delay_ms(self.BUSY_SETTLE_MS)
+        logger.debug("e-Paper busy release")
+
+    '''
+    function :Pack an image into the 1bpp frame buffer
+    parameter:
+     image : PIL image, width x height or rotated
+    '''
+    def getbuffer(self, image):
+        buf = packing.pack_1bpp(image, self.width, self.height)
+        if buf is None:
+            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
+            # return a blank buffer
+            return packing.solid(0x00, packing.linewidth(self.width) * self.height)
+        return buf
+
+    '''
+    function :Write a whole frame buffer into controller RAM
+    parameter:
+     buf    : packed frame buffer
+     plane  : index into RAM, 0 is the black/white plane
+    '''
+    def write_ram(self, buf, plane=0):
+        epdconfig.send_command_with_data(self.RAM[plane], buf)
+
+
+class SSD16xx(Controller):
+    """Solomon SSD1608/SSD1675/SSD1680/SSD1677 style controllers
+
+    BUSY is high while busy, black/white RAM is 0x24 and red/old RAM 0x26.
+    """
+    BUSY_LEVEL = 1
+    RAM = (0x24, 0x26)
+    # RAM layout init() sets up: RAM_X is the RAM x byte of the frame's first
+    # column, RAM_Y the RAM row of its first row, RAM_Y_STEP 1 or -1 (data
+    # entry mode 0x03 or 0x01) and RAM_ROWS the rows in the RAM window,
+    # None for the panel height
+    RAM_X = 0
+    RAM_Y = 0
+    RAM_Y_STEP = 1
+    RAM_ROWS = None
+
+    def _ram_rows(self):
+        return self.RAM_ROWS or self.height
+
+    def _ram_row(self, y):
+        return (self.RAM_Y + y * self.RAM_Y_STEP) % self._ram_rows()
+
+    def _set_ram_area(self, x_start, x_end, y_start, y_end):
+        # x in RAM bytes, y in RAM rows; y_start > y_end when writing upwards
+        epdconfig.send_command_with_data(0x44, [x_start & 0xFF, x_end & 0xFF])
+        epdconfig.send_command_with_data(0x45, [y_start & 0xFF, (y_start >> 8) & 0xFF,
+                                                 y_end & 0xFF, (y_end >> 8) & 0xFF])
+        epdconfig.send_command_with_data(0x4E, [x_start & 0xFF])
+        epdconfig.send_command_with_data(0x4F, [y_start & 0xFF, (y_start >> 8) & 0xFF])
+
+    '''
+    function :Write the part of a frame buffer inside a rectangle into RAM
+    parameter:
+     buf    : packed 1bpp frame buffer of the whole panel
+     rect   : (x0, y0, x1, y1) in pixels, ends exclusive, x widened to bytes
+     plane  : index into RAM, 0 is the black/white plane
+    '''
+    def write_window(self, buf, rect, plane=0):
+        row = packing.linewidth(self.width)
+        x0, y0, x1, y1 = rect
+        first, last = x0 // 8, (x1 + 7) // 8
+        if not isinstance(buf, (bytes, bytearray, memoryview)):
+            buf = bytes(buf)
+        view = memoryview(buf)
+        # data entry mode: x increments, y as the layout says
+        epdconfig.send_command_with_data(0x11, [0x03 if self.RAM_Y_STEP > 0 else 0x01])
+        # rows whose RAM rows follow each other go out with one window
+        y = y0
+        while y < y1:
+            end = y + 1
+            while end < y1 and self._ram_row(end) == self._ram_row(end - 1) + self.RAM_Y_STEP:
+                end += 1
+            self._set_ram_area(self.RAM_X + first, self.RAM_X + last - 1,
+                               self._ram_row(y), self._ram_row(end - 1))
+            if first == 0 and last == row:
+                data = view[y * row:end * row]
+            else:
+                data = b''.join(view[j * row + first:j * row + last] for j in range(y, end))
+            epdconfig.send_command_with_data(self.RAM[plane], data)
+            y = end
+        # back to the full window display() expects
+        rows = self._ram_rows()
+        y_start, y_end = (0, rows - 1) if self.RAM_Y_STEP > 0 else (rows - 1, 0)
+        self._set_ram_area(self.RAM_X, self.RAM_X + row - 1, y_start, y_end)
+        epdconfig.send_command_with_data(0x4F, [self.RAM_Y & 0xFF, (self.RAM_Y >> 8) & 0xFF])
+
+
+class UC81xx(Controller):
+    """UltraChip UC8151/UC8176/UC8179 style controllers (and their clones)
+
+    BUSY is low while busy, the frame goes to 0x10 (DTM1) and 0x13 (DTM2).
+    """
+    BUSY_LEVEL = 0
+    RAM = (0x10, 0x13)
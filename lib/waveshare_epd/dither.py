@@ -0,0 +1,180 @@
+# /*****************************************************************************
+# * | File        :	  dither.py
+# * | Function    :   Dithering images down to the colors of a panel
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Date        :   2026-10-18
+# * | Info        :
+# ******************************************************************************
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import functools
+
+from PIL import Image
+
+from . import packing, panels
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# threshold        every pixel to the nearest color, no dithering
+# ordered          8x8 Bayer matrix: the same gray always gives the same
+#                  pattern at the same place, so unchanged areas stay unchanged
+#                  (good for partial refreshes); needs NumPy, without it
+#                  floyd-steinberg is used
+# floyd-steinberg  error diffusion, Pillow's own, what the drivers always did
+MODES = ('threshold', 'ordered', 'floyd-steinberg')
+# the mode the drivers' getbuffer() dither with themselves
+DRIVER_MODE = 'floyd-steinberg'
+
+# RGB of the color names in panels.Panel.colors, as the drivers' PALETTEs
+RGB = {
+    'black': (0, 0, 0),
+    'white': (255, 255, 255),
+    'green': (0, 255, 0),
+    'blue': (0, 0, 255),
+    'red': (255, 0, 0),
+    'yellow': (255, 255, 0),
+    'orange': (255, 128, 0),
+}
+
+BAYER_ORDER = 8
+
+
+def check(mode):
+    """Raise ValueError unless `mode` is one of MODES"""
+    if mode not in MODES:
+        raise ValueError("Dither mode must be one of %s, not %r" % (', '.join(MODES), mode))
+
+
+def bayer(order):
+    """The order x order Bayer matrix (order a power of 2), values 0 to order**2 - 1"""
+    matrix = np.zeros((1, 1), np.int32)
+    while matrix.shape[0] < order:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]])
+    return matrix
+
+
+@functools.lru_cache(maxsize=8)
+def threshold_map(height, width):
+    """Ordered dithering thresholds for an image of width x height, tiled from bayer()
+
+    Values are in (0, 255): a gray level above its threshold is white, so
+    black and white pixels stay what they are. Built once per size and read
+    only.
+    """
+    cells = BAYER_ORDER * BAYER_ORDER
+    tile = ((2 * bayer(BAYER_ORDER) + 1) * 255 // (2 * cells)).astype(np.uint8)
+    reps = (-(-height // BAYER_ORDER), -(-width // BAYER_ORDER))
+    thresholds = np.tile(tile, reps)[:height, :width]
+    thresholds.flags.writeable = False
+    return thresholds
+
+
+def palette(panel):
+    """The panel's colors as a tuple of RGB tuples, in the order of its color indices"""
+    return tuple(RGB[name] for name in panel.colors)
+
+
+def _ordered(mode):
+    return mode == 'ordered' and np is not None
+
+
+def to_1bit(image, mode):
+    """Dither an image to black and white, returns a '1' image"""
+    check(mode)
+    if image.mode == '1':
+        return image
+    if _ordered(mode):
+        gray = np.asarray(image.convert('L'))
+        return Image.fromarray(gray > threshold_map(*gray.shape))
+    if mode == 'threshold':
+        return image.convert('L').point(lambda value: 255 if value >= 128 else 0, '1')
+    return image.convert('1')
+
+
+def to_gray(image, levels, mode):
+    """Dither an image to `levels` evenly spaced gray levels, 0 and 255 included
+
+    Returns an 'L' image; packing.pack_2bpp_gray() packs the 4 levels
+    0, 85, 170, 255 of a 4-gray frame exactly.
+    """
+    check(mode)
+    step = 255 / (levels - 1)
+    gray = image.convert('L')
+    if _ordered(mode):
+        values = np.asarray(gray) / step
+        base = np.floor(values)
+        index = base + ((values - base) * 255 > threshold_map(*values.shape))
+        return Image.fromarray(np.rint(np.minimum(index, levels - 1) * step).astype(np.uint8))
+    if mode == 'threshold':
+        return gray.point(lambda value: round(round(value / step) * step))
+    grays = tuple((round(i * step),) * 3 for i in range(levels))
+    indices = gray.convert('RGB').quantize(palette=packing.palette_image(grays))
+    table = bytes(grays[index][0] if index < levels else 0 for index in range(256))
+    return Image.frombytes('L', image.size, indices.tobytes().translate(table))
+
+
+def to_palette(image, colors, mode):
+    """Dither an image to `colors` (a tuple of RGB tuples)
+
+    Returns a P image with `colors` as its first palette entries, which
+    packing.quantize() passes through unchanged. Ordered dithering spreads
+    the thresholds over 255 / (number of colors) ** (1/3) per channel, about
+    the distance between the colors of an evenly spaced palette that size.
+    """
+    check(mode)
+    if packing.on_palette(image, colors):
+        return image
+    if _ordered(mode):
+        rgb = np.asarray(image.convert('RGB'), np.float32)
+        spread = 255 / len(colors) ** (1 / 3)
+        offsets = (threshold_map(*rgb.shape[:2]) / 255.0 - 0.5) * spread
+        rgb = rgb + offsets[..., np.newaxis]
+        best = np.full(rgb.shape[:2], np.inf, np.float32)
+        indices = np.zeros(rgb.shape[:2], np.uint8)
+        for index, color in enumerate(colors):
+            distance = ((rgb - np.asarray(color, np.float32)) ** 2).sum(axis=2)
+            closer = distance < best
+            best[closer] = distance[closer]
+            indices[closer] = index
+        result = Image.frombytes('P', image.size, indices.tobytes())
+        result.putpalette(packing.palette_image(colors).getpalette())
+        return result
+    dither = Image.Dither.NONE if mode == 'threshold' else Image.Dither.FLOYDSTEINBERG
+    return image.convert('RGB').quantize(palette=packing.palette_image(colors), dither=dither)
+
+
+def apply(image, panel, mode, gray=False):
+    """Dither an image for a panel (a panels.Panel)
+
+    Black and white panels, whatever their bits per pixel, and the black
+    plane of two-plane ones get a '1' image, the others a P image on their
+    colors. With `gray`, for the panel's 4-gray mode, it is an L image of the
+    4 levels pack_2bpp_gray() packs.
+    """
+    if gray:
+        return to_gray(image, 4, mode)
+    if panel.colors == panels.BW or panel.planes > 1:
+        return to_1bit(image, mode)
+    return to_palette(image, palette(panel), mode)
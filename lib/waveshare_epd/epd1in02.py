@@ -29,7 +29,9 @@
 #
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 80
@@ -37,7 +39,11 @@ EPD_HEIGHT      = 128
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.UC81xx):
+    BUSY_POLL_MS = 10
+    BUSY_COMMAND = 0x71
+    BUSY_SETTLE_MS = 800
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -89,61 +95,20 @@ class EPD:
     0x00,  0x00,  0x00,  0x00,  0x00,  0x00,  
     ]
         
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)         # module reset
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        busy =not(busy & 0x01)
-        while(busy):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-            busy =not(busy & 0x01)
-        epdconfig.delay_ms(800)
-        logger.debug("e-Paper busy release")        
-
     def TurnOnDisplay(self):
         self.send_command(0x12)
         epdconfig.delay_ms(10)
         self.ReadBusy()
 
     def SetFulltReg(self):
-        self.send_command(0x23)
-        for count in range(0, 42):
-            self.send_data(self.lut_w1[count]) 
+        epdconfig.send_command_with_data(0x23, self.lut_w1[:42])
         
-        self.send_command(0x24)
-        for count in range(0, 42):
-            self.send_data(self.lut_b1[count])     
+        epdconfig.send_command_with_data(0x24, self.lut_b1[:42])
 
     def SetPartReg(self):
-        self.send_command(0x23)
-        for count in range(0, 42):
-            self.send_data(self.lut_w[count]) 
+        epdconfig.send_command_with_data(0x23, self.lut_w[:42])
         
-        self.send_command(0x24)
-        for count in range(0, 42):
-            self.send_data(self.lut_b[count])     
+        epdconfig.send_command_with_data(0x24, self.lut_b[:42])
 
     def Init(self):
         if (epdconfig.module_init() != 0):
@@ -151,8 +116,7 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0xD2)			
-        self.send_data(0x3F)
+        epdconfig.send_command_with_data(0xD2, [0x3F])
 
         self.send_command(0x00)  			
         self.send_data (0x6F)  #from outside
@@ -163,31 +127,23 @@ class EPD:
         self.send_data (0x2b)		
         self.send_data (0x2b) 
 
-        self.send_command(0x06)  #Configuring the charge pump
-        self.send_data(0x3f)
+        epdconfig.send_command_with_data(0x06, [0x3f])  #Configuring the charge pump
 
-        self.send_command(0x2A)  #Setting XON and the options of LUT
-        self.send_data(0x00) 
-        self.send_data(0x00) 
+        epdconfig.send_command_with_data(0x2A, [0x00, 0x00])  #Setting XON and the options of LUT
 
-        self.send_command(0x30)  #Set the clock frequency
-        self.send_data(0x17) #50Hz
+        epdconfig.send_command_with_data(0x30, [0x17])  #Set the clock frequency; 50Hz
 
-        self.send_command(0x50)  #Set VCOM and data output interval
-        self.send_data(0x57)			
+        epdconfig.send_command_with_data(0x50, [0x57])  #Set VCOM and data output interval
 
-        self.send_command(0x60)  #Set The non-overlapping period of Gate and Source.
-        self.send_data(0x22)
+        epdconfig.send_command_with_data(0x60, [0x22])  #Set The non-overlapping period of Gate and Source.
 
         self.send_command(0x61)  #resolution setting
         self.send_data (0x50)    #source 128 	 
         self.send_data (0x80)       
 
-        self.send_command(0x82)  #sets VCOM_DC value
-        self.send_data(0x12)  #-1v
+        epdconfig.send_command_with_data(0x82, [0x12])  #sets VCOM_DC value; -1v
 
-        self.send_command(0xe3)#Set POWER SAVING
-        self.send_data(0x33)
+        epdconfig.send_command_with_data(0xe3, [0x33]) #Set POWER SAVING
         self.SetFulltReg()	
         self.send_command(0x04)     		#power on
         self.ReadBusy()
@@ -197,8 +153,7 @@ class EPD:
     def Partial_Init(self):
         self.reset()
         
-        self.send_command(0xD2)
-        self.send_data(0x3F)
+        epdconfig.send_command_with_data(0xD2, [0x3F])
 
         self.send_command(0x00)
         self.send_data (0x6F)  #from outside
@@ -209,27 +164,19 @@ class EPD:
         self.send_data (0x2b)
         self.send_data (0x2b)
 
-        self.send_command(0x06)  #Configuring the charge pump
-        self.send_data(0x3f)
+        epdconfig.send_command_with_data(0x06, [0x3f])  #Configuring the charge pump
 
-        self.send_command(0x2A)  #Setting XON and the options of LUT
-        self.send_data(0x00)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x2A, [0x00, 0x00])  #Setting XON and the options of LUT
 
-        self.send_command(0x30)  #Set the clock frequency
-        self.send_data(0x17)
+        epdconfig.send_command_with_data(0x30, [0x17])  #Set the clock frequency
 
-        self.send_command(0x50)  #Set VCOM and data output interval
-        self.send_data(0xf2)
+        epdconfig.send_command_with_data(0x50, [0xf2])  #Set VCOM and data output interval
 
-        self.send_command(0x60)  #Set The non-overlapping period of Gate and Source.
-        self.send_data(0x22)
+        epdconfig.send_command_with_data(0x60, [0x22])  #Set The non-overlapping period of Gate and Source.
 
-        self.send_command(0x82)  #Set VCOM_DC value
-        self.send_data(0x12)#-1v
+        epdconfig.send_command_with_data(0x82, [0x12])  #Set VCOM_DC value; -1v
 
-        self.send_command(0xe3)#Set POWER SAVING
-        self.send_data(0x33)
+        epdconfig.send_command_with_data(0xe3, [0x33]) #Set POWER SAVING
 
         self.SetPartReg()	
 
@@ -238,28 +185,6 @@ class EPD:
         # EPD hardware init end
         return 0
     
-    def getbuffer(self, image):
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
-
     def display(self, image):
         if (image == None):
             return
@@ -269,15 +194,9 @@ class EPD:
         else:
             Width = self.width / 8 + 1
             
-        self.send_command(0x10)
-        for j in range(0, self.height):
-            for i in range(0, int(Width)):
-                self.send_data(0xff)  
+        epdconfig.send_command_with_data(0x10, packing.solid(0xff, self.height * int(Width)))
         
-        self.send_command(0x13)
-        for j in range(0, self.height):
-            for i in range(0, int(Width)):
-                self.send_data(image[i + j * int(Width)])  
+        epdconfig.send_command_with_data(0x13, image[:self.height * int(Width)])
         self.TurnOnDisplay()
         
     def Clear(self):
@@ -289,24 +208,19 @@ class EPD:
             
         Height = self.height
         
-        self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(0x00)  
+        epdconfig.send_command_with_data(0x10, packing.solid(0x00, Height * int(Width)))
         
-        self.send_command(0x13)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(0xff)  
+        epdconfig.send_command_with_data(0x13, packing.solid(0xff, Height * int(Width)))
         self.TurnOnDisplay()
 
     def DisplayPartial(self, old_Image, Image):
 
         # Set partial Windows */
         self.send_command(0x91)		#This command makes the display enter partial mode
-        self.send_command(0x90)		#resolution setting
-        self.send_data(0)           #x-start
-        self.send_data(79)       #x-end
+        epdconfig.send_command_with_data(0x90, [  #resolution setting
+            0,  #x-start
+            79,  #x-end
+        ])
 
         self.send_data(0)
         self.send_data(127)  #y-end
@@ -320,26 +234,18 @@ class EPD:
             
         Height = self.height
         # send data
-        self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(old_Image[i + j * int(Width)])
+        epdconfig.send_command_with_data(0x10, old_Image[:Height * int(Width)])
 
-        self.send_command(0x13)
-        for j in range(0, Height):
-            for i in range(0, int(Width)):
-                self.send_data(Image[i + j * int(Width)])
+        epdconfig.send_command_with_data(0x13, Image[:Height * int(Width)])
 
         # Set partial refresh
         self.TurnOnDisplay()
 
     def Sleep(self):
-        self.send_command(0x50)
-        self.send_data(0xf7)
+        epdconfig.send_command_with_data(0x50, [0xf7])
         self.send_command(0x02)
         self.ReadBusy()
-        self.send_command(0x07)
-        self.send_data(0xA5)
+        epdconfig.send_command_with_data(0x07, [0xA5])
         epdconfig.delay_ms(200)
 
         epdconfig.delay_ms(2000)
@@ -28,7 +28,9 @@
 #
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 200
@@ -36,7 +38,13 @@ EPD_HEIGHT      = 200
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.SSD16xx):
+    # data entry mode 0x01, the first row is RAM row 199
+    RAM_Y = EPD_HEIGHT - 1
+    RAM_Y_STEP = -1
+    RESET_MS = (200, 5, 200)
+    BUSY_POLL_MS = 20
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -91,93 +99,44 @@ class EPD:
     0x02,0x17,0x41,0xB0,0x32,0x28,
     ]
         
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-    
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):
-            epdconfig.delay_ms(20)
-        logger.debug("e-Paper busy release")
-
     def TurnOnDisplay(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0xc7)
+        epdconfig.send_command_with_data(0x22, [0xc7]) # DISPLAY_UPDATE_CONTROL_2
         self.send_command(0x20) # MASTER_ACTIVATION
         self.ReadBusy()
     
     def TurnOnDisplayPart(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0xcF)
+        epdconfig.send_command_with_data(0x22, [0xcF]) # DISPLAY_UPDATE_CONTROL_2
         self.send_command(0x20) # MASTER_ACTIVATION
         self.ReadBusy()
 
     def lut(self, lut):
-        self.send_command(0x32) # WRITE_LUT_REGISTER
-        self.send_data2(lut)
+        epdconfig.send_command_with_data(0x32, lut) # WRITE_LUT_REGISTER
             
     def set_lut(self, lut):
         self.lut(lut)
         
-        self.send_command(0x3f)
-        self.send_data(lut[153])
+        epdconfig.send_command_with_data(0x3f, [lut[153]])
         
-        self.send_command(0x03)
-        self.send_data(lut[154])
+        epdconfig.send_command_with_data(0x03, [lut[154]])
         
-        self.send_command(0x04)
-        self.send_data(lut[155])
-        self.send_data(lut[156])
-        self.send_data(lut[157])
+        epdconfig.send_command_with_data(0x04, [lut[155], lut[156], lut[157]])
         
-        self.send_command(0x2c)
-        self.send_data(lut[158])
+        epdconfig.send_command_with_data(0x2c, [lut[158]])
       
     def SetWindows(self, Xstart, Ystart, Xend, Yend):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
-        self.send_data((Xstart>>3) & 0xFF)
-        self.send_data((Xend>>3) & 0xFF)
+        epdconfig.send_command_with_data(0x44, [(Xstart>>3) & 0xFF, (Xend>>3) & 0xFF]) # SET_RAM_X_ADDRESS_START_END_POSITION
         
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(Ystart & 0xFF)
-        self.send_data((Ystart >> 8) & 0xFF)
-        self.send_data(Yend & 0xFF)
-        self.send_data((Yend >> 8) & 0xFF)
+        epdconfig.send_command_with_data(0x45, [  # SET_RAM_Y_ADDRESS_START_END_POSITION
+            Ystart & 0xFF, (Ystart >> 8) & 0xFF, Yend & 0xFF, (Yend >> 8) & 0xFF,
+        ])
     
 
     def SetCursor(self, Xstart, Ystart):
-        self.send_command(0x4E); # SET_RAM_X_ADDRESS_COUNTER
-        self.send_data(Xstart & 0xFF);
+        epdconfig.send_command_with_data(0x4E, [Xstart & 0xFF]) # SET_RAM_X_ADDRESS_COUNTER
 
-        self.send_command(0x4F); # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(Ystart & 0xFF);
-        self.send_data((Ystart >> 8) & 0xFF);
+        epdconfig.send_command_with_data(0x4F, [Ystart & 0xFF, (Ystart >> 8) & 0xFF]) # SET_RAM_Y_ADDRESS_COUNTER
 
+    @epdconfig.precompiled
     def init(self, isPartial):
         if (epdconfig.module_init() != 0):
             return -1
@@ -189,23 +148,13 @@ class EPD:
             
             self.set_lut(self.WF_PARTIAL_1IN54_0)
             
-            self.send_command(0x37)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x40)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
+            epdconfig.send_command_with_data(0x37, [
+                0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00,
+            ])
             
-            self.send_command(0x3c)  # BorderWavefrom
-            self.send_data(0x80)
+            epdconfig.send_command_with_data(0x3c, [0x80])  # BorderWavefrom
             
-            self.send_command(0x22)
-            self.send_data(0xc0)
+            epdconfig.send_command_with_data(0x22, [0xc0])
             self.send_command(0x20)
             self.ReadBusy()
         
@@ -218,24 +167,21 @@ class EPD:
             self.send_command(0x12) # SWRESET (software reset)
             self.ReadBusy()
             
-            self.send_command(0x01) # DRIVER_OUTPUT_CONTROL
-            self.send_data(0xC7) # (EPD_HEIGHT - 1) & 0xFF
-            self.send_data(0x00) # ((EPD_HEIGHT - 1) >> 8) & 0xFF
-            self.send_data(0x01) # GD = 0 SM = 0 TB = 0
+            epdconfig.send_command_with_data(0x01, [  # DRIVER_OUTPUT_CONTROL
+                0xC7,  # (EPD_HEIGHT - 1) & 0xFF
+                0x00,  # ((EPD_HEIGHT - 1) >> 8) & 0xFF
+                0x01,  # GD = 0 SM = 0 TB = 0
+            ])
             
-            self.send_command(0x11) # data entry mode
-            self.send_data(0x01)
+            epdconfig.send_command_with_data(0x11, [0x01]) # data entry mode
                       
             self.SetWindows(0, self.height-1, self.width-1, 0) # Set Windows
     
-            self.send_command(0x3C) # BorderWavefrom
-            self.send_data(0x01)
+            epdconfig.send_command_with_data(0x3C, [0x01]) # BorderWavefrom
 
-            self.send_command(0x18)
-            self.send_data(0x80)
+            epdconfig.send_command_with_data(0x18, [0x80])
 
-            self.send_command(0x22) # #Load Temperature and waveform setting.
-            self.send_data(0XB1)
+            epdconfig.send_command_with_data(0x22, [0XB1]) # #Load Temperature and waveform setting.
             self.send_command(0x20)
 
             self.SetCursor(0, self.height-1) # Set Cursor
@@ -250,65 +196,41 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        self.send_command(0x24)
-        self.send_data2([color] * self.height * linewidth)
+        epdconfig.send_command_with_data(0x24, packing.solid(color, self.height * linewidth))
                 
         self.TurnOnDisplay()
         
-    def getbuffer(self, image):
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
-
     def display(self, image):
         if (image == None):
             return
             
-        self.send_command(0x24)
-        self.send_data2(image)   
+        epdconfig.send_command_with_data(0x24, image)
         self.TurnOnDisplay()
         
     def displayPartBaseImage(self, image):
         if (image == None):
             return
         
-        self.send_command(0x24)
-        self.send_data2(image)
+        epdconfig.send_command_with_data(0x24, image)
         
-        self.send_command(0x26)
-        self.send_data2(image)
+        epdconfig.send_command_with_data(0x26, image)
                 
         self.TurnOnDisplay()
         
-    def displayPart(self, image):
+    # rect: (x0, y0, x1, y1) area that changed, None for the whole frame
+    def displayPart(self, image, rect=None):
         if (image == None):
             return
         
-        self.send_command(0x24)
-        self.send_data2(image)
+        if rect is None:
+            epdconfig.send_command_with_data(0x24, image)
+        else:
+            self.write_window(image, rect)
                 
         self.TurnOnDisplayPart()
         
     def sleep(self):
-        self.send_command(0x10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        epdconfig.send_command_with_data(0x10, [0x01]) # DEEP_SLEEP_MODE
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -28,15 +28,22 @@
 #
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 200
 EPD_HEIGHT      = 200
 
+# packed 1bpp byte -> 8 pixels of 2 bits
+EXPAND_2BPP = packing.expand_table(2, 0x3, 0x0)
+
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.UC81xx):
+    RESET_MS = (200, 5, 200)
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -54,60 +61,17 @@ class EPD:
     lut_red0 = [0x83, 0x5D, 0x01, 0x81, 0x48, 0x23, 0x77, 0x77, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00]
     lut_red1 = [0x03, 0x1D, 0x01, 0x01, 0x08, 0x23, 0x37, 0x37, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00] 
     
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0) # module reset
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):
-            epdconfig.delay_ms(100)    
-        logger.debug("e-Paper busy release")
-      
     def set_lut_bw(self):
-        self.send_command(0x20) # vcom
-        for count in range(0, 15):
-            self.send_data(self.lut_vcom0[count])
-        self.send_command(0x21) # ww --
-        for count in range(0, 15):
-            self.send_data(self.lut_w[count])
-        self.send_command(0x22) # bw r
-        for count in range(0, 15):
-            self.send_data(self.lut_b[count])
-        self.send_command(0x23) # wb w
-        for count in range(0, 15):
-            self.send_data(self.lut_g1[count])
-        self.send_command(0x24) # bb b
-        for count in range(0, 15):
-            self.send_data(self.lut_g2[count])
+        epdconfig.send_command_with_data(0x20, self.lut_vcom0[:15]) # vcom
+        epdconfig.send_command_with_data(0x21, self.lut_w[:15]) # ww --
+        epdconfig.send_command_with_data(0x22, self.lut_b[:15]) # bw r
+        epdconfig.send_command_with_data(0x23, self.lut_g1[:15]) # wb w
+        epdconfig.send_command_with_data(0x24, self.lut_g2[:15]) # bb b
 
     def set_lut_red(self):
-        self.send_command(0x25)
-        for count in range(0, 15):
-            self.send_data(self.lut_vcom1[count])
-        self.send_command(0x26)
-        for count in range(0, 15):
-            self.send_data(self.lut_red0[count])
-        self.send_command(0x27)
-        for count in range(0, 15):
-            self.send_data(self.lut_red1[count])
+        epdconfig.send_command_with_data(0x25, self.lut_vcom1[:15])
+        epdconfig.send_command_with_data(0x26, self.lut_red0[:15])
+        epdconfig.send_command_with_data(0x27, self.lut_red1[:15])
             
     def init(self):
         if (epdconfig.module_init() != 0):
@@ -115,102 +79,59 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x01) # POWER_SETTING
-        self.send_data(0x07)
-        self.send_data(0x00)
-        self.send_data(0x08)
-        self.send_data(0x00)
-        self.send_command(0x06) # BOOSTER_SOFT_START
-        self.send_data(0x07)
-        self.send_data(0x07)
-        self.send_data(0x07)
+        epdconfig.send_command_with_data(0x01, [0x07, 0x00, 0x08, 0x00]) # POWER_SETTING
+        epdconfig.send_command_with_data(0x06, [0x07, 0x07, 0x07]) # BOOSTER_SOFT_START
         self.send_command(0x04) # POWER_ON
 
         self.ReadBusy()
 
-        self.send_command(0X00) # PANEL_SETTING
-        self.send_data(0xCF)
-        self.send_command(0X50) # VCOM_AND_DATA_INTERVAL_SETTING
-        self.send_data(0x17)
-        self.send_command(0x30) # PLL_CONTROL
-        self.send_data(0x39)
-        self.send_command(0x61) # TCON_RESOLUTION set x and y
-        self.send_data(0xC8)
-        self.send_data(0x00)
-        self.send_data(0xC8)
-        self.send_command(0x82) # VCM_DC_SETTING_REGISTER
-        self.send_data(0x0E)
+        epdconfig.send_command_with_data(0X00, [0xCF]) # PANEL_SETTING
+        epdconfig.send_command_with_data(0X50, [0x17]) # VCOM_AND_DATA_INTERVAL_SETTING
+        epdconfig.send_command_with_data(0x30, [0x39]) # PLL_CONTROL
+        epdconfig.send_command_with_data(0x61, [0xC8, 0x00, 0xC8]) # TCON_RESOLUTION set x and y
+        epdconfig.send_command_with_data(0x82, [0x0E]) # VCM_DC_SETTING_REGISTER
         
         self.set_lut_bw()
         self.set_lut_red()
         return 0
 
     def getbuffer(self, image):
-        buf = [0xFF] * int(self.width * self.height / 8)
-        # Set buffer to value of Python Imaging Library image.
-        # Image must be in mode 1.
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
+        imwidth, imheight = image.size
         if imwidth != self.width or imheight != self.height:
             raise ValueError('Image must be same dimensions as display \
                 ({0}x{1}).' .format(self.width, self.height))
-
-        pixels = image_monocolor.load()
-        for y in range(self.height):
-            for x in range(self.width):
-                # Set the bits for the column of pixels at the current position.
-                if pixels[x, y] == 0:
-                    buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        return buf
+        return packing.pack_1bpp(image, self.width, self.height)
 
     def display(self, blackimage, redimage):
         # send black data
         if (blackimage != None):
-            self.send_command(0x10) # DATA_START_TRANSMISSION_1
-            for i in range(0, int(self.width * self.height / 8)):
-                temp = 0x00
-                for bit in range(0, 4):
-                    if (blackimage[i] & (0x80 >> bit) != 0):
-                        temp |= 0xC0 >> (bit * 2)
-                self.send_data(temp)  
-                temp = 0x00
-                for bit in range(4, 8):
-                    if (blackimage[i] & (0x80 >> bit) != 0):
-                        temp |= 0xC0 >> ((bit - 4) * 2)
-                self.send_data(temp)
+            buf = packing.expand_1bpp(blackimage[:int(self.width * self.height / 8)], EXPAND_2BPP)
+            epdconfig.send_command_with_data(0x10, buf) # DATA_START_TRANSMISSION_1
                 
         # send red data        
         if (redimage != None):
-            self.send_command(0x13) # DATA_START_TRANSMISSION_2
-            for i in range(0, int(self.width * self.height / 8)):
-                self.send_data(redimage[i])  
+            epdconfig.send_command_with_data(0x13, redimage[:int(self.width * self.height / 8)]) # DATA_START_TRANSMISSION_2
 
         self.send_command(0x12) # DISPLAY_REFRESH
         self.ReadBusy()
 
     def Clear(self):
-        self.send_command(0x10) # DATA_START_TRANSMISSION_1
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)
-            self.send_data(0xFF)
+        epdconfig.send_command_with_data(0x10, packing.solid(0xFF, int(self.width * self.height / 8) * 2)) # DATA_START_TRANSMISSION_1
             
-        self.send_command(0x13) # DATA_START_TRANSMISSION_2
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)
+        epdconfig.send_command_with_data(0x13, packing.solid(0xFF, int(self.width * self.height / 8))) # DATA_START_TRANSMISSION_2
 
         self.send_command(0x12) # DISPLAY_REFRESH
         self.ReadBusy()
 
     def sleep(self):
-        self.send_command(0x50) # VCOM_AND_DATA_INTERVAL_SETTING
-        self.send_data(0x17)
-        self.send_command(0x82) # to solve Vcom drop 
-        self.send_data(0x00)        
-        self.send_command(0x01) # power setting      
-        self.send_data(0x02) # gate switch to external
-        self.send_data(0x00)
-        self.send_data(0x00) 
-        self.send_data(0x00) 
+        epdconfig.send_command_with_data(0x50, [0x17]) # VCOM_AND_DATA_INTERVAL_SETTING
+        epdconfig.send_command_with_data(0x82, [0x00]) # to solve Vcom drop
+        epdconfig.send_command_with_data(0x01, [  # power setting
+            0x02,  # gate switch to external
+            0x00,
+            0x00,
+            0x00,
+        ])
         self.ReadBusy()
         
         self.send_command(0x02) # power off
@@ -28,7 +28,9 @@
 #
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 200
@@ -36,7 +38,9 @@ EPD_HEIGHT      = 200
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.SSD16xx):
+    RESET_MS = (200, 5, 200)
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -46,40 +50,6 @@ class EPD:
         self.height = EPD_HEIGHT
 
 
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0) # module reset
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):
-            epdconfig.delay_ms(100)    
-        logger.debug("e-Paper busy release")
-        
     def init(self):
         if (epdconfig.module_init() != 0):
             return -1
@@ -90,55 +60,37 @@ class EPD:
         self.send_command(0x12)  #SWRESET
         self.ReadBusy()   
 
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0xC7)
-        self.send_data(0x00)
-        self.send_data(0x01)
+        epdconfig.send_command_with_data(0x01, [0xC7, 0x00, 0x01]) #Driver output control
 
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x01)
+        epdconfig.send_command_with_data(0x11, [0x01]) #data entry mode
 
-        self.send_command(0x44) #set Ram-X address start/end position   
-        self.send_data(0x00)
-        self.send_data(0x18)    #0x18-->(24+1)*8=200
+        epdconfig.send_command_with_data(0x44, [  #set Ram-X address start/end position
+            0x00,
+            0x18,  #0x18-->(24+1)*8=200
+        ])
 
-        self.send_command(0x45) #set Ram-Y address start/end position          
-        self.send_data(0xC7)    #0xC7-->(199+1)=200
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00) 
+        epdconfig.send_command_with_data(0x45, [  #set Ram-Y address start/end position
+            0xC7,  #0xC7-->(199+1)=200
+            0x00,
+            0x00,
+            0x00,
+        ])
 
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x05)
+        epdconfig.send_command_with_data(0x3C, [0x05]) #BorderWavefrom
 
-        self.send_command(0x18) #Read built-in temperature sensor
-        self.send_data(0x80)
+        epdconfig.send_command_with_data(0x18, [0x80]) #Read built-in temperature sensor
 
-        self.send_command(0x4E)   # set RAM x address count to 0
-        self.send_data(0x00)
-        self.send_command(0x4F)   # set RAM y address count to 0X199    
-        self.send_data(0xC7)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x4E, [0x00])   # set RAM x address count to 0
+        epdconfig.send_command_with_data(0x4F, [0xC7, 0x00])   # set RAM y address count to 0X199
         self.ReadBusy()
         return 0
 
     def getbuffer(self, image):
-        buf = [0xFF] * int(self.width * self.height / 8)
-        # Set buffer to value of Python Imaging Library image.
-        # Image must be in mode 1.
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
+        imwidth, imheight = image.size
         if imwidth != self.width or imheight != self.height:
             raise ValueError('Image must be same dimensions as display \
                 ({0}x{1}).' .format(self.width, self.height))
-
-        pixels = image_monocolor.load()
-        for y in range(self.height):
-            for x in range(self.width):
-                # Set the bits for the column of pixels at the current position.
-                if pixels[x, y] == 0:
-                    buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        return buf
+        return packing.pack_1bpp(image, self.width, self.height)
 
     def display(self, blackimage, redimage):
 
@@ -147,22 +99,15 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        buf = [0x00] * self.height * linewidth
-
         # send black data
         if (blackimage != None):
-            self.send_command(0x24) # DATA_START_TRANSMISSION_1
-            self.send_data2(blackimage)
+            epdconfig.send_command_with_data(0x24, blackimage) # DATA_START_TRANSMISSION_1
                 
         # send red data        
         if (redimage != None):
-            self.send_command(0x26) # DATA_START_TRANSMISSION_2
-            for i in range(0, int(self.width * self.height / 8)):
-                buf[i] = ~redimage[i]
-            self.send_data2(buf)
+            epdconfig.send_command_with_data(0x26, packing.invert(redimage[:self.height * linewidth])) # DATA_START_TRANSMISSION_2
 
-        self.send_command(0x22) # DISPLAY_REFRESH
-        self.send_data(0xF7)
+        epdconfig.send_command_with_data(0x22, [0xF7]) # DISPLAY_REFRESH
         self.send_command(0x20) # DISPLAY_REFRESH
         self.ReadBusy()
 
@@ -172,21 +117,17 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        self.send_command(0x24) # DATA_START_TRANSMISSION_1
-        self.send_data2([0xff] * int(self.height * linewidth))
+        epdconfig.send_command_with_data(0x24, packing.solid(0xff, int(self.height * linewidth))) # DATA_START_TRANSMISSION_1
             
-        self.send_command(0x26) # DATA_START_TRANSMISSION_2
-        self.send_data2([0x00] * int(self.height * linewidth))
+        epdconfig.send_command_with_data(0x26, packing.solid(0x00, int(self.height * linewidth))) # DATA_START_TRANSMISSION_2
 
-        self.send_command(0x22) # DISPLAY_REFRESH
-        self.send_data(0xF7)
+        epdconfig.send_command_with_data(0x22, [0xF7]) # DISPLAY_REFRESH
         self.send_command(0x20) # DISPLAY_REFRESH
         self.ReadBusy()
 
 
     def sleep(self):
-        self.send_command(0x10) #enter deep sleep
-        self.send_data(0x01) 
+        epdconfig.send_command_with_data(0x10, [0x01]) #enter deep sleep
 
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
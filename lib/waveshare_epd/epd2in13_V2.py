@@ -29,7 +29,10 @@
 
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
+from PIL import Image
 
 # Display resolution
 EPD_WIDTH       = 122
@@ -37,7 +40,15 @@ EPD_HEIGHT      = 250
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.SSD16xx):
+    # data entry mode 0x01, the first row is RAM row 249
+    RAM_Y = EPD_HEIGHT - 1
+    RAM_Y_STEP = -1
+    RESET_MS = (200, 5, 200)
+    # getbuffer() mirrors the rows, and transposes landscape images
+    PACKED_1BPP = False
+    TURNS_LANDSCAPE = False
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -84,50 +95,17 @@ class EPD:
         0x15,0x41,0xA8,0x32,0x30,0x0A,
     ]
         
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)    
-
     def TurnOnDisplay(self):
-        self.send_command(0x22)
-        self.send_data(0xC7)
+        epdconfig.send_command_with_data(0x22, [0xC7])
         self.send_command(0x20)        
         self.ReadBusy()
         
     def TurnOnDisplayPart(self):
-        self.send_command(0x22)
-        self.send_data(0x0c)
+        epdconfig.send_command_with_data(0x22, [0x0c])
         self.send_command(0x20)        
         self.ReadBusy()
         
+    @epdconfig.precompiled
     def init(self, update):
         if (epdconfig.module_init() != 0):
             return -1
@@ -138,146 +116,104 @@ class EPD:
             self.send_command(0x12) # soft reset
             self.ReadBusy()
 
-            self.send_command(0x74) #set analog block control
-            self.send_data(0x54)
-            self.send_command(0x7E) #set digital block control
-            self.send_data(0x3B)
+            epdconfig.send_command_with_data(0x74, [0x54]) #set analog block control
+            epdconfig.send_command_with_data(0x7E, [0x3B]) #set digital block control
 
-            self.send_command(0x01) #Driver output control
-            self.send_data(0xF9)
-            self.send_data(0x00)
-            self.send_data(0x00)
+            epdconfig.send_command_with_data(0x01, [0xF9, 0x00, 0x00]) #Driver output control
 
-            self.send_command(0x11) #data entry mode
-            self.send_data(0x01)
+            epdconfig.send_command_with_data(0x11, [0x01]) #data entry mode
 
-            self.send_command(0x44) #set Ram-X address start/end position
-            self.send_data(0x00)
-            self.send_data(0x0F)    #0x0C-->(15+1)*8=128
+            epdconfig.send_command_with_data(0x44, [  #set Ram-X address start/end position
+                0x00,
+                0x0F,  #0x0C-->(15+1)*8=128
+            ])
 
-            self.send_command(0x45) #set Ram-Y address start/end position
-            self.send_data(0xF9)   #0xF9-->(249+1)=250
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
+            epdconfig.send_command_with_data(0x45, [  #set Ram-Y address start/end position
+                0xF9,  #0xF9-->(249+1)=250
+                0x00,
+                0x00,
+                0x00,
+            ])
             
-            self.send_command(0x3C) #BorderWavefrom
-            self.send_data(0x03)
-
-            self.send_command(0x2C)     #VCOM Voltage
-            self.send_data(0x55)    #
-
-            self.send_command(0x03)
-            self.send_data(self.lut_full_update[70])
-
-            self.send_command(0x04) #
-            self.send_data(self.lut_full_update[71])
-            self.send_data(self.lut_full_update[72])
-            self.send_data(self.lut_full_update[73])
-
-            self.send_command(0x3A)     #Dummy Line
-            self.send_data(self.lut_full_update[74])
-            self.send_command(0x3B)     #Gate time
-            self.send_data(self.lut_full_update[75])
-
-            self.send_command(0x32)
-            for count in range(70):
-                self.send_data(self.lut_full_update[count])
-
-            self.send_command(0x4E)   # set RAM x address count to 0
-            self.send_data(0x00)
-            self.send_command(0x4F)   # set RAM y address count to 0X127
-            self.send_data(0xF9)
-            self.send_data(0x00)
+            epdconfig.send_command_with_data(0x3C, [0x03]) #BorderWavefrom
+
+            epdconfig.send_command_with_data(0x2C, [0x55])     #VCOM Voltage; 
+
+            epdconfig.send_command_with_data(0x03, [self.lut_full_update[70]])
+
+            epdconfig.send_command_with_data(0x04, [  #
+                self.lut_full_update[71], self.lut_full_update[72], self.lut_full_update[73],
+            ])
+
+            epdconfig.send_command_with_data(0x3A, [self.lut_full_update[74]])     #Dummy Line
+            epdconfig.send_command_with_data(0x3B, [self.lut_full_update[75]])     #Gate time
+
+            epdconfig.send_command_with_data(0x32, self.lut_full_update[:70])
+
+            epdconfig.send_command_with_data(0x4E, [0x00])   # set RAM x address count to 0
+            epdconfig.send_command_with_data(0x4F, [0xF9, 0x00])   # set RAM y address count to 0X127
             self.ReadBusy()
         else:
-            self.send_command(0x2C)     #VCOM Voltage
-            self.send_data(0x26)
+            epdconfig.send_command_with_data(0x2C, [0x26])     #VCOM Voltage
 
             self.ReadBusy()
 
-            self.send_command(0x32)
-            for count in range(70):
-                self.send_data(self.lut_partial_update[count])
-
-            self.send_command(0x37)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x40)
-            self.send_data(0x00)
-            self.send_data(0x00)
-
-            self.send_command(0x22)
-            self.send_data(0xC0)
+            epdconfig.send_command_with_data(0x32, self.lut_partial_update[:70])
+
+            epdconfig.send_command_with_data(0x37, [0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00])
+
+            epdconfig.send_command_with_data(0x22, [0xC0])
             self.send_command(0x20)
             self.ReadBusy()
 
-            self.send_command(0x3C) #BorderWavefrom
-            self.send_data(0x01)
+            epdconfig.send_command_with_data(0x3C, [0x01]) #BorderWavefrom
         return 0
 
     def getbuffer(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-         
-        buf = [0xFF] * (linewidth * self.height)
+        linewidth = packing.linewidth(self.width)
         image_monocolor = image.convert('1')
         imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        
         if(imwidth == self.width and imheight == self.height):
             logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):                    
-                    if pixels[x, y] == 0:
-                        x = imwidth - x
-                        buf[int(x / 8) + y * linewidth] &= ~(0x80 >> (x % 8))
+            # mirrored, column x goes to bit imwidth - x of its row
+            mirrored = Image.new('1', (linewidth * 8, imheight), 255)
+            mirrored.paste(image_monocolor.transpose(Image.FLIP_LEFT_RIGHT), (1, 0))
+            return packing.pack_1bpp(mirrored, linewidth * 8, imheight)
         elif(imwidth == self.height and imheight == self.width):
             logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        newy = imwidth - newy - 1
-                        buf[int(newx / 8) + newy*linewidth] &= ~(0x80 >> (y % 8))
-        return buf   
+            return packing.pack_1bpp(image_monocolor.transpose(Image.TRANSPOSE), self.width, self.height)
+        return packing.solid(0xFF, linewidth * self.height)   
         
         
     def display(self, image):
-        self.send_command(0x24)
-        self.send_data2(image)   
+        epdconfig.send_command_with_data(0x24, image)
         self.TurnOnDisplay()
         
-    def displayPartial(self, image):
+    # rect: (x0, y0, x1, y1) area that changed, None for the whole frame
+    def displayPartial(self, image, rect=None):
+        if rect is not None:
+            self.write_window(image, rect)
+            self.write_window(packing.invert(image), rect, 1)
+            self.TurnOnDisplayPart()
+            return
+
         if self.width%8 == 0:
             linewidth = int(self.width/8)
         else:
             linewidth = int(self.width/8) + 1
 
-        buf = [0x00] * self.height * linewidth
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                buf[i + j * linewidth] = ~image[i + j * linewidth]
+        buf = packing.invert(image[:self.height * linewidth])
 
-        self.send_command(0x24)
-        self.send_data2(image)   
+        epdconfig.send_command_with_data(0x24, image)
                 
                 
-        self.send_command(0x26)
-        self.send_data2(buf)  
+        epdconfig.send_command_with_data(0x26, buf)
         self.TurnOnDisplayPart()
 
     def displayPartBaseImage(self, image):
-        self.send_command(0x24)
-        self.send_data2(image)   
+        epdconfig.send_command_with_data(0x24, image)
                 
-        self.send_command(0x26)
-        self.send_data2(image)  
+        epdconfig.send_command_with_data(0x26, image)
         self.TurnOnDisplay()
     
     def Clear(self, color=0xFF):
@@ -287,13 +223,7 @@ class EPD:
             linewidth = int(self.width/8) + 1
         # logger.debug(linewidth)
         
-        buf = [0x00] * self.height * linewidth
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                buf[i + j * linewidth] = color
-
-        self.send_command(0x24)
-        self.send_data2(buf)
+        epdconfig.send_command_with_data(0x24, packing.solid(color, self.height * linewidth))
                 
         # self.send_command(0x26)
         # for j in range(0, self.height):
@@ -307,8 +237,7 @@ class EPD:
         # self.send_data(0xC3)
         # self.send_command(0x20)
 
-        self.send_command(0x10) #enter deep sleep
-        self.send_data(0x03)
+        epdconfig.send_command_with_data(0x10, [0x03]) #enter deep sleep
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
 
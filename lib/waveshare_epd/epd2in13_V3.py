@@ -29,7 +29,9 @@
 
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 122
@@ -37,7 +39,10 @@ EPD_HEIGHT      = 250
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.SSD16xx):
+    RESET_MS = (20, 2, 20)
+    BUSY_POLL_MS = 10
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -90,64 +95,12 @@ class EPD:
         0x22,0x17,0x41,0x0,0x32,0x36,
     ]
         
-    '''
-    function :Hardware reset
-    parameter:
-    '''
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
-
-    '''
-    function :send command
-    parameter:
-     command : Command register
-    '''
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    '''
-    function :send data
-    parameter:
-     data : Write data
-    '''
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-    
-    '''
-    function :Wait until the busy_pin goes LOW
-    parameter:
-    '''
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)  
-        logger.debug("e-Paper busy release")
-
     '''
     function : Turn On Display
     parameter:
     '''
     def TurnOnDisplay(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0xC7)
+        epdconfig.send_command_with_data(0x22, [0xC7]) # Display Update Control
         self.send_command(0x20) # Activate Display Update Sequence
         self.ReadBusy()
     
@@ -156,8 +109,7 @@ class EPD:
     parameter:
     '''
     def TurnOnDisplayPart(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0x0f)    # fast:0x0c, quality:0x0f, 0xcf
+        epdconfig.send_command_with_data(0x22, [0x0f]) # Display Update Control; fast:0x0c, quality:0x0f, 0xcf
         self.send_command(0x20) # Activate Display Update Sequence
         self.ReadBusy()
     
@@ -167,9 +119,7 @@ class EPD:
         lut : lut data
     '''    
     def Lut(self, lut):
-        self.send_command(0x32)
-        for i in range(0, 153):
-            self.send_data(lut[i])
+        epdconfig.send_command_with_data(0x32, lut[:153])
         self.ReadBusy()
     
     '''
@@ -179,16 +129,14 @@ class EPD:
     '''
     def SetLut(self, lut):
         self.Lut(lut)
-        self.send_command(0x3f)
-        self.send_data(lut[153])
-        self.send_command(0x03)     # gate voltage
-        self.send_data(lut[154])
-        self.send_command(0x04)     # source voltage
-        self.send_data(lut[155])    # VSH
-        self.send_data(lut[156])    # VSH2
-        self.send_data(lut[157])    # VSL
-        self.send_command(0x2c)     # VCOM
-        self.send_data(lut[158])
+        epdconfig.send_command_with_data(0x3f, [lut[153]])
+        epdconfig.send_command_with_data(0x03, [lut[154]])     # gate voltage
+        epdconfig.send_command_with_data(0x04, [  # source voltage
+            lut[155],  # VSH
+            lut[156],  # VSH2
+            lut[157],  # VSL
+        ])
+        epdconfig.send_command_with_data(0x2c, [lut[158]])     # VCOM
     
     '''
     function : Setting the display window
@@ -199,16 +147,12 @@ class EPD:
         yend : End position of Y-axis
     '''
     def SetWindow(self, x_start, y_start, x_end, y_end):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
         # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data((x_start>>3) & 0xFF)
-        self.send_data((x_end>>3) & 0xFF)
+        epdconfig.send_command_with_data(0x44, [(x_start>>3) & 0xFF, (x_end>>3) & 0xFF]) # SET_RAM_X_ADDRESS_START_END_POSITION
         
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(y_start & 0xFF)
-        self.send_data((y_start >> 8) & 0xFF)
-        self.send_data(y_end & 0xFF)
-        self.send_data((y_end >> 8) & 0xFF)
+        epdconfig.send_command_with_data(0x45, [  # SET_RAM_Y_ADDRESS_START_END_POSITION
+            y_start & 0xFF, (y_start >> 8) & 0xFF, y_end & 0xFF, (y_end >> 8) & 0xFF,
+        ])
 
     '''
     function : Set Cursor
@@ -217,18 +161,16 @@ class EPD:
         y : Y-axis starting position
     '''
     def SetCursor(self, x, y):
-        self.send_command(0x4E) # SET_RAM_X_ADDRESS_COUNTER
         # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data(x & 0xFF)
+        epdconfig.send_command_with_data(0x4E, [x & 0xFF]) # SET_RAM_X_ADDRESS_COUNTER
         
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(y & 0xFF)
-        self.send_data((y >> 8) & 0xFF)
+        epdconfig.send_command_with_data(0x4F, [y & 0xFF, (y >> 8) & 0xFF]) # SET_RAM_Y_ADDRESS_COUNTER
     
     '''
     function : Initialize the e-Paper register
     parameter:
     '''
+    @epdconfig.precompiled
     def init(self):
         if (epdconfig.module_init() != 0):
             return -1
@@ -239,26 +181,18 @@ class EPD:
         self.send_command(0x12)  #SWRESET
         self.ReadBusy() 
 
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0xf9)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x01, [0xf9, 0x00, 0x00]) #Driver output control
     
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
+        epdconfig.send_command_with_data(0x11, [0x03]) #data entry mode
 
         self.SetWindow(0, 0, self.width-1, self.height-1)
         self.SetCursor(0, 0)
         
-        self.send_command(0x3c)
-        self.send_data(0x05)
+        epdconfig.send_command_with_data(0x3c, [0x05])
 
-        self.send_command(0x21) #  Display update control
-        self.send_data(0x00)
-        self.send_data(0x80)
+        epdconfig.send_command_with_data(0x21, [0x00, 0x80]) # Display update control
     
-        self.send_command(0x18)
-        self.send_data(0x80)
+        epdconfig.send_command_with_data(0x18, [0x80])
         
         self.ReadBusy()
         
@@ -281,7 +215,7 @@ class EPD:
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
+            return packing.solid(0x00, packing.linewidth(self.width) * self.height)
 
         buf = bytearray(img.tobytes('raw'))
         return buf
@@ -297,51 +231,42 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])   
+        epdconfig.send_command_with_data(0x24, image[:self.height * linewidth])
         self.TurnOnDisplay()
     
     '''
     function : Sends the image buffer in RAM to e-Paper and partial refresh
     parameter:
         image : Image data
+        rect  : (x0, y0, x1, y1) area that changed, None for the whole frame
     '''
-    def displayPartial(self, image):
+    def displayPartial(self, image, rect=None):
         epdconfig.digital_write(self.reset_pin, 0)
         epdconfig.delay_ms(1)
         epdconfig.digital_write(self.reset_pin, 1)  
         
         self.SetLut(self.lut_partial_update)
-        self.send_command(0x37)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x40)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)  
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x37, [
+            0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00,
+        ])
 
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
+        epdconfig.send_command_with_data(0x3C, [0x80]) #BorderWavefrom
 
-        self.send_command(0x22) 
-        self.send_data(0xC0)
+        epdconfig.send_command_with_data(0x22, [0xC0])
         self.send_command(0x20)
         self.ReadBusy()
 
-        self.SetWindow(0, 0, self.width - 1, self.height - 1)
-        self.SetCursor(0, 0)
-        
-        self.send_command(0x24) # WRITE_RAM
-        # for j in range(0, self.height):
-        #     for i in range(0, linewidth):
-        #         self.send_data(image[i + j * linewidth])   
-        self.send_data2(image)  
+        if rect is None:
+            self.SetWindow(0, 0, self.width - 1, self.height - 1)
+            self.SetCursor(0, 0)
+
+            self.send_command(0x24) # WRITE_RAM
+            # for j in range(0, self.height):
+            #     for i in range(0, linewidth):
+            #         self.send_data(image[i + j * linewidth])
+            self.send_data2(image)
+        else:
+            self.write_window(image, rect)
         self.TurnOnDisplayPart()
 
     '''
@@ -350,11 +275,9 @@ class EPD:
         image : Image data
     '''
     def displayPartBaseImage(self, image):
-        self.send_command(0x24)
-        self.send_data2(image)  
+        epdconfig.send_command_with_data(0x24, image)
                 
-        self.send_command(0x26)
-        self.send_data2(image)  
+        epdconfig.send_command_with_data(0x26, image)
         self.TurnOnDisplay()
     
     '''
@@ -368,8 +291,7 @@ class EPD:
             linewidth = int(self.width/8) + 1
         # logger.debug(linewidth)
         
-        self.send_command(0x24)
-        self.send_data2([color] * int(self.height * linewidth))  
+        epdconfig.send_command_with_data(0x24, packing.solid(color, int(self.height * linewidth)))
         self.TurnOnDisplay()
 
     '''
@@ -377,8 +299,7 @@ class EPD:
     parameter:
     '''
     def sleep(self):
-        self.send_command(0x10) #enter deep sleep
-        self.send_data(0x01)
+        epdconfig.send_command_with_data(0x10, [0x01]) #enter deep sleep
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
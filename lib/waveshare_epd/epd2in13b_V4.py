@@ -28,7 +28,9 @@
 #
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 122
@@ -36,7 +38,9 @@ EPD_HEIGHT      = 250
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.SSD16xx):
+    RESET_MS = (20, 2, 20)
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -45,63 +49,25 @@ class EPD:
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
-    # hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
-
-    # send 1 byte command
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-    
-    # send 1 byte data
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
     # judge e-Paper whether is busy
     def busy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) != 0): 
-            epdconfig.delay_ms(10)
+        epdconfig.wait_busy(self.busy_pin, 1, 10)
         logger.debug("e-Paper busy release")
 
     # set the display window
     def set_windows(self, xstart, ystart, xend, yend):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
-        self.send_data((xstart>>3) & 0xff)
-        self.send_data((xend>>3) & 0xff)
+        epdconfig.send_command_with_data(0x44, [(xstart>>3) & 0xff, (xend>>3) & 0xff]) # SET_RAM_X_ADDRESS_START_END_POSITION
         
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(ystart & 0xff)
-        self.send_data((ystart >> 8) & 0xff)
-        self.send_data(yend & 0xff)
-        self.send_data((yend >> 8) & 0xff)
+        epdconfig.send_command_with_data(0x45, [  # SET_RAM_Y_ADDRESS_START_END_POSITION
+            ystart & 0xff, (ystart >> 8) & 0xff, yend & 0xff, (yend >> 8) & 0xff,
+        ])
         
     # set the display cursor(origin)
     def set_cursor(self, xstart, ystart):
-        self.send_command(0x4E) # SET_RAM_X_ADDRESS_COUNTER
-        self.send_data(xstart & 0xff)
+        epdconfig.send_command_with_data(0x4E, [xstart & 0xff]) # SET_RAM_X_ADDRESS_COUNTER
 
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(ystart & 0xff)
-        self.send_data((ystart >> 8) & 0xff)
+        epdconfig.send_command_with_data(0x4F, [ystart & 0xff, (ystart >> 8) & 0xff]) # SET_RAM_Y_ADDRESS_COUNTER
 
     # initialize 
     def init(self):
@@ -114,26 +80,18 @@ class EPD:
         self.send_command(0x12)  # SWRESET
         self.busy()   
 
-        self.send_command(0x01) # Driver output control      
-        self.send_data(0xf9)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x01, [0xf9, 0x00, 0x00]) # Driver output control
 
-        self.send_command(0x11) # data entry mode       
-        self.send_data(0x03)
+        epdconfig.send_command_with_data(0x11, [0x03]) # data entry mode
 
         self.set_windows(0, 0, self.width - 1, self.height - 1)
         self.set_cursor(0, 0)
 
-        self.send_command(0x3C) # BorderWavefrom
-        self.send_data(0x05)	
+        epdconfig.send_command_with_data(0x3C, [0x05]) # BorderWavefrom
 
-        self.send_command(0x18) # Read built-in temperature sensor
-        self.send_data(0x80)	
+        epdconfig.send_command_with_data(0x18, [0x80]) # Read built-in temperature sensor
 
-        self.send_command(0x21) # Display update control
-        self.send_data(0x80)	
-        self.send_data(0x80)
+        epdconfig.send_command_with_data(0x21, [0x80, 0x80]) # Display update control
 
         self.busy()
         
@@ -156,18 +114,16 @@ class EPD:
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
+            return packing.solid(0x00, packing.linewidth(self.width) * self.height)
 
         buf = bytearray(img.tobytes('raw'))
         return buf
 
     # display image
     def display(self, imageblack, imagered):
-        self.send_command(0x24)
-        self.send_data2(imageblack)
+        epdconfig.send_command_with_data(0x24, imageblack)
         
-        self.send_command(0x26)
-        self.send_data2(imagered)
+        epdconfig.send_command_with_data(0x26, imagered)
         
         self.ondisplay()
         
@@ -178,13 +134,11 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
             
-        buf = [0xff] * (int(linewidth * self.height))
+        buf = packing.solid(0xff, int(linewidth * self.height))
             
-        self.send_command(0x24)
-        self.send_data2(buf)
+        epdconfig.send_command_with_data(0x24, buf)
         
-        self.send_command(0x26)
-        self.send_data2(buf)
+        epdconfig.send_command_with_data(0x26, buf)
         
         self.ondisplay()
 
@@ -194,8 +148,7 @@ class EPD:
 
     # sleep
     def sleep(self):
-        self.send_command(0x10) # DEEP_SLEEP
-        self.send_data(0x01) # check code
+        epdconfig.send_command_with_data(0x10, [0x01]) # DEEP_SLEEP; check code
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
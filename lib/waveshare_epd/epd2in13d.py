@@ -29,9 +29,10 @@
 
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 from PIL import Image
-import RPi.GPIO as GPIO
 
 # Display resolution
 EPD_WIDTH       = 104
@@ -39,7 +40,9 @@ EPD_HEIGHT      = 212
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.UC81xx):
+    RESET_MS = (200, 5, 200)
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -150,39 +153,9 @@ class EPD:
         0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
     ]
         
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-    
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            self.send_command(0x71)
-            epdconfig.delay_ms(100)  
+        epdconfig.wait_busy(self.busy_pin, 0, 100, poll=lambda: self.send_command(0x71))      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
         
     def TurnOnDisplay(self):
@@ -196,94 +169,50 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x01)	# POWER SETTING
-        self.send_data(0x03)
-        self.send_data(0x00)
-        self.send_data(0x2b)
-        self.send_data(0x2b)
-        self.send_data(0x03)
+        epdconfig.send_command_with_data(0x01, [0x03, 0x00, 0x2b, 0x2b, 0x03])	# POWER SETTING
 
-        self.send_command(0x06)	# boost soft start
-        self.send_data(0x17) # A
-        self.send_data(0x17) # B
-        self.send_data(0x17) # C
+        epdconfig.send_command_with_data(0x06, [  # boost soft start
+            0x17,  # A
+            0x17,  # B
+            0x17,  # C
+        ])
 
         self.send_command(0x04)
         self.ReadBusy()
 
-        self.send_command(0x00)	# panel setting
-        self.send_data(0xbf) # LUT from OTP,128x296
-        self.send_data(0x0d) # VCOM to 0V fast
+        epdconfig.send_command_with_data(0x00, [  # panel setting
+            0xbf,  # LUT from OTP,128x296
+            0x0d,  # VCOM to 0V fast
+        ])
 
-        self.send_command(0x30)	# PLL setting
-        self.send_data(0x3a) # 3a 100HZ   29 150Hz 39 200HZ	31 171HZ
+        epdconfig.send_command_with_data(0x30, [0x3a])	# PLL setting; 3a 100HZ   29 150Hz 39 200HZ	31 171HZ
 
-        self.send_command(0x61)	# resolution setting
-        self.send_data(self.width)
-        self.send_data((self.height >> 8) & 0xff)
-        self.send_data(self.height& 0xff)
+        epdconfig.send_command_with_data(0x61, [  # resolution setting
+            self.width, (self.height >> 8) & 0xff, self.height& 0xff,
+        ])
 
-        self.send_command(0x82)	# vcom_DC setting
-        self.send_data(0x28)
+        epdconfig.send_command_with_data(0x82, [0x28])	# vcom_DC setting
         return 0
         
     def SetFullReg(self):
-        self.send_command(0x82)
-        self.send_data(0x00)
-        self.send_command(0X50)
-        self.send_data(0x97)
+        epdconfig.send_command_with_data(0x82, [0x00])
+        epdconfig.send_command_with_data(0X50, [0x97])
         
-        self.send_command(0x20) # vcom
-        self.send_data2(self.lut_vcomDC)
-        self.send_command(0x21) # ww --
-        self.send_data2(self.lut_ww)
-        self.send_command(0x22) # bw r
-        self.send_data2(self.lut_bw)
-        self.send_command(0x23) # wb w
-        self.send_data2(self.lut_wb)
-        self.send_command(0x24) # bb b
-        self.send_data2(self.lut_bb)
+        epdconfig.send_command_with_data(0x20, self.lut_vcomDC) # vcom
+        epdconfig.send_command_with_data(0x21, self.lut_ww) # ww --
+        epdconfig.send_command_with_data(0x22, self.lut_bw) # bw r
+        epdconfig.send_command_with_data(0x23, self.lut_wb) # wb w
+        epdconfig.send_command_with_data(0x24, self.lut_bb) # bb b
     
     def SetPartReg(self):
-        self.send_command(0x82)
-        self.send_data(0x03)
-        self.send_command(0X50)
-        self.send_data(0x47)
+        epdconfig.send_command_with_data(0x82, [0x03])
+        epdconfig.send_command_with_data(0X50, [0x47])
         
-        self.send_command(0x20) # vcom
-        self.send_data2(self.lut_vcom1)
-        self.send_command(0x21) # ww --
-        self.send_data2(self.lut_ww1)
-        self.send_command(0x22) # bw r
-        self.send_data2(self.lut_bw1)
-        self.send_command(0x23) # wb w
-        self.send_data2(self.lut_wb1)
-        self.send_command(0x24) # bb b
-        self.send_data2(self.lut_bb1)
-
-    def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        epdconfig.send_command_with_data(0x20, self.lut_vcom1) # vcom
+        epdconfig.send_command_with_data(0x21, self.lut_ww1) # ww --
+        epdconfig.send_command_with_data(0x22, self.lut_bw1) # bw r
+        epdconfig.send_command_with_data(0x23, self.lut_wb1) # wb w
+        epdconfig.send_command_with_data(0x24, self.lut_bb1) # bb b
 
     def display(self, image):
         if (Image == None):
@@ -294,12 +223,10 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        self.send_command(0x10)
-        self.send_data2([0x00] * self.height * linewidth)
+        epdconfig.send_command_with_data(0x10, packing.solid(0x00, self.height * linewidth))
         epdconfig.delay_ms(10)
         
-        self.send_command(0x13)
-        self.send_data2(image)
+        epdconfig.send_command_with_data(0x13, image)
         epdconfig.delay_ms(10)
         
         self.SetFullReg()
@@ -310,9 +237,7 @@ class EPD:
             return
             
         self.send_command(0x91)
-        self.send_command(0x90)
-        self.send_data(0)
-        self.send_data(self.width - 1)
+        epdconfig.send_command_with_data(0x90, [0, self.width - 1])
 
         self.send_data(0)
         self.send_data(0)
@@ -325,17 +250,12 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        buf = [0x00] * self.height * linewidth
-
-        for i in range(self.height * linewidth):
-            buf[i] = ~image[i]
+        buf = packing.invert(image[:self.height * linewidth])
         
-        self.send_command(0x10)
-        self.send_data2(image)
+        epdconfig.send_command_with_data(0x10, image)
         epdconfig.delay_ms(10)
         
-        self.send_command(0x13)
-        self.send_data2(buf)
+        epdconfig.send_command_with_data(0x13, buf)
         epdconfig.delay_ms(10)
         
         self.SetPartReg()
@@ -347,23 +267,19 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        self.send_command(0x10)
-        self.send_data2([0x00] * self.height * linewidth)
+        epdconfig.send_command_with_data(0x10, packing.solid(0x00, self.height * linewidth))
         epdconfig.delay_ms(10)
         
-        self.send_command(0x13)
-        self.send_data2([0xFF] * self.height * linewidth)
+        epdconfig.send_command_with_data(0x13, packing.solid(0xFF, self.height * linewidth))
         epdconfig.delay_ms(10)
         
         self.SetFullReg()
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0X50)
-        self.send_data(0xf7)
+        epdconfig.send_command_with_data(0X50, [0xf7])
         self.send_command(0X02) # power off
-        self.send_command(0X07) # deep sleep  
-        self.send_data(0xA5)
+        epdconfig.send_command_with_data(0X07, [0xA5]) # deep sleep
 
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -29,7 +29,9 @@
 #
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 import PIL
 from PIL import Image
@@ -39,9 +41,12 @@ import io
 EPD_WIDTH       = 122
 EPD_HEIGHT      = 250
 
+# Colors supported by the panel, in the order of their codes
+PALETTE = ((0, 0, 0), (255, 255, 255), (255, 255, 0), (255, 0, 0))
+
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.UC81xx):
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -60,45 +65,22 @@ class EPD:
             self.Source_BITS = self.width
 
         
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)         # module reset
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-        
     def ReadBusy(self):
         logger.debug("e-Paper busy H")
         epdconfig.delay_ms(100)
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(5)
+        epdconfig.wait_busy(self.busy_pin, 0, 5)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
         
     def SetWindow(self):
         self.send_command(0x61) # SET_RAM_X_ADDRESS_START_END_POSITION
         # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data(self.Source_BITS/256)
+        self.send_data(int(self.Source_BITS/256))
         self.send_data(self.Source_BITS%256)
-        self.send_data(self.Gate_BITS/256)
+        self.send_data(int(self.Gate_BITS/256))
         self.send_data(self.Gate_BITS%256)
 
     def TurnOnDisplay(self):
-        self.send_command(0x12) # DISPLAY_REFRESH
-        self.send_data(0X00)
+        epdconfig.send_command_with_data(0x12, [0X00]) # DISPLAY_REFRESH
         self.ReadBusy()
         
     def init(self):
@@ -109,66 +91,38 @@ class EPD:
         self.reset()
         
         self.ReadBusy()
-        self.send_command(0x4D)
-        self.send_data(0x78)
-
-        self.send_command(0x00)
-        self.send_data(0x0F)
-        self.send_data(0x29)
-
-        self.send_command(0x01)
-        self.send_data(0x07)
-        self.send_data(0x00)
-
-        self.send_command(0x03)
-        self.send_data(0x10)
-        self.send_data(0x54)
-        self.send_data(0x44)
-
-        self.send_command(0x06)
-        self.send_data(0x05)
-        self.send_data(0x00)
-        self.send_data(0x3F)
-        self.send_data(0x0A)
-        self.send_data(0x25)
-        self.send_data(0x12)
-        self.send_data(0x1A)
-
-        self.send_command(0x50)
-        self.send_data(0x37)
-
-        self.send_command(0x60)
-        self.send_data(0x02)
-        self.send_data(0x02)
+        epdconfig.send_command_with_data(0x4D, [0x78])
+
+        epdconfig.send_command_with_data(0x00, [0x0F, 0x29])
+
+        epdconfig.send_command_with_data(0x01, [0x07, 0x00])
+
+        epdconfig.send_command_with_data(0x03, [0x10, 0x54, 0x44])
+
+        epdconfig.send_command_with_data(0x06, [0x05, 0x00, 0x3F, 0x0A, 0x25, 0x12, 0x1A])
+
+        epdconfig.send_command_with_data(0x50, [0x37])
+
+        epdconfig.send_command_with_data(0x60, [0x02, 0x02])
         
         self.SetWindow()
         
-        self.send_command(0xE7)
-        self.send_data(0x1C)
+        epdconfig.send_command_with_data(0xE7, [0x1C])
 
-        self.send_command(0xE3)
-        self.send_data(0x22)
+        epdconfig.send_command_with_data(0xE3, [0x22])
 
-        self.send_command(0xB4)
-        self.send_data(0xD0)
-        self.send_command(0xB5)
-        self.send_data(0x03)
+        epdconfig.send_command_with_data(0xB4, [0xD0])
+        epdconfig.send_command_with_data(0xB5, [0x03])
 
-        self.send_command(0xE9)
-        self.send_data(0x01)
+        epdconfig.send_command_with_data(0xE9, [0x01])
         
-        self.send_command(0x30)
-        self.send_data(0x08)
+        epdconfig.send_command_with_data(0x30, [0x08])
         
         self.send_command(0x04)
         self.ReadBusy()
         return 0
 
     def getbuffer(self, image):
-        # Create a pallette with the 4 colors supported by the panel
-        pal_image = Image.new("P", (1,1))
-        pal_image.putpalette( (0,0,0,  255,255,255,  255,255,0,   255,0,0) + (0,0,0)*252)
-
         # Check if we need to rotate the image
         imwidth, imheight = image.size
         if(imwidth == self.width and imheight == self.height):
@@ -177,28 +131,13 @@ class EPD:
             image_temp = image.rotate(90, expand=True)
         else:
             logger.warning("Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, self.width, self.height))
+            # return a white buffer
+            return bytearray([0x55]) * (((self.width + 3) // 4) * self.height)
 
-        # Convert the soruce image to the 4 colors, dithering if needed
-        image_4color = image_temp.convert("RGB").quantize(palette=pal_image)
-        buf_4color = bytearray(image_4color.tobytes('raw'))
-
-        # into a single byte to transfer to the panel
-        if self.width % 4 == 0 :
-            Width = self.width // 4
-        else :
-            Width = self.width // 4 + 1
-        Height = self.height 
-        buf = [0x00] * int(Width * Height)
-        idx = 0
-        for j in range(0, Height):
-            for i in range(0, Width):
-                if i == Width -1:
-                    buf[i + j * Width] = (buf_4color[idx] << 6) + (buf_4color[idx+1] << 4)
-                    idx = idx + 2
-                else:
-                    buf[i + j * Width] = (buf_4color[idx] << 6) + (buf_4color[idx+1] << 4) + (buf_4color[idx+2] << 2) + buf_4color[idx+3]
-                    idx = idx + 4
-        return buf
+        # Convert the source image to the 4 colors, dithering if needed, and
+        # pack 4 pixels into each byte to transfer to the panel
+        image_4color = packing.quantize(image_temp, PALETTE)
+        return packing.pack_indices(image_4color, 2)
 
     def display(self, image):
         if self.width % 4 == 0 :
@@ -207,14 +146,13 @@ class EPD:
             Width = self.width // 4 + 1
         Height = self.height
 
-        self.send_command(0x10)
+        # controller rows are Source_BITS wide, the columns past the panel are 0x00
+        buf = bytearray()
         for j in range(0, Height):
-            for i in range(0, self.Source_BITS//4):
-                if i < 31 :
-                    self.send_data(image[i + j * Width])
-                else :
-                    self.send_data(0x00)
-                    
+            buf += bytes(image[j * Width:j * Width + 31])
+            buf += bytes(self.Source_BITS//4 - 31)
+        epdconfig.send_command_with_data(0x10, buf)
+
         self.TurnOnDisplay()
         
     def Clear(self, color=0x55):
@@ -222,10 +160,7 @@ class EPD:
         Height = self.height
 
 
-        self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, Width):
-                    self.send_data(color)
+        epdconfig.send_command_with_data(0x10, packing.solid(color, Height * Width))
         self.TurnOnDisplay()
 
     def sleep(self):
@@ -233,8 +168,7 @@ class EPD:
         self.ReadBusy()
         epdconfig.delay_ms(100)
         
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        epdconfig.send_command_with_data(0x07, [0XA5]) # DEEP_SLEEP
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
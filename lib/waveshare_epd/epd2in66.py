@@ -28,7 +28,9 @@
 #
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 152
@@ -36,7 +38,13 @@ EPD_HEIGHT      = 296
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.SSD16xx):
+    # the window is RAM x bytes 1..19 and rows 0..296, display() starts at row 295
+    RAM_X = 1
+    RAM_Y = 295
+    RAM_ROWS = 297
+    BUSY_POLL_MS = 200
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -65,44 +73,7 @@ class EPD:
     ]
 
         
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-
-
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200) 
-        logger.debug("e-Paper busy release") 
-
-
+    @epdconfig.precompiled
     def init(self, mode):
         if (epdconfig.module_init() != 0):
             return -1
@@ -113,40 +84,22 @@ class EPD:
         epdconfig.delay_ms(300)
         self.ReadBusy()
 
-        self.send_command(0x11) # setting gaet number
-        self.send_data(0x03)
-        self.send_command(0x44) # set gate voltage
-        self.send_data(0x01)
-        self.send_data(0x13)
-        self.send_command(0x45) # set source voltage
-        self.send_data(0x0)
-        self.send_data(0x0)
-        self.send_data(0x28)
-        self.send_data(0x01)
+        epdconfig.send_command_with_data(0x11, [0x03]) # setting gaet number
+        epdconfig.send_command_with_data(0x44, [0x01, 0x13]) # set gate voltage
+        epdconfig.send_command_with_data(0x45, [0x0, 0x0, 0x28, 0x01]) # set source voltage
     
         if(mode == 0):      #full
-            self.send_command(0x3C)
-            self.send_data(0x01)
+            epdconfig.send_command_with_data(0x3C, [0x01])
             
         elif(mode == 1):        #partial
             self.load_lut(self.WF_PARTIAL)
-            self.send_command(0x37) # set display option, these setting turn on previous function
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)  
-            self.send_data(0x40)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)  
-
-            self.send_command(0x3C)
-            self.send_data(0x80)
-
-            self.send_command(0x22)
-            self.send_data(0xcf)
+            epdconfig.send_command_with_data(0x37, [  # set display option, these setting turn on previous function
+                0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00,
+            ])
+
+            epdconfig.send_command_with_data(0x3C, [0x80])
+
+            epdconfig.send_command_with_data(0x22, [0xcf])
             
             self.send_command(0x20)
             self.ReadBusy()
@@ -167,72 +120,44 @@ class EPD:
         self.send_command(0x20)
         self.ReadBusy()
 
-    def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
-
-
-    def display(self, image):
+    # rect: in partial mode (init(1)) the (x0, y0, x1, y1) area that changed,
+    # None for the whole frame
+    def display(self, image, rect=None):
         if (image == None):
             return            
 
-        self.send_command(0x4E)
-        self.send_data(0x01)
-        self.send_command(0x4F)
-        self.send_data(0x27)
-        self.send_data(0x01)
+        if rect is not None:
+            self.write_window(image, rect)
+            self.turnon_display()
+            return
+
+        epdconfig.send_command_with_data(0x4E, [0x01])
+        epdconfig.send_command_with_data(0x4F, [0x27, 0x01])
 
-        self.send_command(0x24)
-        self.send_data2(image)
+        epdconfig.send_command_with_data(0x24, image)
         self.turnon_display()
         
 
     def Clear(self):
-        self.send_command(0x4E)
-        self.send_data(0x01)
-        self.send_command(0x4F)
-        self.send_data(0x27)
-        self.send_data(0x01)
+        epdconfig.send_command_with_data(0x4E, [0x01])
+        epdconfig.send_command_with_data(0x4F, [0x27, 0x01])
 
         if self.width%8 == 0:
             linewidth = int(self.width/8)
         else:
             linewidth = int(self.width/8) + 1
 
-        buf = [0xff] * int(self.height * linewidth)
+        buf = packing.solid(0xff, int(self.height * linewidth))
 
-        self.send_command(0x24)
-        self.send_data2(buf)   
+        epdconfig.send_command_with_data(0x24, buf)
 
-        self.send_command(0x26)
-        self.send_data2(buf) 
+        epdconfig.send_command_with_data(0x26, buf)
 
         self.turnon_display()
 
 
     def sleep(self):
-        self.send_command(0X10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        epdconfig.send_command_with_data(0X10, [0x01]) # DEEP_SLEEP_MODE
 
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -28,7 +28,9 @@
 #
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 152
@@ -36,7 +38,10 @@ EPD_HEIGHT      = 296
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.SSD16xx):
+    RESET_MS = (200, 5, 200)
+    BUSY_POLL_MS = 20
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -45,44 +50,6 @@ class EPD:
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-
-
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(20) 
-        logger.debug("e-Paper busy release") 
-
-
     def init(self):
         if (epdconfig.module_init() != 0):
             return -1
@@ -93,14 +60,11 @@ class EPD:
         epdconfig.delay_ms(30)
         self.ReadBusy()
 
-        self.send_command(0x11) # setting gaet number
-        self.send_data(0x03)
+        epdconfig.send_command_with_data(0x11, [0x03]) # setting gaet number
         
         self.setWindows(0, 0, self.width-1, self.height-1)
         
-        self.send_command(0x21)
-        self.send_data(0x00)
-        self.send_data(0x80)
+        epdconfig.send_command_with_data(0x21, [0x00, 0x80])
         
         self.setCursor(0, 0)
         self.ReadBusy()
@@ -108,63 +72,28 @@ class EPD:
         return 0
 
     def setWindows(self, Xstart, Ystart, Xend, Yend):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
-        self.send_data((Xstart>>3) & 0x1F)
-        self.send_data((Xend>>3) & 0x1F)
+        epdconfig.send_command_with_data(0x44, [(Xstart>>3) & 0x1F, (Xend>>3) & 0x1F]) # SET_RAM_X_ADDRESS_START_END_POSITION
         
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(Ystart & 0xFF)
-        self.send_data((Ystart >> 8) & 0x01)
-        self.send_data(Yend & 0xFF)
-        self.send_data((Yend >> 8) & 0x01)
+        epdconfig.send_command_with_data(0x45, [  # SET_RAM_Y_ADDRESS_START_END_POSITION
+            Ystart & 0xFF, (Ystart >> 8) & 0x01, Yend & 0xFF, (Yend >> 8) & 0x01,
+        ])
 
     def setCursor(self, Xstart, Ystart):
-        self.send_command(0x4E) # SET_RAM_X_ADDRESS_COUNTER
-        self.send_data(Xstart & 0x1F)
+        epdconfig.send_command_with_data(0x4E, [Xstart & 0x1F]) # SET_RAM_X_ADDRESS_COUNTER
 
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(Ystart & 0xFF)
-        self.send_data((Ystart >> 8) & 0x01)
+        epdconfig.send_command_with_data(0x4F, [Ystart & 0xFF, (Ystart >> 8) & 0x01]) # SET_RAM_Y_ADDRESS_COUNTER
         
     def turnon_display(self):
         self.send_command(0x20)
         self.ReadBusy()
 
-    def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
-
     def display(self, Blackimage, Redimage):
         if (Blackimage == None or Redimage == None):
             return   
-        Redimage_1 = [0x00] * len(Redimage)
-        for i in range(len(Redimage)) :
-            Redimage_1[i] = ~Redimage[i]    
-        self.send_command(0x24)
-        self.send_data2(Blackimage) 
-
-        self.send_command(0x26)
-        self.send_data2(Redimage_1) 
+        Redimage_1 = packing.invert(Redimage)
+        epdconfig.send_command_with_data(0x24, Blackimage)
+
+        epdconfig.send_command_with_data(0x26, Redimage_1)
                 
         self.turnon_display()
         
@@ -175,18 +104,15 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        self.send_command(0x24)
-        self.send_data2([0xff] * int(self.height * linewidth)) 
+        epdconfig.send_command_with_data(0x24, packing.solid(0xff, int(self.height * linewidth)))
 
-        self.send_command(0x26)
-        self.send_data2([0x00] * int(self.height * linewidth))
+        epdconfig.send_command_with_data(0x26, packing.solid(0x00, int(self.height * linewidth)))
 
         self.turnon_display()
 
 
     def sleep(self):
-        self.send_command(0X10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        epdconfig.send_command_with_data(0X10, [0x01]) # DEEP_SLEEP_MODE
 
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -28,7 +28,9 @@
 #
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 128
@@ -36,7 +38,10 @@ EPD_HEIGHT      = 296
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.SSD16xx):
+    RESET_MS = (50, 2, 50)
+    BUSY_POLL_MS = 10
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -89,91 +94,45 @@ class EPD:
     0x22,	0x17,	0x41,	0x0,	0x32,	0x36
     ]
 
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(50) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(50)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(10) 
-        logger.debug("e-Paper busy release")  
-
     def TurnOnDisplay(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0xc7)
+        epdconfig.send_command_with_data(0x22, [0xc7]) # DISPLAY_UPDATE_CONTROL_2
         self.send_command(0x20) # MASTER_ACTIVATION
         self.ReadBusy()
 
     def TurnOnDisplay_Partial(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0x0F)
+        epdconfig.send_command_with_data(0x22, [0x0F]) # DISPLAY_UPDATE_CONTROL_2
         self.send_command(0x20) # MASTER_ACTIVATION
         self.ReadBusy()
 
     def lut(self, lut):
-        self.send_command(0x32)
-        for i in range(0, 153):
-            self.send_data(lut[i])
+        epdconfig.send_command_with_data(0x32, lut[:153])
         self.ReadBusy()
 
     def SetLut(self, lut):
         self.lut(lut)
-        self.send_command(0x3f)
-        self.send_data(lut[153])
-        self.send_command(0x03);	# gate voltage
-        self.send_data(lut[154])
-        self.send_command(0x04);	# source voltage
-        self.send_data(lut[155])	# VSH
-        self.send_data(lut[156])	# VSH2
-        self.send_data(lut[157])	# VSL
-        self.send_command(0x2c);		# VCOM
-        self.send_data(lut[158])
+        epdconfig.send_command_with_data(0x3f, [lut[153]])
+        epdconfig.send_command_with_data(0x03, [lut[154]])	# gate voltage
+        epdconfig.send_command_with_data(0x04, [  # source voltage
+            lut[155],  # VSH
+            lut[156],  # VSH2
+            lut[157],  # VSL
+        ])
+        epdconfig.send_command_with_data(0x2c, [lut[158]])		# VCOM
 
     def SetWindow(self, x_start, y_start, x_end, y_end):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
         # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data((x_start>>3) & 0xFF)
-        self.send_data((x_end>>3) & 0xFF)
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(y_start & 0xFF)
-        self.send_data((y_start >> 8) & 0xFF)
-        self.send_data(y_end & 0xFF)
-        self.send_data((y_end >> 8) & 0xFF)
+        epdconfig.send_command_with_data(0x44, [(x_start>>3) & 0xFF, (x_end>>3) & 0xFF]) # SET_RAM_X_ADDRESS_START_END_POSITION
+        epdconfig.send_command_with_data(0x45, [  # SET_RAM_Y_ADDRESS_START_END_POSITION
+            y_start & 0xFF, (y_start >> 8) & 0xFF, y_end & 0xFF, (y_end >> 8) & 0xFF,
+        ])
 
     def SetCursor(self, x, y):
-        self.send_command(0x4E) # SET_RAM_X_ADDRESS_COUNTER
         # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data(x & 0xFF)
+        epdconfig.send_command_with_data(0x4E, [x & 0xFF]) # SET_RAM_X_ADDRESS_COUNTER
         
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(y & 0xFF)
-        self.send_data((y >> 8) & 0xFF)
+        epdconfig.send_command_with_data(0x4F, [y & 0xFF, (y >> 8) & 0xFF]) # SET_RAM_Y_ADDRESS_COUNTER
         
+    @epdconfig.precompiled
     def init(self):
         if (epdconfig.module_init() != 0):
             return -1
@@ -184,19 +143,13 @@ class EPD:
         self.send_command(0x12)  #SWRESET
         self.ReadBusy() 
 
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0x27)
-        self.send_data(0x01)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x01, [0x27, 0x01, 0x00]) #Driver output control
     
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
+        epdconfig.send_command_with_data(0x11, [0x03]) #data entry mode
 
         self.SetWindow(0, 0, self.width-1, self.height-1)
 
-        self.send_command(0x21) #  Display update control
-        self.send_data(0x00)
-        self.send_data(0x80)
+        epdconfig.send_command_with_data(0x21, [0x00, 0x80]) # Display update control
     
         self.SetCursor(0, 0)
         self.ReadBusy()
@@ -205,50 +158,23 @@ class EPD:
         # EPD hardware init end
         return 0
 
-    def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
-
     def display(self, image):
         if (image == None):
             return            
-        self.send_command(0x24) # WRITE_RAM
-        self.send_data2(image)   
+        epdconfig.send_command_with_data(0x24, image) # WRITE_RAM
         self.TurnOnDisplay()
 
     def display_Base(self, image):
         if (image == None):
             return   
             
-        self.send_command(0x24) # WRITE_RAM
-        self.send_data2(image)
+        epdconfig.send_command_with_data(0x24, image) # WRITE_RAM
                 
-        self.send_command(0x26) # WRITE_RAM
-        self.send_data2(image)   
+        epdconfig.send_command_with_data(0x26, image) # WRITE_RAM
                 
         self.TurnOnDisplay()
         
-    def display_Partial(self, image):
+    def display_Partial(self, image, rect=None):
         if (image == None):
             return
             
@@ -258,31 +184,24 @@ class EPD:
         epdconfig.delay_ms(2)   
         
         self.SetLut(self.WF_PARTIAL_2IN9)
-        self.send_command(0x37)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x40)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)  
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x37, [
+            0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00,
+        ])
 
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
+        epdconfig.send_command_with_data(0x3C, [0x80]) #BorderWavefrom
 
-        self.send_command(0x22) 
-        self.send_data(0xC0)
+        epdconfig.send_command_with_data(0x22, [0xC0])
         self.send_command(0x20)
         self.ReadBusy()
 
-        self.SetWindow(0, 0, self.width - 1, self.height - 1)
-        self.SetCursor(0, 0)
-        
-        self.send_command(0x24) # WRITE_RAM
-        self.send_data2(image)   
+        if rect is None:
+            self.SetWindow(0, 0, self.width - 1, self.height - 1)
+            self.SetCursor(0, 0)
+
+            epdconfig.send_command_with_data(0x24, image) # WRITE_RAM
+        else:
+            # only the rows/bytes of `rect`, (x0, y0, x1, y1) in pixels
+            self.write_window(image, rect)
         self.TurnOnDisplay_Partial()
 
     def Clear(self, color=0xFF):
@@ -291,13 +210,11 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        self.send_command(0x24) # WRITE_RAM
-        self.send_data2([color] * int(self.height * linewidth)) 
+        epdconfig.send_command_with_data(0x24, packing.solid(color, int(self.height * linewidth))) # WRITE_RAM
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0x10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        epdconfig.send_command_with_data(0x10, [0x01]) # DEEP_SLEEP_MODE
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
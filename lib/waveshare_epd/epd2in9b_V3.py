@@ -29,7 +29,9 @@
 
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 128
@@ -37,7 +39,10 @@ EPD_HEIGHT      = 296
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.UC81xx):
+    BUSY_POLL_MS = 200
+    BUSY_COMMAND = 0x71
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -46,42 +51,6 @@ class EPD:
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        self.send_command(0X71)
-        while(epdconfig.digital_read(self.busy_pin) == 0):      #  0: idle, 1: busy
-            self.send_command(0X71)
-            epdconfig.delay_ms(200)                
-        logger.debug("e-Paper busy release")
-        
     def init(self):
         if (epdconfig.module_init() != 0):
             return -1
@@ -91,62 +60,34 @@ class EPD:
         self.send_command(0x04)  
         self.ReadBusy()#waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0x00)    #panel setting
-        self.send_data(0x0f)   #LUT from OTP,128x296
-        self.send_data(0x89)    #Temperature sensor, boost and other related timing settings
+        epdconfig.send_command_with_data(0x00, [  #panel setting
+            0x0f,  #LUT from OTP,128x296
+            0x89,  #Temperature sensor, boost and other related timing settings
+        ])
 
         self.send_command(0x61)    #resolution setting
         self.send_data (0x80)  
         self.send_data (0x01)  
         self.send_data (0x28)
 
-        self.send_command(0X50)    #VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x77)   #WBmode:VBDF 17|D7 VBDW 97 VBDB 57
+        epdconfig.send_command_with_data(0X50, [0x77])    #VCOM AND DATA INTERVAL SETTING; WBmode:VBDF 17|D7 VBDW 97 VBDB 57
                             # WBRmode:VBDF F7 VBDW 77 VBDB 37  VBDR B7
         
         return 0
 
-    def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
-
     def display(self, blackimage, ryimage): # ryimage: red or yellow image
         if (blackimage != None):
-            self.send_command(0X10)
-            self.send_data2(blackimage)        
+            epdconfig.send_command_with_data(0X10, blackimage)
         if (ryimage != None):
-            self.send_command(0X13)
-            self.send_data2(ryimage)
+            epdconfig.send_command_with_data(0X13, ryimage)
 
         self.send_command(0x12)
         epdconfig.delay_ms(200) 
         self.ReadBusy()
         
     def Clear(self):
-        self.send_command(0X10)
-        self.send_data2([0xff] * int(self.width * self.height / 8))
-        self.send_command(0X13)
-        self.send_data2([0xff] * int(self.width * self.height / 8))
+        epdconfig.send_command_with_data(0X10, packing.solid(0xff, int(self.width * self.height / 8)))
+        epdconfig.send_command_with_data(0X13, packing.solid(0xff, int(self.width * self.height / 8)))
 
         self.send_command(0x12)
         epdconfig.delay_ms(200) 
@@ -155,8 +96,7 @@ class EPD:
     def sleep(self):
         self.send_command(0X02) # power off
         self.ReadBusy()
-        self.send_command(0X07) # deep sleep
-        self.send_data(0xA5)
+        epdconfig.send_command_with_data(0X07, [0xA5]) # deep sleep
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -28,12 +28,18 @@
 #
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 280
 EPD_HEIGHT      = 480
 
+# 4-gray bit planes, plane bit for black, dark gray, light gray and white
+GRAY_PLANE_24 = packing.plane_table((0, 1, 0, 1))
+GRAY_PLANE_26 = packing.plane_table((0, 0, 1, 1))
+
 GRAY1  = 0xff #white
 GRAY2  = 0xC0 #Close to white
 GRAY3  = 0x80 #Close to black
@@ -41,7 +47,10 @@ GRAY4  = 0x00 #black
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.SSD16xx):
+    RESET_MS = (200, 5, 200)
+    BUSY_POLL_MS = 10
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -110,44 +119,6 @@ class EPD:
         0x22,0x22,0x22,0x22,0x22
     ]
         
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-
-
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(10) 
-        logger.debug("e-Paper busy release") 
-
-
     def init(self, mode):
         if (epdconfig.module_init() != 0):
             return -1
@@ -157,153 +128,65 @@ class EPD:
         self.send_command(0x12)
         epdconfig.delay_ms(300)
         
-        self.send_command(0x46)
-        self.send_data(0xF7)
+        epdconfig.send_command_with_data(0x46, [0xF7])
         self.ReadBusy()
-        self.send_command(0x47)
-        self.send_data(0xF7)
+        epdconfig.send_command_with_data(0x47, [0xF7])
         self.ReadBusy()
         
-        self.send_command(0x01) # setting gaet number
-        self.send_data(0xDF)
-        self.send_data(0x01)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x01, [0xDF, 0x01, 0x00]) # setting gaet number
 
-        self.send_command(0x03) # set gate voltage
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x03, [0x00]) # set gate voltage
 
-        self.send_command(0x04) # set source voltage
-        self.send_data(0x41)
-        self.send_data(0xA8)
-        self.send_data(0x32)
+        epdconfig.send_command_with_data(0x04, [0x41, 0xA8, 0x32]) # set source voltage
 
-        self.send_command(0x11) # set data entry sequence
-        self.send_data(0x03)
+        epdconfig.send_command_with_data(0x11, [0x03]) # set data entry sequence
 
-        self.send_command(0x3C) # set border 
-        self.send_data(0x03)
+        epdconfig.send_command_with_data(0x3C, [0x03]) # set border
         
-        self.send_command(0x0C) # set booster strength
-        self.send_data(0xAE)
-        self.send_data(0xC7)
-        self.send_data(0xC3)
-        self.send_data(0xC0)
-        self.send_data(0xC0)
-
-        self.send_command(0x18) # set internal sensor on
-        self.send_data(0x80)
+        epdconfig.send_command_with_data(0x0C, [0xAE, 0xC7, 0xC3, 0xC0, 0xC0]) # set booster strength
+
+        epdconfig.send_command_with_data(0x18, [0x80]) # set internal sensor on
          
-        self.send_command(0x2C) # set vcom value
-        self.send_data(0x44)
+        epdconfig.send_command_with_data(0x2C, [0x44]) # set vcom value
         
         if(mode == 0):   #4Gray
-            self.send_command(0x37) # set display option, these setting turn on previous function
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)  
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)  
+            epdconfig.send_command_with_data(0x37, [  # set display option, these setting turn on previous function
+                0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+            ])
         elif(mode == 1):      #1Gray
-            self.send_command(0x37) # set display option, these setting turn on previous function
-            self.send_data(0x00)     #can switch 1 gray or 4 gray
-            self.send_data(0xFF)
-            self.send_data(0xFF)
-            self.send_data(0xFF)
-            self.send_data(0xFF)  
-            self.send_data(0x4F)
-            self.send_data(0xFF)
-            self.send_data(0xFF)
-            self.send_data(0xFF)
-            self.send_data(0xFF)
+            epdconfig.send_command_with_data(0x37, [  # set display option, these setting turn on previous function
+                0x00,  #can switch 1 gray or 4 gray
+                0xFF,
+                0xFF,
+                0xFF,
+                0xFF,
+                0x4F,
+                0xFF,
+                0xFF,
+                0xFF,
+                0xFF,
+            ])
         else:
             logger.debug("There is no such mode") 
 
-        self.send_command(0x44) # setting X direction start/end position of RAM
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x17)
-        self.send_data(0x01)
+        epdconfig.send_command_with_data(0x44, [0x00, 0x00, 0x17, 0x01]) # setting X direction start/end position of RAM
 
-        self.send_command(0x45) # setting Y direction start/end position of RAM
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0xDF)
-        self.send_data(0x01)
+        epdconfig.send_command_with_data(0x45, [0x00, 0x00, 0xDF, 0x01]) # setting Y direction start/end position of RAM
 
-        self.send_command(0x22) # Display Update Control 2
-        self.send_data(0xCF)
+        epdconfig.send_command_with_data(0x22, [0xCF]) # Display Update Control 2
         return 0
 
 
     def load_lut(self, lut):
-        self.send_command(0x32)
-        self.send_data2(lut)
-
-
-    def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        epdconfig.send_command_with_data(0x32, lut)
 
 
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i = i + 1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = imwidth - x - 1
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i = i + 1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
+        buf = packing.pack_2bpp_gray(image, self.width, self.height)
+        if buf is None:
+            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
+            # return a blank buffer
+            return packing.solid(0xFF, int(self.width / 4) * self.height)
         return buf
 
 
@@ -311,94 +194,18 @@ class EPD:
         if (image == None):
             return            
 
-        self.send_command(0x4E)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_command(0x4F)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x4E, [0x00, 0x00])
+        epdconfig.send_command_with_data(0x4F, [0x00, 0x00])
 
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
+        epdconfig.send_command_with_data(0x24, packing.split_2bpp(image, GRAY_PLANE_24))
+
+        epdconfig.send_command_with_data(0x4E, [0x00, 0x00])
+        epdconfig.send_command_with_data(0x4F, [0x00, 0x00])
 
-        buf = [0x00] * self.height * linewidth
-
-        self.send_command(0x24)
-        for i in range(0, (int)(self.height*(self.width/8))):
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x01           #white
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x00           #black
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00           #gray1
-                    else:                       #0x40
-                        temp3 |= 0x01           #gray2
-                    temp3 <<= 1
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):          #white
-                        temp3 |= 0x01
-                    elif(temp2 == 0x00):        #black
-                        temp3 |= 0x00
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00           #gray1
-                    else:                       #0x40
-                        temp3 |= 0x01           #gray2
-                    if(j!=1 or k!=1):
-                        temp3 <<= 1
-                    temp1 <<= 2
-            buf[i] = temp3
-        self.send_data2(buf)
-
-        self.send_command(0x4E)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_command(0x4F)
-        self.send_data(0x00)
-        self.send_data(0x00)
-
-        self.send_command(0x26)
-        for i in range(0, (int)(self.height*(self.width/8))):
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x01       #white
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x00       #black
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x01       #gray1
-                    else:                   #0x40
-                        temp3 |= 0x00       #gray2
-                    temp3 <<= 1
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):      #white
-                        temp3 |= 0x01
-                    elif(temp2 == 0x00):    #black
-                        temp3 |= 0x00
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x01       #gray1
-                    else:                   #0x40
-                        temp3 |= 0x00       #gray2
-                    if(j!=1 or k!=1):
-                        temp3 <<= 1
-                    temp1 <<= 2
-            buf[i] = temp3
-        self.send_data2(buf)
+        epdconfig.send_command_with_data(0x26, packing.split_2bpp(image, GRAY_PLANE_26))
 
         self.load_lut(self.lut_4Gray_GC)
-        self.send_command(0x22)
-        self.send_data(0xC7)
+        epdconfig.send_command_with_data(0x22, [0xC7])
         self.send_command(0x20)
         self.ReadBusy()   
 
@@ -407,15 +214,10 @@ class EPD:
         if (image == None):
             return            
 
-        self.send_command(0x4E)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_command(0x4F)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x4E, [0x00, 0x00])
+        epdconfig.send_command_with_data(0x4F, [0x00, 0x00])
 
-        self.send_command(0x24)
-        self.send_data2(image)   
+        epdconfig.send_command_with_data(0x24, image)
 
         self.load_lut(self.lut_1Gray_A2)
         self.send_command(0x20)
@@ -423,28 +225,21 @@ class EPD:
         
 
     def Clear(self, color, mode):
-        self.send_command(0x4E)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_command(0x4F)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x4E, [0x00, 0x00])
+        epdconfig.send_command_with_data(0x4F, [0x00, 0x00])
 
         if self.width%8 == 0:
             linewidth = int(self.width/8)
         else:
             linewidth = int(self.width/8) + 1
 
-        self.send_command(0x24)
-        self.send_data2([0xff] * int(self.height * linewidth))
+        epdconfig.send_command_with_data(0x24, packing.solid(0xff, int(self.height * linewidth)))
 
         if(mode == 0):              #4Gray
-            self.send_command(0x26)
-            self.send_data2([0xff] * int(self.height * linewidth))
+            epdconfig.send_command_with_data(0x26, packing.solid(0xff, int(self.height * linewidth)))
 
             self.load_lut(self.lut_4Gray_GC)
-            self.send_command(0x22)
-            self.send_data(0xC7)
+            epdconfig.send_command_with_data(0x22, [0xC7])
         elif(mode == 1):            #1Gray
             self.load_lut(self.lut_1Gray_DU)
         else:
@@ -455,8 +250,7 @@ class EPD:
 
 
     def sleep(self):
-        self.send_command(0X10) #deep sleep
-        self.send_data(0x03)
+        epdconfig.send_command_with_data(0X10, [0x03]) #deep sleep
 
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -29,14 +29,19 @@
 
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 from PIL import Image
-import RPi.GPIO as GPIO
 
 # Display resolution
 EPD_WIDTH  = 400
 EPD_HEIGHT = 300
 
+# 4-gray bit planes, plane bit for black, dark gray, light gray and white
+GRAY_PLANE_10 = packing.plane_table((0, 0, 1, 1))
+GRAY_PLANE_13 = packing.plane_table((0, 1, 0, 1))
+
 GRAY1 = 0xff  # white
 GRAY2 = 0xC0
 GRAY3 = 0x80  # gray
@@ -45,7 +50,11 @@ GRAY4 = 0x00  # Blackest
 logger = logging.getLogger(__name__)
 
 
-class EPD:
+class EPD(controller.UC81xx):
+    RESET_MS = (10, 10, 10)
+    RESET_PULSES = 3
+    BUSY_COMMAND = 0x71
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -57,7 +66,11 @@ class EPD:
         self.GRAY2 = GRAY2
         self.GRAY3 = GRAY3  # gray
         self.GRAY4 = GRAY4  # Blackest
-        self.DATA = [0x00] * 15000
+        # frame on the panel as the partial refresh takes it, i.e. inverted
+        self.DATA = bytearray(packing.linewidth(EPD_WIDTH) * EPD_HEIGHT)
+        # region buffers reused by EPD_4IN2_PartialDisplay()
+        self._old = bytearray(len(self.DATA))
+        self._new = bytearray(len(self.DATA))
 
     lut_vcom0 = [
         0x00, 0x08, 0x08, 0x00, 0x00, 0x02,
@@ -214,98 +227,40 @@ class EPD:
         0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
     ]
 
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(10)
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(10)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(10)
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(10)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(10)
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(10)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(10)
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def ReadBusy(self):
-        self.send_command(0x71)
-        while epdconfig.digital_read(self.busy_pin) == 0:  # 0: idle, 1: busy
-            self.send_command(0x71)
-            epdconfig.delay_ms(100)
-
     def set_lut(self):
-        self.send_command(0x20)  # vcom
-        self.send_data2(self.lut_vcom0)
+        epdconfig.send_command_with_data(0x20, self.lut_vcom0)  # vcom
 
-        self.send_command(0x21)  # ww --
-        self.send_data2(self.lut_ww)
+        epdconfig.send_command_with_data(0x21, self.lut_ww)  # ww --
 
-        self.send_command(0x22)  # bw r
-        self.send_data2(self.lut_bw)
+        epdconfig.send_command_with_data(0x22, self.lut_bw)  # bw r
 
-        self.send_command(0x23)  # wb w
-        self.send_data2(self.lut_bb)
+        epdconfig.send_command_with_data(0x23, self.lut_bb)  # wb w
 
-        self.send_command(0x24)  # bb b
-        self.send_data2(self.lut_wb)
+        epdconfig.send_command_with_data(0x24, self.lut_wb)  # bb b
 
     def Partial_SetLut(self):
-        self.send_command(0x20)
-        self.send_data2(self.EPD_4IN2_Partial_lut_vcom1)
+        epdconfig.send_command_with_data(0x20, self.EPD_4IN2_Partial_lut_vcom1)
 
-        self.send_command(0x21)
-        self.send_data2(self.EPD_4IN2_Partial_lut_ww1)
+        epdconfig.send_command_with_data(0x21, self.EPD_4IN2_Partial_lut_ww1)
 
-        self.send_command(0x22)
-        self.send_data2(self.EPD_4IN2_Partial_lut_bw1)
+        epdconfig.send_command_with_data(0x22, self.EPD_4IN2_Partial_lut_bw1)
 
-        self.send_command(0x23)
-        self.send_data2(self.EPD_4IN2_Partial_lut_wb1)
+        epdconfig.send_command_with_data(0x23, self.EPD_4IN2_Partial_lut_wb1)
 
-        self.send_command(0x24)
-        self.send_data2(self.EPD_4IN2_Partial_lut_bb1)
+        epdconfig.send_command_with_data(0x24, self.EPD_4IN2_Partial_lut_bb1)
 
     def Gray_SetLut(self):
-        self.send_command(0x20)  # vcom
-        self.send_data2(self.EPD_4IN2_4Gray_lut_vcom)
+        epdconfig.send_command_with_data(0x20, self.EPD_4IN2_4Gray_lut_vcom)  # vcom
 
-        self.send_command(0x21)  # red not use
-        self.send_data2(self.EPD_4IN2_4Gray_lut_ww)
+        epdconfig.send_command_with_data(0x21, self.EPD_4IN2_4Gray_lut_ww)  # red not use
 
-        self.send_command(0x22)  # bw r
-        self.send_data2(self.EPD_4IN2_4Gray_lut_bw)
+        epdconfig.send_command_with_data(0x22, self.EPD_4IN2_4Gray_lut_bw)  # bw r
 
-        self.send_command(0x23)  # wb w
-        self.send_data2(self.EPD_4IN2_4Gray_lut_wb)
+        epdconfig.send_command_with_data(0x23, self.EPD_4IN2_4Gray_lut_wb)  # wb w
 
-        self.send_command(0x24)  # bb b
-        self.send_data2(self.EPD_4IN2_4Gray_lut_bb)
+        epdconfig.send_command_with_data(0x24, self.EPD_4IN2_4Gray_lut_bb)  # bb b
 
-        self.send_command(0x25)  # vcom
-        self.send_data2(self.EPD_4IN2_4Gray_lut_ww)
+        epdconfig.send_command_with_data(0x25, self.EPD_4IN2_4Gray_lut_ww)  # vcom
 
     def init(self):
         if epdconfig.module_init() != 0:
@@ -313,34 +268,30 @@ class EPD:
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0x01)  # POWER SETTING
-        self.send_data(0x03)  # VDS_EN, VDG_EN
-        self.send_data(0x00)  # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
-        self.send_data(0x2b)  # VDH
-        self.send_data(0x2b)  # VDL
+        epdconfig.send_command_with_data(0x01, [  # POWER SETTING
+            0x03,  # VDS_EN, VDG_EN
+            0x00,  # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
+            0x2b,  # VDH
+            0x2b,  # VDL
+        ])
 
-        self.send_command(0x06)  # boost soft start
-        self.send_data(0x17)
-        self.send_data(0x17)
-        self.send_data(0x17)
+        epdconfig.send_command_with_data(0x06, [0x17, 0x17, 0x17])  # boost soft start
 
         self.send_command(0x04)  # POWER_ON
         self.ReadBusy()
 
-        self.send_command(0x00)  # panel setting
-        self.send_data(0xbf)  # KW-BF   KWR-AF  BWROTP 0f
+        epdconfig.send_command_with_data(0x00, [0xbf])  # panel setting; KW-BF   KWR-AF  BWROTP 0f
 
-        self.send_command(0x30)  # PLL setting
-        self.send_data(0x3c)  # 3A 100HZ   29 150Hz 39 200HZ  31 171HZ
+        epdconfig.send_command_with_data(0x30, [0x3c])  # PLL setting; 3A 100HZ   29 150Hz 39 200HZ  31 171HZ
 
-        self.send_command(0x61)  # resolution setting
-        self.send_data(0x01)
-        self.send_data(0x90)  # 128
-        self.send_data(0x01)
-        self.send_data(0x2c)
+        epdconfig.send_command_with_data(0x61, [  # resolution setting
+            0x01,
+            0x90,  # 128
+            0x01,
+            0x2c,
+        ])
 
-        self.send_command(0x82)  # vcom_DC setting
-        self.send_data(0x12)
+        epdconfig.send_command_with_data(0x82, [0x12])  # vcom_DC setting
 
         self.send_command(0X50)  # VCOM AND DATA INTERVAL SETTING
         self.send_data(
@@ -356,34 +307,30 @@ class EPD:
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0x01)  # POWER SETTING
-        self.send_data(0x03)  # VDS_EN, VDG_EN
-        self.send_data(0x00)  # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
-        self.send_data(0x2b)  # VDH
-        self.send_data(0x2b)  # VDL
+        epdconfig.send_command_with_data(0x01, [  # POWER SETTING
+            0x03,  # VDS_EN, VDG_EN
+            0x00,  # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
+            0x2b,  # VDH
+            0x2b,  # VDL
+        ])
 
-        self.send_command(0x06)  # boost soft start
-        self.send_data(0x17)
-        self.send_data(0x17)
-        self.send_data(0x17)
+        epdconfig.send_command_with_data(0x06, [0x17, 0x17, 0x17])  # boost soft start
 
         self.send_command(0x04)  # POWER_ON
         self.ReadBusy()
 
-        self.send_command(0x00)  # panel setting
-        self.send_data(0xbf)  # KW-BF   KWR-AF  BWROTP 0f
+        epdconfig.send_command_with_data(0x00, [0xbf])  # panel setting; KW-BF   KWR-AF  BWROTP 0f
 
-        self.send_command(0x30)  # PLL setting
-        self.send_data(0x3c)  # 3A 100HZ   29 150Hz 39 200HZ  31 171HZ
+        epdconfig.send_command_with_data(0x30, [0x3c])  # PLL setting; 3A 100HZ   29 150Hz 39 200HZ  31 171HZ
 
-        self.send_command(0x61)  # resolution setting
-        self.send_data(0x01)
-        self.send_data(0x90)  # 128
-        self.send_data(0x01)
-        self.send_data(0x2c)
+        epdconfig.send_command_with_data(0x61, [  # resolution setting
+            0x01,
+            0x90,  # 128
+            0x01,
+            0x2c,
+        ])
 
-        self.send_command(0x82)  # vcom_DC setting
-        self.send_data(0x12)
+        epdconfig.send_command_with_data(0x82, [0x12])  # vcom_DC setting
 
         self.send_command(0X50)  # VCOM AND DATA INTERVAL SETTING
         self.send_data(
@@ -399,102 +346,48 @@ class EPD:
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0x01)  # POWER SETTING
-        self.send_data(0x03)
-        self.send_data(0x00)  # VGH=20V,VGL=-20V
-        self.send_data(0x2b)  # VDH=15V
-        self.send_data(0x2b)  # VDL=-15V
-        self.send_data(0x13)
+        epdconfig.send_command_with_data(0x01, [  # POWER SETTING
+            0x03,
+            0x00,  # VGH=20V,VGL=-20V
+            0x2b,  # VDH=15V
+            0x2b,  # VDL=-15V
+            0x13,
+        ])
 
-        self.send_command(0x06)  # booster soft start
-        self.send_data(0x17)  # A
-        self.send_data(0x17)  # B
-        self.send_data(0x17)  # C
+        epdconfig.send_command_with_data(0x06, [  # booster soft start
+            0x17,  # A
+            0x17,  # B
+            0x17,  # C
+        ])
 
         self.send_command(0x04)
         self.ReadBusy()
 
-        self.send_command(0x00)  # panel setting
-        self.send_data(0x3f)  # KW-3f   KWR-2F BWROTP 0f BWOTP 1f
+        epdconfig.send_command_with_data(0x00, [0x3f])  # panel setting; KW-3f   KWR-2F BWROTP 0f BWOTP 1f
 
-        self.send_command(0x30)  # PLL setting
-        self.send_data(0x3c)  # 100hz
+        epdconfig.send_command_with_data(0x30, [0x3c])  # PLL setting; 100hz
 
-        self.send_command(0x61)  # resolution setting
-        self.send_data(0x01)  # 400
-        self.send_data(0x90)
-        self.send_data(0x01)  # 300
-        self.send_data(0x2c)
+        epdconfig.send_command_with_data(0x61, [  # resolution setting
+            0x01,  # 400
+            0x90,
+            0x01,  # 300
+            0x2c,
+        ])
 
-        self.send_command(0x82)  # vcom_DC setting
-        self.send_data(0x12)
+        epdconfig.send_command_with_data(0x82, [0x12])  # vcom_DC setting
 
-        self.send_command(0X50)  # VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x97)
-
-    def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if imwidth == self.width and imheight == self.height:
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif imwidth == self.height and imheight == self.width:
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy * self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        epdconfig.send_command_with_data(0X50, [0x97])  # VCOM AND DATA INTERVAL SETTING
 
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i = 0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if imwidth == self.width and imheight == self.height:
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0xC0:
-                        pixels[x, y] = 0x80
-                    elif pixels[x, y] == 0x80:
-                        pixels[x, y] = 0x40
-                    i = i + 1
-                    if i % 4 == 0:
-                        buf[int((x + (y * self.width)) / 4)] = (
-                                    (pixels[x - 3, y] & 0xc0) | (pixels[x - 2, y] & 0xc0) >> 2 | (
-                                        pixels[x - 1, y] & 0xc0) >> 4 | (pixels[x, y] & 0xc0) >> 6)
-
-        elif imwidth == self.height and imheight == self.width:
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = x
-                    if pixels[x, y] == 0xC0:
-                        pixels[x, y] = 0x80
-                    elif pixels[x, y] == 0x80:
-                        pixels[x, y] = 0x40
-                    i = i + 1
-                    if i % 4 == 0:
-                        buf[int((newx + (newy * self.width)) / 4)] = (
-                                    (pixels[x, y - 3] & 0xc0) | (pixels[x, y - 2] & 0xc0) >> 2 | (
-                                        pixels[x, y - 1] & 0xc0) >> 4 | (pixels[x, y] & 0xc0) >> 6)
-
+        image = image.convert('L')
+        if image.size != (self.width, self.height) and image.size == (self.height, self.width):
+            # portrait frames are transposed, not rotated, on this panel
+            image = image.transpose(Image.TRANSPOSE)
+        buf = packing.pack_2bpp_gray(image, self.width, self.height)
+        if buf is None:
+            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
+            # return a blank buffer
+            return packing.solid(0xFF, int(self.width / 4) * self.height)
         return buf
 
     def display(self, image):
@@ -505,63 +398,45 @@ class EPD:
 
         self.send_command(0x92)
         self.set_lut()
-        self.send_command(0x10)
-        self.send_data2([0xFF] * int(self.width * linewidth))
+        epdconfig.send_command_with_data(0x10, packing.solid(0xFF, int(self.width * linewidth)))
 
-        self.send_command(0x13)
-        self.send_data2(image)
+        epdconfig.send_command_with_data(0x13, image)
+        self.DATA[:] = packing.invert(image)
 
         self.send_command(0x12)
         self.ReadBusy()
 
+    '''
+    function :Partial refresh of a rectangle
+    parameter:
+     X_start, Y_start, X_end, Y_end : rectangle in pixels, ends exclusive;
+                                      x is widened to whole bytes
+     Image : packed frame buffer of the whole panel
+    '''
     def EPD_4IN2_PartialDisplay(self, X_start, Y_start, X_end, Y_end, Image):
         # EPD_WIDTH       = 400
         # EPD_HEIGHT      = 300
 
-        if EPD_WIDTH % 8 != 0:
-            Width = int(EPD_WIDTH / 8) + 1
-        else:
-            Width = int(EPD_WIDTH / 8)
-        Height = EPD_HEIGHT
-
-        if X_start % 8 != 0:
-            X_start = int(X_start / 8) + 1
-        else:
-            X_start = int(X_start / 8)
-        if X_end % 8 != 0:
-            X_end = int(X_end / 8) + 1
-        else:
-            X_end = int(X_end / 8)
-
-        buf = [0x00] * (Y_end - Y_start) * (X_end - X_start)
+        rect = (X_start // 8 * 8, Y_start, packing.linewidth(X_end) * 8, Y_end)
+        x_start, x_end = rect[0], rect[2] - 1
+        y_end = Y_end - 1
 
         self.send_command(0x91)  # This command makes the display enter partial mode
-        self.send_command(0x90)  # resolution setting
-        self.send_data(int(X_start * 8 / 256))
-        self.send_data(int(X_start * 8 % 256))  # x-start
-
-        self.send_data(int(X_end * 8 / 256))
-        self.send_data(int(X_end * 8 % 256) - 1)  # x-end
-
-        self.send_data(int(Y_start / 256))
-        self.send_data(int(Y_start % 256))  # y-start
-
-        self.send_data(int(Y_end / 256))
-        self.send_data(int(Y_end % 256) - 1)  # y-end
-        self.send_data(0x28)
-
-        self.send_command(0x10)  # writes Old data to SRAM for programming
-        for j in range(0, Y_end - Y_start):
-            for i in range(0, X_end - X_start):
-                buf[j * (X_end - X_start) + i] = self.DATA[(Y_start + j) * Width + X_start + i]
-        self.send_data2(buf)
-
-        self.send_command(0x13)  # writes New data to SRAM.
-        for j in range(0, Y_end - Y_start):
-            for i in range(0, X_end - X_start):
-                buf[j * (X_end - X_start) + i] = ~Image[(Y_start + j) * Width + X_start + i]
-                self.DATA[(Y_start + j) * Width + X_start + i] = ~Image[(Y_start + j) * Width + X_start / 8 + i]
-        self.send_data2(buf)
+        epdconfig.send_command_with_data(0x90, [  # resolution setting
+            x_start >> 8, x_start & 0xFF,  # x-start
+            x_end >> 8, x_end & 0xFF,  # x-end
+            Y_start >> 8, Y_start & 0xFF,  # y-start
+            y_end >> 8, y_end & 0xFF,  # y-end
+            0x28,
+        ])
+
+        # writes Old data to SRAM for programming
+        epdconfig.send_command_with_data(0x10, packing.copy_region(self.DATA, self.width, rect, self._old))
+
+        # writes New data to SRAM; the partial waveform takes it inverted
+        new = packing.copy_region(Image, self.width, rect, self._new, inverted=True)
+        epdconfig.send_command_with_data(0x13, new)
+        packing.paste_region(self.DATA, self.width, rect, new)
 
         self.send_command(0x12)  # DISPLAY REFRESH
         epdconfig.delay_ms(200)  # The delay here is necessary, 200uS at least!!!
@@ -570,80 +445,9 @@ class EPD:
     def display_4Gray(self, image):
         self.send_command(0x92)
         self.set_lut()
-        self.send_command(0x10)
-
-        if self.width % 8 == 0:
-            linewidth = int(self.width / 8)
-        else:
-            linewidth = int(self.width / 8) + 1
+        epdconfig.send_command_with_data(0x10, packing.split_2bpp(image, GRAY_PLANE_10))
 
-        buf = [0x00] * self.height * linewidth
-
-        for i in range(0, int(EPD_WIDTH * EPD_HEIGHT / 8)):  # EPD_WIDTH * EPD_HEIGHT / 4
-            temp3 = 0
-            for j in range(0, 2):
-                temp1 = image[i * 2 + j]
-                for k in range(0, 2):
-                    temp2 = temp1 & 0xC0
-                    if temp2 == 0xC0:
-                        temp3 |= 0x01  # white
-                    elif temp2 == 0x00:
-                        temp3 |= 0x00  # black
-                    elif temp2 == 0x80:
-                        temp3 |= 0x01  # gray1
-                    else:  # 0x40
-                        temp3 |= 0x00  # gray2
-                    temp3 <<= 1
-
-                    temp1 <<= 2
-                    temp2 = temp1 & 0xC0
-                    if temp2 == 0xC0:  # white
-                        temp3 |= 0x01
-                    elif temp2 == 0x00:  # black
-                        temp3 |= 0x00
-                    elif temp2 == 0x80:
-                        temp3 |= 0x01  # gray1
-                    else:  # 0x40
-                        temp3 |= 0x00  # gray2
-                    if j != 1 or k != 1:
-                        temp3 <<= 1
-                    temp1 <<= 2
-            buf[i] = temp3
-        self.send_data2(buf)
-
-        self.send_command(0x13)
-
-        for i in range(0, int(EPD_WIDTH * EPD_HEIGHT / 8)):  # 5808*4  46464
-            temp3 = 0
-            for j in range(0, 2):
-                temp1 = image[i * 2 + j]
-                for k in range(0, 2):
-                    temp2 = temp1 & 0xC0
-                    if temp2 == 0xC0:
-                        temp3 |= 0x01  # white
-                    elif temp2 == 0x00:
-                        temp3 |= 0x00  # black
-                    elif temp2 == 0x80:
-                        temp3 |= 0x00  # gray1
-                    else:  # 0x40
-                        temp3 |= 0x01  # gray2
-                    temp3 <<= 1
-
-                    temp1 <<= 2
-                    temp2 = temp1 & 0xC0
-                    if temp2 == 0xC0:  # white
-                        temp3 |= 0x01
-                    elif temp2 == 0x00:  # black
-                        temp3 |= 0x00
-                    elif temp2 == 0x80:
-                        temp3 |= 0x00  # gray1
-                    else:  # 0x40
-                        temp3 |= 0x01  # gray2
-                    if j != 1 or k != 1:
-                        temp3 <<= 1
-                    temp1 <<= 2
-            buf[i] = temp3
-        self.send_data2(buf)
+        epdconfig.send_command_with_data(0x13, packing.split_2bpp(image, GRAY_PLANE_13))
 
         self.Gray_SetLut()
         self.send_command(0x12)
@@ -657,11 +461,10 @@ class EPD:
         else:
             linewidth = int(self.width / 8) + 1
 
-        self.send_command(0x10)
-        self.send_data2([0xff] * int(self.height * linewidth))
+        epdconfig.send_command_with_data(0x10, packing.solid(0xff, int(self.height * linewidth)))
 
-        self.send_command(0x13)
-        self.send_data2([0xff] * int(self.height * linewidth))
+        epdconfig.send_command_with_data(0x13, packing.solid(0xff, int(self.height * linewidth)))
+        self.DATA[:] = packing.solid(0x00, len(self.DATA))
 
         self.send_command(0x12)
         self.ReadBusy()
@@ -669,8 +472,7 @@ class EPD:
     def sleep(self):
         self.send_command(0x02)  # POWER_OFF
         self.ReadBusy()
-        self.send_command(0x07)  # DEEP_SLEEP
-        self.send_data(0XA5)
+        epdconfig.send_command_with_data(0x07, [0XA5])  # DEEP_SLEEP
 
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
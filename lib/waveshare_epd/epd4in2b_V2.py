@@ -28,7 +28,9 @@
 #
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 400
@@ -36,7 +38,11 @@ EPD_HEIGHT      = 300
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.UC81xx):
+    RESET_MS = (200, 5, 200)
+    BUSY_POLL_MS = 20
+    BUSY_COMMAND = 0x71
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -45,42 +51,6 @@ class EPD:
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        while(epdconfig.digital_read(self.busy_pin) == 0): # 0: idle, 1: busy
-            self.send_command(0x71)
-            epdconfig.delay_ms(20)
-        logger.debug("e-Paper busy release")
-            
     def init(self):
         if (epdconfig.module_init() != 0):
             return -1
@@ -90,41 +60,14 @@ class EPD:
         self.send_command(0x04); 
         self.ReadBusy();
 
-        self.send_command(0x00);
-        self.send_data(0x0f);
+        epdconfig.send_command_with_data(0x00, [0x0f])
         
         return 0
 
-    def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
-
     def display(self, imageblack, imagered):
-        self.send_command(0x10)
-        self.send_data2(imageblack)
+        epdconfig.send_command_with_data(0x10, imageblack)
         
-        self.send_command(0x13)
-        self.send_data2(imagered)
+        epdconfig.send_command_with_data(0x13, imagered)
         
         self.send_command(0x12) 
         epdconfig.delay_ms(20)
@@ -136,24 +79,20 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
 
-        self.send_command(0x10)
-        self.send_data2([0xff] * int(self.height * linewidth))
+        epdconfig.send_command_with_data(0x10, packing.solid(0xff, int(self.height * linewidth)))
             
-        self.send_command(0x13)
-        self.send_data2([0xff] * int(self.height * linewidth))
+        epdconfig.send_command_with_data(0x13, packing.solid(0xff, int(self.height * linewidth)))
         
         self.send_command(0x12) 
         epdconfig.delay_ms(20)
         self.ReadBusy()
 
     def sleep(self):
-        self.send_command(0X50)
-        self.send_data(0xf7)		#border floating	
+        epdconfig.send_command_with_data(0X50, [0xf7]) # border floating
 
         self.send_command(0X02)  	#power off
         self.ReadBusy() #waiting for the electronic paper IC to release the idle signal
-        self.send_command(0X07)  	#deep sleep
-        self.send_data(0xA5)
+        epdconfig.send_command_with_data(0X07, [0xA5])  	#deep sleep
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -29,7 +29,9 @@
 
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 648
@@ -37,7 +39,11 @@ EPD_HEIGHT      = 480
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.UC81xx):
+    RESET_MS = (200, 1, 200)
+    BUSY_POLL_MS = 200
+    BUSY_COMMAND = 0x71
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -46,42 +52,6 @@ class EPD:
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(1)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    # send a lot of data   
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        self.send_command(0X71)
-        while(epdconfig.digital_read(self.busy_pin) == 0):      #  0: idle, 1: busy
-            self.send_command(0X71)
-            epdconfig.delay_ms(200)
-        logger.debug("e-Paper busy release")
-            
     def init(self):
         if (epdconfig.module_init() != 0):
             return -1
@@ -98,8 +68,7 @@ class EPD:
         epdconfig.delay_ms(100)  
         self.ReadBusy()   #waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0X00)     #PANNEL SETTING
-        self.send_data(0x0F)        #KW-3f   KWR-2F    BWROTP 0f   BWOTP 1f
+        epdconfig.send_command_with_data(0X00, [0x0F])     #PANNEL SETTING; KW-3f   KWR-2F    BWROTP 0f   BWOTP 1f
 
         self.send_command(0x61)     #tres
         self.send_data (0x02)       #source 648
@@ -107,63 +76,27 @@ class EPD:
         self.send_data (0x01)       #gate 480
         self.send_data (0xe0)
 
-        self.send_command(0X15)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0X15, [0x00])
 
-        self.send_command(0X50)     #VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x11)
-        self.send_data(0x07)
+        epdconfig.send_command_with_data(0X50, [0x11, 0x07])     #VCOM AND DATA INTERVAL SETTING
 
-        self.send_command(0X60)     #TCON SETTING
-        self.send_data(0x22)
+        epdconfig.send_command_with_data(0X60, [0x22])     #TCON SETTING
         
         return 0
 
-    def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
-
     def display(self, imageblack, imagered):
-        buf = [0x00] * int(self.width * self.height / 8)
-        for i in range(0, int(self.width * self.height / 8)):
-            buf[i] = ~imagered[i]
-
         if (imageblack != None):
-            self.send_command(0X10)
-            self.send_data2(imageblack)        
+            epdconfig.send_command_with_data(0X10, imageblack)
         if (imagered != None):
-            self.send_command(0X13)
-            self.send_data2(buf)
+            epdconfig.send_command_with_data(0X13, packing.invert(imagered[:int(self.width * self.height / 8)]))
 
         self.send_command(0x12)
         epdconfig.delay_ms(200) 
         self.ReadBusy()
 
     def Clear(self):
-        self.send_command(0X10)
-        self.send_data2([0xFF] * int(self.width * self.height / 8))
-        self.send_command(0X13)
-        self.send_data2([0x00] * int(self.width * self.height / 8))
+        epdconfig.send_command_with_data(0X10, packing.solid(0xFF, int(self.width * self.height / 8)))
+        epdconfig.send_command_with_data(0X13, packing.solid(0x00, int(self.width * self.height / 8)))
 
         self.send_command(0x12)
         epdconfig.delay_ms(200) 
@@ -172,8 +105,7 @@ class EPD:
     def sleep(self):
         self.send_command(0X02) # power off
         self.ReadBusy()
-        self.send_command(0X07) # deep sleep
-        self.send_data(0xA5)
+        epdconfig.send_command_with_data(0X07, [0xA5]) # deep sleep
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
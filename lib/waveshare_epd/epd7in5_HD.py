@@ -29,7 +29,9 @@
 
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 880
@@ -37,7 +39,10 @@ EPD_HEIGHT      = 528
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.SSD16xx):
+    BUSY_POLL_MS = 10
+    BUSY_SETTLE_MS = 200
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -46,40 +51,6 @@ class EPD:
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
     
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 1):
-            busy = epdconfig.digital_read(self.busy_pin)
-        epdconfig.delay_ms(200)
-        
     def init(self):
         if (epdconfig.module_init() != 0):
             return -1
@@ -90,43 +61,31 @@ class EPD:
         self.send_command(0x12);  #SWRESET
         self.ReadBusy();
 
-        self.send_command(0x46);  # Auto Write Red RAM
-        self.send_data(0xf7);
+        epdconfig.send_command_with_data(0x46, [0xf7])  # Auto Write Red RAM
         self.ReadBusy();
-        self.send_command(0x47);  # Auto Write  B/W RAM
-        self.send_data(0xf7);
+        epdconfig.send_command_with_data(0x47, [0xf7])  # Auto Write  B/W RAM
         self.ReadBusy();
 
-        self.send_command(0x0C);  # Soft start setting
-        self.send_data2([0xAE, 0xC7, 0xC3, 0xC0, 0x40])
+        epdconfig.send_command_with_data(0x0C, [0xAE, 0xC7, 0xC3, 0xC0, 0x40])  # Soft start setting
 
-        self.send_command(0x01);  # Set MUX as 527
-        self.send_data2([0xAF, 0x02, 0x01])
+        epdconfig.send_command_with_data(0x01, [0xAF, 0x02, 0x01])  # Set MUX as 527
 
-        self.send_command(0x11);  # Data entry mode      
-        self.send_data(0x01);
+        epdconfig.send_command_with_data(0x11, [0x01])  # Data entry mode
 
-        self.send_command(0x44); 
-        self.send_data2([0x00, 0x00, 0x6F, 0x03]) # RAM x address start at 0
-        self.send_command(0x45); 
-        self.send_data2([0xAF, 0x02, 0x00, 0x00])
+        epdconfig.send_command_with_data(0x44, [0x00, 0x00, 0x6F, 0x03])  # RAM x address start at 0
+        epdconfig.send_command_with_data(0x45, [0xAF, 0x02, 0x00, 0x00])
 
-        self.send_command(0x3C); # VBD
-        self.send_data(0x05); # LUT1, for white
+        epdconfig.send_command_with_data(0x3C, [0x05]) # VBD; LUT1, for white
 
-        self.send_command(0x18);
-        self.send_data(0X80);
+        epdconfig.send_command_with_data(0x18, [0X80])
 
 
-        self.send_command(0x22);
-        self.send_data(0XB1); #Load Temperature and waveform setting.
+        epdconfig.send_command_with_data(0x22, [0XB1]) # Load Temperature and waveform setting.
         self.send_command(0x20);
         self.ReadBusy();
 
-        self.send_command(0x4E); # set RAM x address count to 0;
-        self.send_data2([0x00, 0x00])
-        self.send_command(0x4F); 
-        self.send_data2([0x00, 0x00])
+        epdconfig.send_command_with_data(0x4E, [0x00, 0x00]) # set RAM x address count to 0;
+        epdconfig.send_command_with_data(0x4F, [0x00, 0x00])
         # EPD hardware init end
         return 0
 
@@ -140,41 +99,33 @@ class EPD:
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return [0xff] * int(self.width * self.height / 8)
+            return packing.solid(0xff, int(self.width * self.height / 8))
 
         buf = bytearray(img.tobytes('raw'))
         return buf
         
     def display(self, image):
-        self.send_command(0x4F); 
-        self.send_data2([0x00, 0x00])
-        self.send_command(0x24);
-        self.send_data2(image)
-        self.send_command(0x22);
-        self.send_data(0xF7);#Load LUT from MCU(0x32)
+        epdconfig.send_command_with_data(0x4F, [0x00, 0x00])
+        epdconfig.send_command_with_data(0x24, image)
+        epdconfig.send_command_with_data(0x22, [0xF7]) # Load LUT from MCU(0x32)
         self.send_command(0x20);
         epdconfig.delay_ms(10);
         self.ReadBusy();
         
     def Clear(self):
-        buf = [0xff] * int(self.width * self.height / 8)
-        self.send_command(0x4F); 
-        self.send_data2([0x00, 0x00])
-        self.send_command(0x24)
-        self.send_data2(buf)
+        buf = packing.solid(0xff, int(self.width * self.height / 8))
+        epdconfig.send_command_with_data(0x4F, [0x00, 0x00])
+        epdconfig.send_command_with_data(0x24, buf)
             
-        self.send_command(0x26)
-        self.send_data2(buf)
+        epdconfig.send_command_with_data(0x26, buf)
                 
-        self.send_command(0x22);
-        self.send_data(0xF7);#Load LUT from MCU(0x32)
+        epdconfig.send_command_with_data(0x22, [0xF7]) # Load LUT from MCU(0x32)
         self.send_command(0x20);
         epdconfig.delay_ms(10);
         self.ReadBusy();
 
     def sleep(self):
-        self.send_command(0x10);
-        self.send_data(0x01);
+        epdconfig.send_command_with_data(0x10, [0x01])
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
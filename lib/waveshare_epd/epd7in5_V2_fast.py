@@ -29,7 +29,9 @@
 
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 800
@@ -37,7 +39,14 @@ EPD_HEIGHT      = 480
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.UC81xx):
+    RESET_MS = (20, 2, 20)
+    BUSY_POLL_MS = 10
+    BUSY_COMMAND = 0x71
+    BUSY_SETTLE_MS = 20
+    # getbuffer() inverts the bits
+    PACKED_1BPP = False
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -100,63 +109,16 @@ class EPD:
         0x0,	0x0,	0x0,	0x0,	0x0,	0x0,	
     ]
 
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 0):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-        epdconfig.delay_ms(20)
-        logger.debug("e-Paper busy release")
-        
     def SetLut(self, lut_vcom, lut_ww, lut_bw, lut_wb, lut_bb):
-        self.send_command(0x20)
-        for count in range(0, 42):
-            self.send_data(lut_vcom[count])
+        epdconfig.send_command_with_data(0x20, lut_vcom[:42])
 
-        self.send_command(0x21)
-        for count in range(0, 42):
-            self.send_data(lut_ww[count])
+        epdconfig.send_command_with_data(0x21, lut_ww[:42])
 
-        self.send_command(0x22)
-        for count in range(0, 42):
-            self.send_data(lut_bw[count])
+        epdconfig.send_command_with_data(0x22, lut_bw[:42])
 
-        self.send_command(0x23)
-        for count in range(0, 42):
-            self.send_data(lut_wb[count])
+        epdconfig.send_command_with_data(0x23, lut_wb[:42])
 
-        self.send_command(0x24)
-        for count in range(0, 42):
-            self.send_data(lut_bb[count])
+        epdconfig.send_command_with_data(0x24, lut_bb[:42])
 
     def init(self):
         if (epdconfig.module_init() != 0):
@@ -176,53 +138,45 @@ class EPD:
         # self.send_data(0x3f)		#VDH=15V
         # self.send_data(0x3f)		#VDL=-15V
 
-        self.send_command(0x01)     # power setting
-        self.send_data(0x17)        # 1-0=11: internal power
-        self.send_data(self.Voltage_Frame_7IN5_V2[6])   # VGH&VGL
-        self.send_data(self.Voltage_Frame_7IN5_V2[1])   # VSH
-        self.send_data(self.Voltage_Frame_7IN5_V2[2])   # VSL
-        self.send_data(self.Voltage_Frame_7IN5_V2[3])   # VSHR
+        epdconfig.send_command_with_data(0x01, [  # power setting
+            0x17,  # 1-0=11: internal power
+            self.Voltage_Frame_7IN5_V2[6],  # VGH&VGL
+            self.Voltage_Frame_7IN5_V2[1],  # VSH
+            self.Voltage_Frame_7IN5_V2[2],  # VSL
+            self.Voltage_Frame_7IN5_V2[3],  # VSHR
+        ])
         
-        self.send_command(0x82)     # VCOM DC Setting
-        self.send_data(self.Voltage_Frame_7IN5_V2[4])   # VCOM
-
-        self.send_command(0x06)     # Booster Setting
-        self.send_data(0x27)
-        self.send_data(0x27)
-        self.send_data(0x2F)
-        self.send_data(0x17)
+        epdconfig.send_command_with_data(0x82, [self.Voltage_Frame_7IN5_V2[4]])     # VCOM DC Setting; VCOM
+
+        epdconfig.send_command_with_data(0x06, [0x27, 0x27, 0x2F, 0x17])     # Booster Setting
         
-        self.send_command(0x30)     # OSC Setting
-        self.send_data(self.Voltage_Frame_7IN5_V2[0])   # 3C=50Hz, 3A=100HZ
+        epdconfig.send_command_with_data(0x30, [self.Voltage_Frame_7IN5_V2[0]])     # OSC Setting; 3C=50Hz, 3A=100HZ
 
         self.send_command(0x04)     # POWER ON
         epdconfig.delay_ms(100)
         self.ReadBusy()
 
-        self.send_command(0X00)     # PANNEL SETTING
-        self.send_data(0x3F)        # KW-3f KWR-2F BWROTP-0f BWOTP-1f
+        epdconfig.send_command_with_data(0X00, [0x3F])     # PANNEL SETTING; KW-3f KWR-2F BWROTP-0f BWOTP-1f
 
-        self.send_command(0x61)     # tres
-        self.send_data(0x03)        # source 800
-        self.send_data(0x20)
-        self.send_data(0x01)        # gate 480
-        self.send_data(0xE0)
+        epdconfig.send_command_with_data(0x61, [  # tres
+            0x03,  # source 800
+            0x20,
+            0x01,  # gate 480
+            0xE0,
+        ])
 
-        self.send_command(0X15)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0X15, [0x00])
 
-        self.send_command(0X50)     # VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x10)
-        self.send_data(0x07)
+        epdconfig.send_command_with_data(0X50, [0x10, 0x07])     # VCOM AND DATA INTERVAL SETTING
 
-        self.send_command(0X60)     # TCON SETTING
-        self.send_data(0x22)
+        epdconfig.send_command_with_data(0X60, [0x22])     # TCON SETTING
 
-        self.send_command(0x65)     # Resolution setting
-        self.send_data(0x00)
-        self.send_data(0x00)        # 800*480
-        self.send_data(0x00)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x65, [  # Resolution setting
+            0x00,
+            0x00,  # 800*480
+            0x00,
+            0x00,
+        ])
 
         self.SetLut(self.LUT_VCOM_7IN5_V2, self.LUT_WW_7IN5_V2, self.LUT_BW_7IN5_V2, self.LUT_WB_7IN5_V2, self.LUT_BB_7IN5_V2)
         # EPD hardware init end
@@ -239,29 +193,23 @@ class EPD:
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
+            return packing.solid(0x00, int(self.width/8) * self.height)
 
-        buf = bytearray(img.tobytes('raw'))
         # The bytes need to be inverted, because in the PIL world 0=black and 1=white, but
         # in the e-paper world 0=white and 1=black.
-        for i in range(len(buf)):
-            buf[i] ^= 0xFF
-        return buf
+        return packing.invert(img.tobytes('raw'))
 
     def display(self, image):
-        self.send_command(0x13)
-        self.send_data2(image)
+        epdconfig.send_command_with_data(0x13, image)
 
         self.send_command(0x12)
         epdconfig.delay_ms(100)
         self.ReadBusy()
 
     def Clear(self):
-        buf = [0x00] * (int(self.width/8) * self.height)
-        self.send_command(0x10)
-        self.send_data2(buf)
-        self.send_command(0x13)
-        self.send_data2(buf)
+        buf = packing.solid(0x00, int(self.width/8) * self.height)
+        epdconfig.send_command_with_data(0x10, buf)
+        epdconfig.send_command_with_data(0x13, buf)
         self.send_command(0x12)
         epdconfig.delay_ms(100)
         self.ReadBusy()
@@ -270,8 +218,7 @@ class EPD:
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
         
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        epdconfig.send_command_with_data(0x07, [0XA5]) # DEEP_SLEEP
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -29,7 +29,9 @@
 
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 880
@@ -37,7 +39,11 @@ EPD_HEIGHT      = 528
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.SSD16xx):
+    RESET_MS = (200, 4, 200)
+    BUSY_POLL_MS = 10
+    BUSY_SETTLE_MS = 200
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -46,34 +52,6 @@ class EPD:
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(4)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 1):
-            busy = epdconfig.digital_read(self.busy_pin)
-        epdconfig.delay_ms(200)
-            
     def init(self):
         if (epdconfig.module_init() != 0):
             return -1
@@ -83,124 +61,71 @@ class EPD:
         self.send_command(0x12); 		  #SWRESET
         self.ReadBusy();        #waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0x46);  # Auto Write RAM
-        self.send_data(0xF7);
+        epdconfig.send_command_with_data(0x46, [0xF7])  # Auto Write RAM
         self.ReadBusy();        #waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0x47);  # Auto Write RAM
-        self.send_data(0xF7);
+        epdconfig.send_command_with_data(0x47, [0xF7])  # Auto Write RAM
         self.ReadBusy();        #waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0x0C);  # Soft start setting
-        self.send_data(0xAE);
-        self.send_data(0xC7);
-        self.send_data(0xC3);
-        self.send_data(0xC0);
-        self.send_data(0x40);   
-
-        self.send_command(0x01);  # Set MUX as 527
-        self.send_data(0xAF);
-        self.send_data(0x02);
-        self.send_data(0x01);
-
-        self.send_command(0x11);  # Data entry mode
-        self.send_data(0x01);
-
-        self.send_command(0x44);
-        self.send_data(0x00); # RAM x address start at 0
-        self.send_data(0x00);
-        self.send_data(0x6F); # RAM x address end at 36Fh -> 879
-        self.send_data(0x03);
-        self.send_command(0x45);
-        self.send_data(0xAF); # RAM y address start at 20Fh;
-        self.send_data(0x02);
-        self.send_data(0x00); # RAM y address end at 00h;
-        self.send_data(0x00);
-
-        self.send_command(0x3C); # VBD
-        self.send_data(0x01); # LUT1, for white
-
-        self.send_command(0x18);
-        self.send_data(0X80);
-        self.send_command(0x22);
-        self.send_data(0XB1);	#Load Temperature and waveform setting.
+        epdconfig.send_command_with_data(0x0C, [0xAE, 0xC7, 0xC3, 0xC0, 0x40])  # Soft start setting
+
+        epdconfig.send_command_with_data(0x01, [0xAF, 0x02, 0x01])  # Set MUX as 527
+
+        epdconfig.send_command_with_data(0x11, [0x01])  # Data entry mode
+
+        epdconfig.send_command_with_data(0x44, [
+            0x00,  # RAM x address start at 0
+            0x00,
+            0x6F,  # RAM x address end at 36Fh -> 879
+            0x03,
+        ])
+        epdconfig.send_command_with_data(0x45, [
+            0xAF,  # RAM y address start at 20Fh;
+            0x02,
+            0x00,  # RAM y address end at 00h;
+            0x00,
+        ])
+
+        epdconfig.send_command_with_data(0x3C, [0x01]) # VBD; LUT1, for white
+
+        epdconfig.send_command_with_data(0x18, [0X80])
+        epdconfig.send_command_with_data(0x22, [0XB1]) # Load Temperature and waveform setting.
         self.send_command(0x20);
         self.ReadBusy();        #waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0x4E); 
-        self.send_data(0x00);
-        self.send_data(0x00);
-        self.send_command(0x4F); 
-        self.send_data(0xAF);
-        self.send_data(0x02);
+        epdconfig.send_command_with_data(0x4E, [0x00, 0x00])
+        epdconfig.send_command_with_data(0x4F, [0xAF, 0x02])
         
         return 0
 
-    def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        logger.debug('imwidth = %d  imheight =  %d ',imwidth, imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
-
     def display(self, imageblack, imagered):
-        self.send_command(0x4F); 
-        self.send_data(0xAf);
+        epdconfig.send_command_with_data(0x4F, [0xAf])
         
-        self.send_command(0x24)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(imageblack[i]);
+        epdconfig.send_command_with_data(0x24, imageblack[:int(self.width * self.height / 8)])
         
         
-        self.send_command(0x26)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(~imagered[i]);
+        epdconfig.send_command_with_data(0x26, packing.invert(imagered[:int(self.width * self.height / 8)]))
         
-        self.send_command(0x22);
-        self.send_data(0xC7);    #Load LUT from MCU(0x32)
+        epdconfig.send_command_with_data(0x22, [0xC7]) # Load LUT from MCU(0x32)
         self.send_command(0x20);
         epdconfig.delay_ms(200);      #!!!The delay here is necessary, 200uS at least!!!     
         self.ReadBusy();
         
     def Clear(self):
-        self.send_command(0x4F); 
-        self.send_data(0xAf);
+        epdconfig.send_command_with_data(0x4F, [0xAf])
         
-        self.send_command(0x24)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xff);
+        epdconfig.send_command_with_data(0x24, packing.solid(0xff, int(self.width * self.height / 8)))
         
         
-        self.send_command(0x26)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0x00);
+        epdconfig.send_command_with_data(0x26, packing.solid(0x00, int(self.width * self.height / 8)))
         
-        self.send_command(0x22);
-        self.send_data(0xC7);    #Load LUT from MCU(0x32)
+        epdconfig.send_command_with_data(0x22, [0xC7]) # Load LUT from MCU(0x32)
         self.send_command(0x20);
         epdconfig.delay_ms(200);      #!!!The delay here is necessary, 200uS at least!!!     
         self.ReadBusy();
 
     def sleep(self):
-        self.send_command(0x10);  	#deep sleep
-        self.send_data(0x01);
+        epdconfig.send_command_with_data(0x10, [0x01])  	#deep sleep
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
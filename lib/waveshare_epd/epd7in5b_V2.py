@@ -29,7 +29,9 @@
 
 
 import logging
+from . import controller
 from . import epdconfig
+from . import packing
 
 # Display resolution
 EPD_WIDTH       = 800
@@ -37,7 +39,14 @@ EPD_HEIGHT      = 480
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(controller.UC81xx):
+    RESET_MS = (200, 4, 200)
+    BUSY_POLL_MS = 10
+    BUSY_COMMAND = 0x71
+    BUSY_SETTLE_MS = 200
+    # getbuffer() inverts the bits
+    PACKED_1BPP = False
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -46,43 +55,6 @@ class EPD:
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(4)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-    
-    def send_data2(self, data): #faster
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 0):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-        epdconfig.delay_ms(200)
-        logger.debug("e-Paper busy release")
-        
     def init(self):
         if (epdconfig.module_init() != 0):
             return -1
@@ -95,40 +67,33 @@ class EPD:
         # self.send_data(0x38)      # If an exception is displayed, try using 0x38
         # self.send_data(0x17)
 
-        self.send_command(0x01)     # POWER SETTING
-        self.send_data(0x07)
-        self.send_data(0x07)        # VGH=20V,VGL=-20V
-        self.send_data(0x3f)        # VDH=15V
-        self.send_data(0x3f)        # VDL=-15V
+        epdconfig.send_command_with_data(0x01, [  # POWER SETTING
+            0x07,
+            0x07,  # VGH=20V,VGL=-20V
+            0x3f,  # VDH=15V
+            0x3f,  # VDL=-15V
+        ])
 
         self.send_command(0x04)     # POWER ON
         epdconfig.delay_ms(100)
         self.ReadBusy()
 
-        self.send_command(0X00)     # PANNEL SETTING
-        self.send_data(0x0F)        # KW-3f KWR-2F BWROTP-0f BWOTP-1f
+        epdconfig.send_command_with_data(0X00, [0x0F])     # PANNEL SETTING; KW-3f KWR-2F BWROTP-0f BWOTP-1f
 
-        self.send_command(0x61)     # tres
-        self.send_data(0x03)        # source 800
-        self.send_data(0x20)
-        self.send_data(0x01)        # gate 480
-        self.send_data(0xE0)
+        epdconfig.send_command_with_data(0x61, [  # tres
+            0x03,  # source 800
+            0x20,
+            0x01,  # gate 480
+            0xE0,
+        ])
 
-        self.send_command(0X15)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0X15, [0x00])
 
-        self.send_command(0X50)     # VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x11)
-        self.send_data(0x07)
+        epdconfig.send_command_with_data(0X50, [0x11, 0x07])     # VCOM AND DATA INTERVAL SETTING
 
-        self.send_command(0X60)     # TCON SETTING
-        self.send_data(0x22)
+        epdconfig.send_command_with_data(0X60, [0x22])     # TCON SETTING
 
-        self.send_command(0x65)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        epdconfig.send_command_with_data(0x65, [0x00, 0x00, 0x00, 0x00])
     
         return 0
 
@@ -143,37 +108,28 @@ class EPD:
         else:
             logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
             # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
+            return packing.solid(0x00, int(self.width/8) * self.height)
 
-        buf = bytearray(img.tobytes('raw'))
         # The bytes need to be inverted, because in the PIL world 0=black and 1=white, but
         # in the e-paper world 0=white and 1=black.
-        for i in range(len(buf)):
-            buf[i] ^= 0xFF
-        return buf
+        return packing.invert(img.tobytes('raw'))
 
     def display(self, imageblack, imagered):
-        self.send_command(0x10)
         # The black bytes need to be inverted back from what getbuffer did
-        for i in range(len(imageblack)):
-            imageblack[i] ^= 0xFF
-        self.send_data2(imageblack)
+        epdconfig.send_command_with_data(0x10, packing.invert(imageblack))
 
-        self.send_command(0x13)
-        self.send_data2(imagered)
+        epdconfig.send_command_with_data(0x13, imagered)
         
         self.send_command(0x12)
         epdconfig.delay_ms(100)
         self.ReadBusy()
         
     def Clear(self):
-        buf = [0x00] * (int(self.width/8) * self.height)
-        buf2 = [0xff] * (int(self.width/8) * self.height)
-        self.send_command(0x10)
-        self.send_data2(buf2)
+        buf = packing.solid(0x00, int(self.width/8) * self.height)
+        buf2 = packing.solid(0xff, int(self.width/8) * self.height)
+        epdconfig.send_command_with_data(0x10, buf2)
             
-        self.send_command(0x13)
-        self.send_data2(buf)
+        epdconfig.send_command_with_data(0x13, buf)
                 
         self.send_command(0x12)
         epdconfig.delay_ms(100)
@@ -183,8 +139,7 @@ class EPD:
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
         
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        epdconfig.send_command_with_data(0x07, [0XA5]) # DEEP_SLEEP
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
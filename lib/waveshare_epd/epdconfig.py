@@ -1,243 +1,1480 @@
-# /*****************************************************************************
-# * | File        :	  epdconfig.py
-# * | Author      :   Waveshare team
-# * | Function    :   Hardware underlying interface
-# * | Info        :
-# *----------------
-# * | This version:   V1.2
-# * | Date        :   2022-10-29
-# * | Info        :   
-# ******************************************************************************
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documnetation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to  whom the Software is
-# furished to do so, subject to the following conditions:
-#
-# The above copyright notice and this permission notice shall be included in
-# all copies or substantial portions of the Software.
-#
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
-# THE SOFTWARE.
-#
-
-import os
-import logging
-import sys
-import time
-
-logger = logging.getLogger(__name__)
-
-
-class RaspberryPi:
-    # Pin definition
-    RST_PIN  = 17
-    DC_PIN   = 25
-    CS_PIN   = 8
-    BUSY_PIN = 24
-    PWR_PIN  = 18
-
-    def __init__(self):
-        import spidev
-        import RPi.GPIO
-
-        self.GPIO = RPi.GPIO
-        self.SPI = spidev.SpiDev()
-
-    def digital_write(self, pin, value):
-        self.GPIO.output(pin, value)
-
-    def digital_read(self, pin):
-        return self.GPIO.input(pin)
-
-    def delay_ms(self, delaytime):
-        time.sleep(delaytime / 1000.0)
-
-    def spi_writebyte(self, data):
-        self.SPI.writebytes(data)
-
-    def spi_writebyte2(self, data):
-        self.SPI.writebytes2(data)
-
-    def module_init(self):
-        self.GPIO.setmode(self.GPIO.BCM)
-        self.GPIO.setwarnings(False)
-        self.GPIO.setup(self.RST_PIN, self.GPIO.OUT)
-        self.GPIO.setup(self.DC_PIN, self.GPIO.OUT)
-        self.GPIO.setup(self.CS_PIN, self.GPIO.OUT)
-        self.GPIO.setup(self.PWR_PIN, self.GPIO.OUT)
-        self.GPIO.setup(self.BUSY_PIN, self.GPIO.IN)
-        
-        self.GPIO.output(self.PWR_PIN, 1)
-
-        # SPI device, bus = 0, device = 0
-        self.SPI.open(0, 0)
-        self.SPI.max_speed_hz = 4000000
-        self.SPI.mode = 0b00
-        return 0
-
-    def module_exit(self):
-        logger.debug("spi end")
-        self.SPI.close()
-
-        logger.debug("close 5V, Module enters 0 power consumption ...")
-        self.GPIO.output(self.RST_PIN, 0)
-        self.GPIO.output(self.DC_PIN, 0)
-        self.GPIO.output(self.PWR_PIN, 0)
-
-        self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN, self.PWR_PIN])
-
-
-class JetsonNano:
-    # Pin definition
-    RST_PIN  = 17
-    DC_PIN   = 25
-    CS_PIN   = 8
-    BUSY_PIN = 24
-    PWR_PIN  = 18
-
-    def __init__(self):
-        import ctypes
-        find_dirs = [
-            os.path.dirname(os.path.realpath(__file__)),
-            '/usr/local/lib',
-            '/usr/lib',
-        ]
-        self.SPI = None
-        for find_dir in find_dirs:
-            so_filename = os.path.join(find_dir, 'sysfs_software_spi.so')
-            if os.path.exists(so_filename):
-                self.SPI = ctypes.cdll.LoadLibrary(so_filename)
-                break
-        if self.SPI is None:
-            raise RuntimeError('Cannot find sysfs_software_spi.so')
-
-        import Jetson.GPIO
-        self.GPIO = Jetson.GPIO
-
-    def digital_write(self, pin, value):
-        self.GPIO.output(pin, value)
-
-    def digital_read(self, pin):
-        return self.GPIO.input(self.BUSY_PIN)
-
-    def delay_ms(self, delaytime):
-        time.sleep(delaytime / 1000.0)
-
-    def spi_writebyte(self, data):
-        self.SPI.SYSFS_software_spi_transfer(data[0])
-
-    def spi_writebyte2(self, data):
-        for i in range(len(data)):
-            self.SPI.SYSFS_software_spi_transfer(data[i])
-
-    def module_init(self):
-        self.GPIO.setmode(self.GPIO.BCM)
-        self.GPIO.setwarnings(False)
-        self.GPIO.setup(self.RST_PIN, self.GPIO.OUT)
-        self.GPIO.setup(self.DC_PIN, self.GPIO.OUT)
-        self.GPIO.setup(self.CS_PIN, self.GPIO.OUT)
-        self.GPIO.setup(self.PWR_PIN, self.GPIO.OUT)
-        self.GPIO.setup(self.BUSY_PIN, self.GPIO.IN)
-        
-        self.GPIO.output(self.PWR_PIN, 1)
-        
-        self.SPI.SYSFS_software_spi_begin()
-        return 0
-
-    def module_exit(self):
-        logger.debug("spi end")
-        self.SPI.SYSFS_software_spi_end()
-
-        logger.debug("close 5V, Module enters 0 power consumption ...")
-        self.GPIO.output(self.RST_PIN, 0)
-        self.GPIO.output(self.DC_PIN, 0)
-        self.GPIO.output(self.PWR_PIN, 0)
-
-        self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN, self.PWR_PIN])
-
-
-class SunriseX3:
-    # Pin definition
-    RST_PIN  = 17
-    DC_PIN   = 25
-    CS_PIN   = 8
-    BUSY_PIN = 24
-    PWR_PIN  = 18
-    Flag     = 0
-
-    def __init__(self):
-        import spidev
-        import Hobot.GPIO
-
-        self.GPIO = Hobot.GPIO
-        self.SPI = spidev.SpiDev()
-
-    def digital_write(self, pin, value):
-        self.GPIO.output(pin, value)
-
-    def digital_read(self, pin):
-        return self.GPIO.input(pin)
-
-    def delay_ms(self, delaytime):
-        time.sleep(delaytime / 1000.0)
-
-    def spi_writebyte(self, data):
-        self.SPI.writebytes(data)
-
-    def spi_writebyte2(self, data):
-        # for i in range(len(data)):
-        #     self.SPI.writebytes([data[i]])
-        self.SPI.xfer3(data)
-
-    def module_init(self):
-        if self.Flag == 0:
-            self.Flag = 1
-            self.GPIO.setmode(self.GPIO.BCM)
-            self.GPIO.setwarnings(False)
-            self.GPIO.setup(self.RST_PIN, self.GPIO.OUT)
-            self.GPIO.setup(self.DC_PIN, self.GPIO.OUT)
-            self.GPIO.setup(self.CS_PIN, self.GPIO.OUT)
-            self.GPIO.setup(self.PWR_PIN, self.GPIO.OUT)
-            self.GPIO.setup(self.BUSY_PIN, self.GPIO.IN)
-
-            self.GPIO.output(self.PWR_PIN, 1)
-        
-            # SPI device, bus = 0, device = 0
-            self.SPI.open(2, 0)
-            self.SPI.max_speed_hz = 4000000
-            self.SPI.mode = 0b00
-            return 0
-        else:
-            return 0
-
-    def module_exit(self):
-        logger.debug("spi end")
-        self.SPI.close()
-
-        logger.debug("close 5V, Module enters 0 power consumption ...")
-        self.Flag = 0
-        self.GPIO.output(self.RST_PIN, 0)
-        self.GPIO.output(self.DC_PIN, 0)
-        self.GPIO.output(self.PWR_PIN, 0)
-
-        self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN], self.PWR_PIN)
-
-
-if os.path.exists('/sys/bus/platform/drivers/gpiomem-bcm2835'):
-    implementation = RaspberryPi()
-elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
-    implementation = SunriseX3()
-else:
-    implementation = JetsonNano()
-
-for func in [x for x in dir(implementation) if not x.startswith('_')]:
-    setattr(sys.modules[__name__], func, getattr(implementation, func))
-
-### END OF FILE ###
+# /*****************************************************************************
+# * | File        :	  epdconfig.py
+# * | Author      :   Waveshare team
+# * | Function    :   Hardware underlying interface
+# * | Info        :
+# *----------------
+# * | This version:   V1.2
+# * | Date        :   2022-10-29
+# * | Info        :   
+# ******************************************************************************
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import os
+import logging
+import sys
+import time
+import collections
+import functools
+import struct
+
+logger = logging.getLogger(__name__)
+
+# SPI clock used by the spidev backends; the controllers are specified for
+# 10-20 MHz but long jumper wires often are not, see autotune_spi_speed()
+SPI_SPEED_HZ = int(os.environ.get('EPD_SPI_HZ', '4000000'))
+SPI_SPEED_CANDIDATES_HZ = (2000000, 4000000, 8000000, 10000000, 16000000, 20000000, 32000000)
+
+
+def _spidev_bufsiz():
+    try:
+        with open('/sys/module/spidev/parameters/bufsiz') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return 4096
+
+
+class SpiTransport:
+    """Bulk spidev writes split into chunks that fit the kernel buffer.
+
+    Buffer-protocol data (bytes, bytearray, memoryview) is sliced without
+    copying; lists are copied chunk by chunk into one preallocated buffer.
+    """
+    def __init__(self, write):
+        self.write = write
+        self.bufsiz = _spidev_bufsiz()
+        self.buf = bytearray(self.bufsiz)
+        self.view = memoryview(self.buf)
+
+    def transfer(self, data):
+        chunk = self.bufsiz
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = memoryview(data).cast('B')
+            for i in range(0, len(data), chunk):
+                self.write(data[i:i + chunk])
+            return
+        for i in range(0, len(data), chunk):
+            part = data[i:i + chunk]
+            n = len(part)
+            try:
+                self.buf[:n] = part
+            except ValueError:
+                # spidev keeps the low 8 bits of each value, e.g. of ~byte
+                self.buf[:n] = bytes(value & 0xFF for value in part)
+            self.write(self.view[:n])
+
+
+class RaspberryPi:
+    # Pin definition
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+
+    def __init__(self):
+        import spidev
+        import RPi.GPIO
+
+        self.GPIO = RPi.GPIO
+        self.SPI = spidev.SpiDev()
+        self.transport = SpiTransport(self.SPI.writebytes2)
+        self.spi_open = False
+
+    def digital_write(self, pin, value):
+        self.GPIO.output(pin, value)
+
+    def digital_read(self, pin):
+        return self.GPIO.input(pin)
+
+    def wait_for_edge(self, pin, rising, timeout_ms):
+        edge = self.GPIO.RISING if rising else self.GPIO.FALLING
+        return self.GPIO.wait_for_edge(pin, edge, timeout=max(1, int(timeout_ms))) is not None
+
+    def delay_ms(self, delaytime):
+        time.sleep(delaytime / 1000.0)
+
+    def spi_writebyte(self, data):
+        self.SPI.writebytes(data)
+
+    def spi_writebyte2(self, data):
+        self.transport.transfer(data)
+
+    def set_spi_speed_hz(self, hz):
+        if self.spi_open:
+            self.SPI.max_speed_hz = hz
+
+    def module_init(self):
+        self.GPIO.setmode(self.GPIO.BCM)
+        self.GPIO.setwarnings(False)
+        self.GPIO.setup(self.RST_PIN, self.GPIO.OUT)
+        self.GPIO.setup(self.DC_PIN, self.GPIO.OUT)
+        self.GPIO.setup(self.CS_PIN, self.GPIO.OUT)
+        self.GPIO.setup(self.PWR_PIN, self.GPIO.OUT)
+        self.GPIO.setup(self.BUSY_PIN, self.GPIO.IN)
+        
+        self.GPIO.output(self.PWR_PIN, 1)
+
+        # SPI device, bus = 0, device = 0
+        self.SPI.open(0, 0)
+        self.SPI.max_speed_hz = SPI_SPEED_HZ
+        self.SPI.mode = 0b00
+        self.spi_open = True
+        return 0
+
+    def module_exit(self):
+        logger.debug("spi end")
+        self.SPI.close()
+        self.spi_open = False
+
+        logger.debug("close 5V, Module enters 0 power consumption ...")
+        self.GPIO.output(self.RST_PIN, 0)
+        self.GPIO.output(self.DC_PIN, 0)
+        self.GPIO.output(self.PWR_PIN, 0)
+
+        self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN, self.PWR_PIN])
+
+
+class Gpiod:
+    """Raspberry Pi through the GPIO character device (libgpiod >= 2.0).
+
+    All lines are requested once and kept for the life of the process, so a
+    pin write is a single ioctl, and DC and CS are switched together at the
+    start of every SPI transaction. BUSY edges are delivered as line events.
+    Needs neither RPi.GPIO nor /dev/gpiomem.
+    """
+    # Pin definition
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+
+    # labels of the SoC GPIO controller driving the 40 pin header
+    CHIP_LABELS = ('pinctrl-bcm2835', 'pinctrl-bcm2711', 'pinctrl-rp1')
+
+    def __init__(self):
+        import spidev
+        import gpiod
+
+        if not hasattr(gpiod, 'request_lines'):
+            raise RuntimeError('gpiod >= 2.0 is required')
+        self.gpiod = gpiod
+        self.chip = self._find_chip()
+        self.active = gpiod.line.Value.ACTIVE
+        self.inactive = gpiod.line.Value.INACTIVE
+        self.request = None
+        self.cs_requested = True
+        self.SPI = spidev.SpiDev()
+        self.transport = SpiTransport(self.SPI.writebytes2)
+        self.spi_open = False
+
+    def _find_chip(self):
+        path = os.environ.get('EPD_GPIOCHIP')
+        if path:
+            return path
+        for name in sorted(os.listdir('/dev')):
+            if not name.startswith('gpiochip'):
+                continue
+            path = os.path.join('/dev', name)
+            try:
+                with self.gpiod.Chip(path) as chip:
+                    if chip.get_info().label in self.CHIP_LABELS:
+                        return path
+            except OSError:
+                continue
+        raise RuntimeError('Cannot find the Raspberry Pi GPIO chip')
+
+    def _request_lines(self):
+        Direction = self.gpiod.line.Direction
+        output = self.gpiod.LineSettings(direction=Direction.OUTPUT, output_value=self.inactive)
+        busy = self.gpiod.LineSettings(direction=Direction.INPUT, edge_detection=self.gpiod.line.Edge.BOTH)
+        outputs = (self.RST_PIN, self.DC_PIN, self.CS_PIN, self.PWR_PIN)
+        try:
+            return self.gpiod.request_lines(self.chip, consumer='waveshare_epd',
+                                            config={outputs: output, self.BUSY_PIN: busy})
+        except OSError:
+            # CE0 is claimed by the SPI controller when it drives chip select
+            # itself (cs-gpios); the hardware CS is enough then
+            self.cs_requested = False
+            outputs = (self.RST_PIN, self.DC_PIN, self.PWR_PIN)
+            return self.gpiod.request_lines(self.chip, consumer='waveshare_epd',
+                                            config={outputs: output, self.BUSY_PIN: busy})
+
+    def digital_write(self, pin, value):
+        if pin == self.CS_PIN and not self.cs_requested:
+            return
+        self.request.set_value(pin, self.active if value else self.inactive)
+
+    def digital_read(self, pin):
+        return 1 if self.request.get_value(pin) == self.active else 0
+
+    def wait_for_edge(self, pin, rising, timeout_ms):
+        # stale events only cost the caller another look at the level
+        if self.request.wait_edge_events(timeout_ms / 1000.0):
+            self.request.read_edge_events()
+            return True
+        return False
+
+    def spi_select(self, dc):
+        if self.cs_requested:
+            self.request.set_values({self.DC_PIN: self.active if dc else self.inactive,
+                                     self.CS_PIN: self.inactive})
+        else:
+            self.request.set_value(self.DC_PIN, self.active if dc else self.inactive)
+
+    def spi_deselect(self):
+        if self.cs_requested:
+            self.request.set_value(self.CS_PIN, self.active)
+
+    def delay_ms(self, delaytime):
+        time.sleep(delaytime / 1000.0)
+
+    def spi_writebyte(self, data):
+        self.SPI.writebytes(data)
+
+    def spi_writebyte2(self, data):
+        self.transport.transfer(data)
+
+    def set_spi_speed_hz(self, hz):
+        if self.spi_open:
+            self.SPI.max_speed_hz = hz
+
+    def module_init(self):
+        if self.request is None:
+            self.request = self._request_lines()
+        self.request.set_value(self.PWR_PIN, self.active)
+
+        # SPI device, bus = 0, device = 0
+        self.SPI.open(0, 0)
+        self.SPI.max_speed_hz = SPI_SPEED_HZ
+        self.SPI.mode = 0b00
+        self.spi_open = True
+        return 0
+
+    def module_exit(self):
+        logger.debug("spi end")
+        self.SPI.close()
+        self.spi_open = False
+
+        logger.debug("close 5V, Module enters 0 power consumption ...")
+        self.request.set_values({self.RST_PIN: self.inactive, self.DC_PIN: self.inactive,
+                                 self.PWR_PIN: self.inactive})
+        self.request.release()
+        self.request = None
+        self.cs_requested = True
+
+
+class JetsonNano:
+    # Pin definition
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+
+    def __init__(self):
+        import ctypes
+        find_dirs = [
+            os.path.dirname(os.path.realpath(__file__)),
+            '/usr/local/lib',
+            '/usr/lib',
+        ]
+        def load(name):
+            for find_dir in find_dirs:
+                so_filename = os.path.join(find_dir, name)
+                if os.path.exists(so_filename):
+                    return ctypes.cdll.LoadLibrary(so_filename)
+            return None
+
+        self.SPI = load('sysfs_software_spi.so')
+        if self.SPI is None:
+            raise RuntimeError('Cannot find sysfs_software_spi.so')
+
+        # the library bit-bangs one byte per call
+        self.transfer = self.SPI.SYSFS_software_spi_transfer
+        self.transfer.argtypes = [ctypes.c_ubyte]
+        # sysfs_software_spi_buffer.so, built from sysfs_software_spi_buffer.c,
+        # loops over a whole buffer in C with that function
+        self.transfer_buffer = None
+        helper = load('sysfs_software_spi_buffer.so')
+        if helper is not None:
+            self.transfer_buffer = helper.SYSFS_software_spi_transfer_buffer
+            self.transfer_buffer.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t]
+            self.transfer_buffer.restype = None
+            self.transfer_address = ctypes.cast(self.transfer, ctypes.c_void_p)
+        else:
+            logger.debug("sysfs_software_spi_buffer.so not found, sending SPI data byte by byte")
+
+        import Jetson.GPIO
+        self.GPIO = Jetson.GPIO
+
+    def digital_write(self, pin, value):
+        self.GPIO.output(pin, value)
+
+    def digital_read(self, pin):
+        return self.GPIO.input(self.BUSY_PIN)
+
+    def wait_for_edge(self, pin, rising, timeout_ms):
+        edge = self.GPIO.RISING if rising else self.GPIO.FALLING
+        return self.GPIO.wait_for_edge(self.BUSY_PIN, edge, timeout=max(1, int(timeout_ms))) is not None
+
+    def delay_ms(self, delaytime):
+        time.sleep(delaytime / 1000.0)
+
+    def spi_writebyte(self, data):
+        self.transfer(data[0])
+
+    def spi_writebyte2(self, data):
+        if self.transfer_buffer is not None:
+            data = bytes(data)
+            self.transfer_buffer(self.transfer_address, data, len(data))
+            return
+        transfer = self.transfer
+        for value in data:
+            transfer(value)
+
+    def module_init(self):
+        self.GPIO.setmode(self.GPIO.BCM)
+        self.GPIO.setwarnings(False)
+        self.GPIO.setup(self.RST_PIN, self.GPIO.OUT)
+        self.GPIO.setup(self.DC_PIN, self.GPIO.OUT)
+        self.GPIO.setup(self.CS_PIN, self.GPIO.OUT)
+        self.GPIO.setup(self.PWR_PIN, self.GPIO.OUT)
+        self.GPIO.setup(self.BUSY_PIN, self.GPIO.IN)
+        
+        self.GPIO.output(self.PWR_PIN, 1)
+        
+        self.SPI.SYSFS_software_spi_begin()
+        return 0
+
+    def module_exit(self):
+        logger.debug("spi end")
+        self.SPI.SYSFS_software_spi_end()
+
+        logger.debug("close 5V, Module enters 0 power consumption ...")
+        self.GPIO.output(self.RST_PIN, 0)
+        self.GPIO.output(self.DC_PIN, 0)
+        self.GPIO.output(self.PWR_PIN, 0)
+
+        self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN, self.PWR_PIN])
+
+
+class SunriseX3:
+    # Pin definition
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+    Flag     = 0
+
+    def __init__(self):
+        import spidev
+        import Hobot.GPIO
+
+        self.GPIO = Hobot.GPIO
+        self.SPI = spidev.SpiDev()
+        self.transport = SpiTransport(self.SPI.xfer3)
+
+    def digital_write(self, pin, value):
+        self.GPIO.output(pin, value)
+
+    def digital_read(self, pin):
+        return self.GPIO.input(pin)
+
+    def wait_for_edge(self, pin, rising, timeout_ms):
+        edge = self.GPIO.RISING if rising else self.GPIO.FALLING
+        return self.GPIO.wait_for_edge(pin, edge, timeout=max(1, int(timeout_ms))) is not None
+
+    def delay_ms(self, delaytime):
+        time.sleep(delaytime / 1000.0)
+
+    def spi_writebyte(self, data):
+        self.SPI.writebytes(data)
+
+    def spi_writebyte2(self, data):
+        # for i in range(len(data)):
+        #     self.SPI.writebytes([data[i]])
+        self.transport.transfer(data)
+
+    def set_spi_speed_hz(self, hz):
+        if self.Flag:
+            self.SPI.max_speed_hz = hz
+
+    def module_init(self):
+        if self.Flag == 0:
+            self.Flag = 1
+            self.GPIO.setmode(self.GPIO.BCM)
+            self.GPIO.setwarnings(False)
+            self.GPIO.setup(self.RST_PIN, self.GPIO.OUT)
+            self.GPIO.setup(self.DC_PIN, self.GPIO.OUT)
+            self.GPIO.setup(self.CS_PIN, self.GPIO.OUT)
+            self.GPIO.setup(self.PWR_PIN, self.GPIO.OUT)
+            self.GPIO.setup(self.BUSY_PIN, self.GPIO.IN)
+
+            self.GPIO.output(self.PWR_PIN, 1)
+        
+            # SPI device, bus = 0, device = 0
+            self.SPI.open(2, 0)
+            self.SPI.max_speed_hz = SPI_SPEED_HZ
+            self.SPI.mode = 0b00
+            return 0
+        else:
+            return 0
+
+    def module_exit(self):
+        logger.debug("spi end")
+        self.SPI.close()
+
+        logger.debug("close 5V, Module enters 0 power consumption ...")
+        self.Flag = 0
+        self.GPIO.output(self.RST_PIN, 0)
+        self.GPIO.output(self.DC_PIN, 0)
+        self.GPIO.output(self.PWR_PIN, 0)
+
+        self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN], self.PWR_PIN)
+
+
+class Simulator:
+    """Virtual e-Paper panel for running the drivers off the target board.
+
+    The DC/CS/SPI traffic is recorded as a list of transactions and decoded
+    into the controller's RAM, so a frame can be inspected or dumped as PNG.
+    The BUSY pin is modelled with a per-operation duration; set the
+    EPD_SIMULATOR_TIME_SCALE environment variable to 0 to make refreshes
+    instant, e.g. in CI.
+
+    Two controller families are understood, selected with the `family`
+    argument or the EPD_SIMULATOR_FAMILY environment variable, and replaced
+    by the panel's own through configure() when the driver is created with
+    panels.create():
+      SSD16xx : RAM writes 0x24/0x26, BUSY high while busy. RAM is addressed
+                like the controller does it: the window (0x44/0x45, byte or
+                pixel x addresses), the address counter (0x4E/0x4F) and the
+                data entry mode (0x11) the driver set.
+      UC81xx  : RAM writes 0x10/0x13, BUSY low while busy
+    """
+    # Pin definition
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+
+    # seconds the BUSY pin stays asserted for each kind of operation
+    BUSY_TIME = {
+        'reset'   : 0.005,
+        'power'   : 0.08,
+        'full'    : 2.0,
+        'partial' : 0.3,
+    }
+
+    RAM_COMMANDS = {
+        'SSD16xx' : (0x24, 0x26),
+        'UC81xx'  : (0x10, 0x13),
+    }
+
+    # bytes per RAM row of the SSD16xx model, beyond the widest RAM x address
+    RAM_STRIDE = 256
+
+    def __init__(self, family=None, time_scale=None):
+        if family is None:
+            family = os.environ.get('EPD_SIMULATOR_FAMILY', 'SSD16xx')
+        if family not in self.RAM_COMMANDS:
+            raise ValueError('Unknown controller family: %s' % family)
+        if time_scale is None:
+            time_scale = float(os.environ.get('EPD_SIMULATOR_TIME_SCALE', '1'))
+        self.family = family
+        self.time_scale = time_scale
+        # panel geometry, only needed for windowed RAM writes and PNG dumps
+        self.width = None
+        self.height = None
+        self.pins = {}
+        self.transactions = []  # (dc, bytes) in the order they were clocked out
+        self.commands = []      # [opcode, bytearray of parameters]
+        self.ram = {}           # RAM write opcode -> bytearray
+        self.busy_log = []      # (kind, seconds)
+        self.reset_log()
+
+    def configure(self, width, height, family=None):
+        self.width = width
+        self.height = height
+        if family is not None:
+            if family not in self.RAM_COMMANDS:
+                raise ValueError('Unknown controller family: %s' % family)
+            self.family = family
+
+    def reset_log(self):
+        # cleared in place: the module-level aliases made below keep pointing
+        # at these objects
+        self.pins.clear()
+        self.pins.update({self.RST_PIN: 0, self.DC_PIN: 0, self.CS_PIN: 1, self.PWR_PIN: 0})
+        del self.transactions[:]
+        del self.commands[:]
+        self.ram.clear()
+        del self.busy_log[:]
+        self.busy_until = 0.0
+        self._busy_read = True
+        self._window = None     # (x_start byte, x_end byte, y_start, y_end)
+        self._cursor = (0, 0)
+        self._entry = 0x03      # SSD16xx data entry mode
+        # SSD16xx: (cursor, window, data entry mode) per RAM opcode of the last
+        # write of a whole frame in one command, framebuffer() reads the frame
+        # back the way it was written
+        self._origin = {}
+        self._ptr = None
+        self._update_mode = 0xC7
+        self._partial_mode = False
+
+    def _linewidth(self):
+        return (self.width + 7) // 8
+
+    def _set_busy(self, kind):
+        seconds = self.BUSY_TIME[kind]
+        self.busy_log.append((kind, seconds))
+        self.busy_until = time.monotonic() + seconds * self.time_scale
+        # the first read sees BUSY asserted even when time_scale makes the
+        # operation instant, as drivers that wait for BUSY to be asserted
+        # (epd4in01f, epd5in65f after POWER_OFF) expect
+        self._busy_read = False
+
+    def _ram_window(self):
+        # the SSD16xx window; x and y span the panel until the driver sets them
+        x_start, x_end, y_start, y_end = self._window or (None,) * 4
+        if x_start is None:
+            x_start, x_end = 0, self._linewidth() - 1
+        if y_start is None:
+            y_start, y_end = 0, self.height - 1
+        return x_start, x_end, y_start, y_end
+
+    @staticmethod
+    def _step(value, step, start, end):
+        # next value of an address counter stepping through start..end (in
+        # either order); wraps around to the other end of the window
+        low, high = min(start, end), max(start, end)
+        value += step
+        if value > high:
+            return low, True
+        if value < low:
+            return high, True
+        return value, False
+
+    def _advance(self, x, y, window, entry):
+        # the SSD16xx address after (x, y): ID0/ID1 of the data entry mode
+        # are the x and y directions, AM moves y first
+        x_start, x_end, y_start, y_end = window
+        x_step = 1 if entry & 0x01 else -1
+        y_step = 1 if entry & 0x02 else -1
+        if entry & 0x04:
+            y, wrapped = self._step(y, y_step, y_start, y_end)
+            if wrapped:
+                x, _ = self._step(x, x_step, x_start, x_end)
+        else:
+            x, wrapped = self._step(x, x_step, x_start, x_end)
+            if wrapped:
+                y, _ = self._step(y, y_step, y_start, y_end)
+        return x, y
+
+    def _start_command(self, opcode):
+        self.commands.append([opcode, bytearray()])
+        if opcode in self.RAM_COMMANDS[self.family]:
+            self.ram.setdefault(opcode, bytearray())
+            window = None
+            if self.width is None:
+                x, y = 0, 0
+            elif self.family == 'SSD16xx':
+                x, y = self._cursor
+                window = self._ram_window()
+            elif self._window is not None:
+                x, y = self._window[0::2]
+            else:
+                x, y = 0, 0
+            self._ptr = [opcode, x, y, 0, window]
+            return
+        self._ptr = None
+
+        if self.family == 'SSD16xx':
+            if opcode == 0x12:      # SWRESET
+                self._window = None
+                self._cursor = (0, 0)
+                self._entry = 0x03
+                self._set_busy('reset')
+            elif opcode == 0x20:    # Master Activation
+                if self._update_mode & 0x04:
+                    self._set_busy('partial' if self._update_mode & 0x08 else 'full')
+                else:
+                    self._set_busy('power')
+        else:
+            if opcode in (0x02, 0x04):  # POWER_OFF, POWER_ON
+                self._set_busy('power')
+            elif opcode == 0x12:        # DISPLAY_REFRESH
+                self._set_busy('partial' if self._partial_mode else 'full')
+            elif opcode == 0x91:        # PARTIAL_IN
+                self._partial_mode = True
+            elif opcode == 0x92:        # PARTIAL_OUT
+                self._partial_mode = False
+                self._window = None
+
+    def _write_ram(self, value):
+        opcode, x, y, offset, window = self._ptr
+        ram = self.ram[opcode]
+        if self.width is None:
+            index = offset
+            self._ptr[3] = offset + 1
+        elif window is not None:
+            index = y * self.RAM_STRIDE + x
+            self._ptr[1], self._ptr[2] = self._advance(x, y, window, self._entry)
+            self._ptr[3] = offset + 1
+            if offset + 1 == self._linewidth() * self.height:
+                self._origin[opcode] = (self._cursor, window, self._entry)
+        elif self._window is None:
+            index = offset
+            self._ptr[3] = offset + 1
+        else:
+            x_start, x_end, y_start, y_end = self._window
+            index = y * self._linewidth() + x
+            x += 1
+            if x > x_end:
+                x = x_start
+                y += 1
+            self._ptr[1] = x
+            self._ptr[2] = y
+        if index >= len(ram):
+            ram.extend(b'\xff' * (index + 1 - len(ram)))
+        ram[index] = value
+
+    def _end_parameter(self, opcode, params):
+        # commands whose parameters change how RAM writes are addressed
+        if self.family == 'SSD16xx':
+            if opcode == 0x22 and len(params) >= 1:
+                self._update_mode = params[0]
+            elif opcode == 0x11 and len(params) >= 1:
+                self._entry = params[0] & 0x07
+            elif opcode == 0x44 and len(params) in (2, 4):
+                # byte addresses, or 2 byte pixel addresses on the large panels
+                if len(params) == 2:
+                    x = (params[0], params[1])
+                else:
+                    x = ((params[0] | params[1] << 8) >> 3, (params[2] | params[3] << 8) >> 3)
+                y = self._window[2:] if self._window else (None, None)
+                self._window = x + tuple(y)
+            elif opcode == 0x45 and len(params) >= 4:
+                x = self._window[:2] if self._window else (None, None)
+                self._window = tuple(x) + (params[0] | params[1] << 8, params[2] | params[3] << 8)
+            elif opcode == 0x4E and len(params) in (1, 2):
+                x = params[0] if len(params) == 1 else (params[0] | params[1] << 8) >> 3
+                self._cursor = (x, self._cursor[1])
+            elif opcode == 0x4F and len(params) >= 2:
+                self._cursor = (self._cursor[0], params[0] | params[1] << 8)
+        elif opcode == 0x90 and len(params) >= 8:   # PARTIAL_WINDOW
+            self._window = ((params[0] << 8 | params[1]) >> 3, (params[2] << 8 | params[3]) >> 3,
+                            params[4] << 8 | params[5], params[6] << 8 | params[7])
+
+    def digital_write(self, pin, value):
+        self.pins[pin] = value
+
+    def digital_read(self, pin):
+        if pin != self.BUSY_PIN:
+            return self.pins.get(pin, 0)
+        busy = time.monotonic() < self.busy_until or not self._busy_read
+        self._busy_read = True
+        if self.family == 'SSD16xx':
+            return 1 if busy else 0
+        return 0 if busy else 1
+
+    def wait_for_edge(self, pin, rising, timeout_ms):
+        remaining = self.busy_until - time.monotonic()
+        if pin != self.BUSY_PIN or remaining * 1000.0 > timeout_ms:
+            time.sleep(timeout_ms / 1000.0)
+            return False
+        time.sleep(max(remaining, 0))
+        return True
+
+    def delay_ms(self, delaytime):
+        time.sleep(delaytime / 1000.0 * self.time_scale)
+
+    def spi_writebyte(self, data):
+        dc = self.pins[self.DC_PIN]
+        try:
+            data = bytes(data)
+        except ValueError:
+            # spidev keeps the low 8 bits of each value, e.g. of ~byte
+            data = bytes(value & 0xFF for value in data)
+        self.transactions.append((dc, data))
+        for value in data:
+            if dc == 0:
+                self._start_command(value)
+            elif self.commands:
+                opcode, params = self.commands[-1]
+                params.append(value)
+                if self._ptr is not None:
+                    self._write_ram(value)
+                else:
+                    self._end_parameter(opcode, params)
+
+    def spi_writebyte2(self, data):
+        self.spi_writebyte(data)
+
+    def framebuffer(self, opcode=None):
+        """The contents of a RAM plane, the black/white one by default
+
+        For SSD16xx panels (after configure()) the frame is read back from RAM
+        in the order the last whole-frame write wrote it, so it comes out in
+        the layout of the buffer the driver sent, whatever its window, address
+        counter and data entry mode.
+        """
+        if opcode is None:
+            opcode = self.RAM_COMMANDS[self.family][0 if self.family == 'SSD16xx' else 1]
+        ram = self.ram.get(opcode, bytearray())
+        if self.family != 'SSD16xx' or self.width is None:
+            return ram
+        # frames written a row at a time are read back from the top left
+        default = ((0, 0), (0, self._linewidth() - 1, 0, self.height - 1), 0x03)
+        (x, y), window, entry = self._origin.get(opcode, default)
+        frame = bytearray()
+        for _ in range(self._linewidth() * self.height):
+            index = y * self.RAM_STRIDE + x
+            frame.append(ram[index] if index < len(ram) else 0xFF)
+            x, y = self._advance(x, y, window, entry)
+        return frame
+
+    def save_png(self, path, opcode=None):
+        """Dump a 1 bit per pixel RAM plane as a PNG (needs configure(), which
+        panels.create() does)"""
+        from PIL import Image
+
+        if self.width is None:
+            raise RuntimeError('Simulator.configure() must be called before save_png()')
+        size = self._linewidth() * self.height
+        ram = bytes(self.framebuffer(opcode)[:size])
+        ram += b'\xff' * (size - len(ram))
+        Image.frombytes('1', (self.width, self.height), ram).save(path)
+
+    def module_init(self):
+        self.pins[self.PWR_PIN] = 1
+        return 0
+
+    def module_exit(self):
+        logger.debug("simulator: close 5V, Module enters 0 power consumption ...")
+        self.pins[self.RST_PIN] = 0
+        self.pins[self.DC_PIN] = 0
+        self.pins[self.PWR_PIN] = 0
+
+
+class Null:
+    """Backend that drives nothing and never waits.
+
+    For tooling and tests that only exercise the host side of the drivers
+    (packing, command generation) and need neither a panel nor a simulated one.
+    """
+    # Pin definition
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+
+    def digital_write(self, pin, value):
+        pass
+
+    def digital_read(self, pin):
+        return 0
+
+    def wait_busy(self, pin, busy_level=1, poll_ms=10, timeout_ms=None, poll=None):
+        return True
+
+    def delay_ms(self, delaytime):
+        pass
+
+    def spi_writebyte(self, data):
+        pass
+
+    def spi_writebyte2(self, data):
+        pass
+
+    def module_init(self):
+        return 0
+
+    def module_exit(self):
+        pass
+
+
+# Command program opcodes, see Recorder and run_program().
+PROGRAM_MODULE_INIT = 0x01  # -
+PROGRAM_MODULE_EXIT = 0x02  # -
+PROGRAM_PIN         = 0x03  # pin, value
+PROGRAM_DELAY       = 0x04  # milliseconds (u16)
+PROGRAM_COMMAND     = 0x05  # opcode, payload length (u32), payload
+PROGRAM_WAIT_BUSY   = 0x06  # pin, busy level, poll ms (u16), poll command (u16, 0xFFFF: none)
+
+
+class Recorder:
+    """Backend that compiles the traffic sent to it into a command program.
+
+    Bytes written with DC low start a command, the bytes that follow with DC
+    high become its payload regardless of chip-select cycles. Nothing reaches
+    a panel and BUSY never blocks.
+    """
+    # Pin definition
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+
+    def __init__(self):
+        self._program = bytearray()
+        self._dc = 0
+        self._opcode = None
+        self._payload = bytearray()
+
+    def _flush(self):
+        if self._opcode is not None:
+            self._program += struct.pack('<BBI', PROGRAM_COMMAND, self._opcode, len(self._payload))
+            self._program += self._payload
+            self._opcode = None
+            self._payload = bytearray()
+
+    def finish(self):
+        self._flush()
+        return bytes(self._program)
+
+    def digital_write(self, pin, value):
+        if pin == self.DC_PIN:
+            self._dc = value
+        elif pin != self.CS_PIN:
+            self._flush()
+            self._program += struct.pack('<BBB', PROGRAM_PIN, pin, 1 if value else 0)
+
+    def digital_read(self, pin):
+        return 0
+
+    def wait_busy(self, pin, busy_level=1, poll_ms=10, timeout_ms=None, poll=None):
+        self._flush()
+        poll_command = 0xFFFF
+        if poll is not None:
+            program, self._program = self._program, bytearray()
+            poll()
+            polled = self.finish()
+            self._program = program
+            if len(polled) != 6 or polled[0] != PROGRAM_COMMAND or polled[2:] != bytes(4):
+                raise ValueError("BUSY poll callbacks must send a single command without data")
+            poll_command = polled[1]
+        self._program += struct.pack('<BBBHH', PROGRAM_WAIT_BUSY, pin, busy_level, poll_ms, poll_command)
+        return True
+
+    def delay_ms(self, delaytime):
+        self._flush()
+        self._program += struct.pack('<BH', PROGRAM_DELAY, int(delaytime))
+
+    def spi_writebyte(self, data):
+        for value in data:
+            if self._dc:
+                if self._opcode is None:
+                    raise ValueError("data written before any command")
+                self._payload.append(value & 0xFF)
+            else:
+                self._flush()
+                self._opcode = value & 0xFF
+
+    def spi_writebyte2(self, data):
+        self.spi_writebyte(data)
+
+    def module_init(self):
+        self._flush()
+        self._program.append(PROGRAM_MODULE_INIT)
+        return 0
+
+    def module_exit(self):
+        self._flush()
+        self._program.append(PROGRAM_MODULE_EXIT)
+
+
+# Opcode of the last command sent, used to attribute BUSY waits. The drivers
+# report it from their send_command() through note_command().
+last_command = None
+
+# Upper bounds (ms) of the BUSY duration histogram buckets; the last bucket
+# counts everything longer.
+BUSY_BUCKETS_MS = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+BUSY_TIMEOUT_MS = int(os.environ.get('EPD_BUSY_TIMEOUT_MS', '60000'))
+
+# The edge wait is done in slices so an edge that happens between reading the
+# pin and arming the edge detection costs at most one slice. RPi.GPIO and
+# Jetson.GPIO arm it inside wait_for_edge(), so that gap is there on every
+# wait, and short BUSY periods (a reset, a LUT load) often end in it: a slice
+# is kept to about the 10 ms the BUSY polling used to cost.
+_EDGE_SLICE_MS = 20
+_edge_wait = True
+_busy_histogram = {}
+# Opcode the bytes on the bus currently belong to, GET_STATUS included.
+_opcode = None
+
+
+def note_command(command):
+    global last_command, _opcode
+    _opcode = command
+    # GET_STATUS is sent repeatedly while polling BUSY on some UC81xx panels,
+    # keep the wait attributed to the command that started it
+    if command != 0x71:
+        last_command = command
+
+
+# Start and end of an SPI transaction. Backends that can switch DC and CS in
+# one operation provide their own spi_select/spi_deselect, which replace
+# these when the backend is selected.
+def spi_select(dc):
+    digital_write(DC_PIN, dc)
+    digital_write(CS_PIN, 0)
+
+
+def spi_deselect():
+    digital_write(CS_PIN, 1)
+
+
+def send_command(command):
+    note_command(command)
+    spi_select(0)
+    spi_writebyte([command])
+    spi_deselect()
+
+
+def send_data(data):
+    spi_select(1)
+    spi_writebyte([data])
+    spi_deselect()
+
+
+def send_data2(data):
+    spi_select(1)
+    spi_writebyte2(data)
+    spi_deselect()
+
+
+def send_command_with_data(command, data):
+    """Send a command and its parameters in one chip-select cycle.
+
+    The controllers sample DC with the last bit of every byte, so CS can stay
+    asserted across the command byte and the payload; `data` is written with
+    a single SPI transfer instead of one per byte.
+    """
+    note_command(command)
+    spi_select(0)
+    spi_writebyte([command])
+    if len(data):
+        digital_write(DC_PIN, 1)
+        spi_writebyte2(data)
+    spi_deselect()
+
+
+def set_spi_speed(hz):
+    """Set the SPI clock, applied now if the bus is open and on every module_init()"""
+    global SPI_SPEED_HZ
+    SPI_SPEED_HZ = int(hz)
+    if hasattr(implementation, 'set_spi_speed_hz'):
+        implementation.set_spi_speed_hz(SPI_SPEED_HZ)
+
+
+def autotune_spi_speed(check, speeds=SPI_SPEED_CANDIDATES_HZ):
+    """Find the highest SPI clock that still produces correct frames.
+
+    The panels cannot be read back over the Waveshare HAT (MISO is not
+    wired), so `check(hz)` has to draw a test frame and confirm it some
+    other way, e.g. by asking the operator or looking through a camera, and
+    return True if it came out right. Speeds are tried in ascending order
+    until the first failure; the best one is applied and returned, or None
+    if even the slowest failed (the previous clock is then restored).
+    """
+    previous = SPI_SPEED_HZ
+    best = None
+    for hz in sorted(speeds):
+        set_spi_speed(hz)
+        if not check(hz):
+            break
+        best = hz
+    set_spi_speed(best if best is not None else previous)
+    logger.info("SPI clock tuned to %s Hz", best)
+    return best
+
+
+def _record_busy(command, seconds):
+    buckets = _busy_histogram.get(command)
+    if buckets is None:
+        buckets = _busy_histogram[command] = [0] * (len(BUSY_BUCKETS_MS) + 1)
+    ms = seconds * 1000.0
+    for i, bound in enumerate(BUSY_BUCKETS_MS):
+        if ms <= bound:
+            buckets[i] += 1
+            break
+    else:
+        buckets[-1] += 1
+
+
+def busy_histogram():
+    """Return {command opcode: [count per BUSY_BUCKETS_MS bucket, overflow]}"""
+    return {command: list(buckets) for command, buckets in _busy_histogram.items()}
+
+
+def reset_busy_histogram():
+    _busy_histogram.clear()
+
+
+def wait_busy(pin, busy_level=1, poll_ms=10, timeout_ms=None, poll=None):
+    """Block while `pin` reads `busy_level`.
+
+    Sleeps on the releasing edge when the platform supports edge detection,
+    otherwise polls every `poll_ms`. `poll`, if given, is called before each
+    poll and forces polling (for controllers that need a GET_STATUS command
+    to update BUSY). Returns False if `timeout_ms` expired first.
+    """
+    global _edge_wait
+    if timeout_ms is None:
+        timeout_ms = BUSY_TIMEOUT_MS
+    start = time.monotonic()
+    deadline = start + timeout_ms / 1000.0
+    released = True
+    while digital_read(pin) == busy_level:
+        remaining_ms = (deadline - time.monotonic()) * 1000.0
+        if remaining_ms <= 0:
+            logger.warning("e-Paper busy timeout after %d ms", timeout_ms)
+            released = False
+            break
+        if poll is None and _edge_wait and hasattr(implementation, 'wait_for_edge'):
+            try:
+                implementation.wait_for_edge(pin, busy_level == 0, min(remaining_ms, _EDGE_SLICE_MS))
+                continue
+            except RuntimeError as e:
+                logger.debug("edge detection unavailable, polling BUSY: %s", e)
+                _edge_wait = False
+        if poll is not None:
+            poll()
+        delay_ms(poll_ms)
+    _record_busy(last_command, time.monotonic() - start)
+    return released
+
+
+# Number of SPI writes and BUSY waits kept in the instrumentation ring buffer.
+INSTRUMENT_RING_SIZE = int(os.environ.get('EPD_INSTRUMENT_RING', '4096'))
+
+# Module functions wrapped while instrumentation is on.
+_INSTRUMENTED = ('digital_write', 'spi_select', 'spi_deselect', 'spi_writebyte', 'spi_writebyte2',
+                 'wait_busy')
+_instrumentation = None
+
+
+class Instrumentation:
+    """Per-opcode counters and a ring buffer of the most recent bus events.
+
+    opcodes maps a command opcode to [transactions, bytes, SPI seconds, BUSY
+    seconds]; the bytes include the command byte itself. Ring entries are
+    (monotonic time, 'spi' or 'busy', opcode, bytes, seconds).
+    """
+    def __init__(self, size):
+        self.ring = collections.deque(maxlen=size)
+        self.reset()
+
+    def reset(self):
+        self.ring.clear()
+        self.opcodes = {}
+        self.gpio_toggles = {}
+        self.started = time.monotonic()
+
+    def _counters(self, opcode):
+        counters = self.opcodes.get(opcode)
+        if counters is None:
+            counters = self.opcodes[opcode] = [0, 0, 0.0, 0.0]
+        return counters
+
+    def transaction(self):
+        self._counters(_opcode)[0] += 1
+
+    def spi(self, start, nbytes, seconds):
+        counters = self._counters(_opcode)
+        counters[1] += nbytes
+        counters[2] += seconds
+        self.ring.append((start, 'spi', _opcode, nbytes, seconds))
+
+    def busy(self, start, opcode, seconds):
+        self._counters(opcode)[3] += seconds
+        self.ring.append((start, 'busy', opcode, 0, seconds))
+
+    def gpio(self, pin):
+        self.gpio_toggles[pin] = self.gpio_toggles.get(pin, 0) + 1
+
+    def snapshot(self):
+        opcodes = {opcode: {'transactions': c[0], 'bytes': c[1], 'spi_seconds': c[2],
+                            'busy_seconds': c[3]}
+                   for opcode, c in self.opcodes.items()}
+        return {
+            'elapsed_seconds': time.monotonic() - self.started,
+            'spi_seconds': sum(c[2] for c in self.opcodes.values()),
+            'busy_seconds': sum(c[3] for c in self.opcodes.values()),
+            'opcodes': opcodes,
+            'gpio_toggles': dict(self.gpio_toggles),
+            'events': list(self.ring),
+        }
+
+
+def _instrumented(name, func, stats):
+    # Backends with their own spi_select/spi_deselect drive DC and CS without
+    # going through digital_write, so count those pins here.
+    own_select = func is not _defaults.get(name)
+    if name in ('spi_writebyte', 'spi_writebyte2'):
+        def wrapper(data):
+            start = time.monotonic()
+            result = func(data)
+            stats.spi(start, len(data), time.monotonic() - start)
+            return result
+    elif name == 'wait_busy':
+        def wrapper(*args, **kwargs):
+            command = last_command
+            start = time.monotonic()
+            result = func(*args, **kwargs)
+            stats.busy(start, command, time.monotonic() - start)
+            return result
+    elif name == 'digital_write':
+        def wrapper(pin, value):
+            stats.gpio(pin)
+            return func(pin, value)
+    elif name == 'spi_select':
+        def wrapper(dc):
+            stats.transaction()
+            if own_select:
+                stats.gpio(DC_PIN)
+                stats.gpio(CS_PIN)
+            return func(dc)
+    else:
+        def wrapper():
+            if own_select:
+                stats.gpio(CS_PIN)
+            return func()
+    wrapper.__name__ = name
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def _wrap():
+    module = sys.modules[__name__]
+    for name in _INSTRUMENTED:
+        setattr(module, name, _instrumented(name, getattr(module, name), _instrumentation))
+
+
+def _unwrap():
+    module = sys.modules[__name__]
+    for name in _INSTRUMENTED:
+        func = getattr(module, name)
+        setattr(module, name, getattr(func, '__wrapped__', func))
+
+
+def instrument(enabled=True, size=None):
+    """Turn the SPI/GPIO/BUSY instrumentation on (with empty counters) or off.
+
+    While off the bus functions are not wrapped at all. While on, each SPI
+    write costs two clock reads and a ring buffer append, which is small next
+    to the transfer itself.
+    """
+    global _instrumentation
+    _unwrap()
+    _instrumentation = Instrumentation(size or INSTRUMENT_RING_SIZE) if enabled else None
+    if enabled:
+        _wrap()
+
+
+def instrumentation_snapshot():
+    """Return the counters and events collected since the last reset, None if off"""
+    if _instrumentation is None:
+        return None
+    return _instrumentation.snapshot()
+
+
+def reset_instrumentation():
+    if _instrumentation is not None:
+        _instrumentation.reset()
+
+
+def instrumentation_report():
+    """Summarise instrumentation_snapshot() as text, slowest opcodes first"""
+    snapshot = instrumentation_snapshot()
+    if snapshot is None:
+        return None
+    lines = ["%.3f s elapsed, %.3f s SPI, %.3f s BUSY, GPIO toggles %s" % (
+        snapshot['elapsed_seconds'], snapshot['spi_seconds'], snapshot['busy_seconds'],
+        snapshot['gpio_toggles'])]
+    opcodes = sorted(snapshot['opcodes'].items(),
+                     key=lambda item: item[1]['spi_seconds'] + item[1]['busy_seconds'], reverse=True)
+    for opcode, c in opcodes:
+        lines.append("  %-4s %6d transactions %8d bytes %8.3f s SPI %8.3f s BUSY" % (
+            'None' if opcode is None else '0x%02X' % opcode,
+            c['transactions'], c['bytes'], c['spi_seconds'], c['busy_seconds']))
+    return "\n".join(lines)
+
+
+def record_program(func, *args, **kwargs):
+    """Run `func` against a Recorder instead of the panel and return the program.
+
+    The program is a compact byte string of PROGRAM_* operations: commands
+    with their full payload, pin writes, delays, BUSY waits and module
+    init/exit. run_program() replays it with one SPI transaction per command;
+    disassemble_program() turns it into text for diffing.
+    """
+    previous = implementation
+    recorder = Recorder()
+    _bind(recorder)
+    try:
+        func(*args, **kwargs)
+    finally:
+        _bind(previous)
+    return recorder.finish()
+
+
+def run_program(program):
+    """Replay a recorded program on the current backend.
+
+    Returns -1 if its module_init() failed, like the drivers' init(), else 0.
+    """
+    i = 0
+    end = len(program)
+    while i < end:
+        op = program[i]
+        if op == PROGRAM_COMMAND:
+            opcode, length = struct.unpack_from('<BI', program, i + 1)
+            i += 6
+            send_command_with_data(opcode, program[i:i + length])
+            i += length
+        elif op == PROGRAM_WAIT_BUSY:
+            pin, busy_level, poll_ms, poll_command = struct.unpack_from('<BBHH', program, i + 1)
+            i += 7
+            poll = None
+            if poll_command != 0xFFFF:
+                poll = functools.partial(send_command, poll_command)
+            wait_busy(pin, busy_level, poll_ms, poll=poll)
+        elif op == PROGRAM_DELAY:
+            delay_ms(struct.unpack_from('<H', program, i + 1)[0])
+            i += 3
+        elif op == PROGRAM_PIN:
+            digital_write(program[i + 1], program[i + 2])
+            i += 3
+        elif op == PROGRAM_MODULE_INIT:
+            if module_init() != 0:
+                return -1
+            i += 1
+        elif op == PROGRAM_MODULE_EXIT:
+            module_exit()
+            i += 1
+        else:
+            raise ValueError("invalid program opcode 0x%02X at offset %d" % (op, i))
+    return 0
+
+
+def disassemble_program(program):
+    """Return a recorded program as one line of text per operation"""
+    lines = []
+    i = 0
+    while i < len(program):
+        op = program[i]
+        if op == PROGRAM_COMMAND:
+            opcode, length = struct.unpack_from('<BI', program, i + 1)
+            payload = program[i + 6:i + 6 + length]
+            lines.append(("command 0x%02X %s" % (opcode, payload.hex(' '))).rstrip())
+            i += 6 + length
+        elif op == PROGRAM_WAIT_BUSY:
+            pin, busy_level, poll_ms, poll_command = struct.unpack_from('<BBHH', program, i + 1)
+            line = "wait_busy pin %d level %d every %d ms" % (pin, busy_level, poll_ms)
+            if poll_command != 0xFFFF:
+                line += " polling 0x%02X" % poll_command
+            lines.append(line)
+            i += 7
+        elif op == PROGRAM_DELAY:
+            lines.append("delay %d ms" % struct.unpack_from('<H', program, i + 1))
+            i += 3
+        elif op == PROGRAM_PIN:
+            lines.append("pin %d = %d" % (program[i + 1], program[i + 2]))
+            i += 3
+        elif op == PROGRAM_MODULE_INIT:
+            lines.append("module_init")
+            i += 1
+        elif op == PROGRAM_MODULE_EXIT:
+            lines.append("module_exit")
+            i += 1
+        else:
+            raise ValueError("invalid program opcode 0x%02X at offset %d" % (op, i))
+    return lines
+
+
+def precompiled(method):
+    """Decorator for driver methods whose bus traffic depends only on their arguments.
+
+    The first call with a given set of arguments records the method into a
+    program, which that and every later call on the same object replays.
+    The method's own return value is kept, unless module_init() fails.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        programs = self.__dict__.setdefault('_programs', {})
+        key = (method.__name__,) + args
+        if key not in programs:
+            result = []
+            program = record_program(lambda: result.append(method(self, *args)))
+            programs[key] = (program, result[0])
+        program, result = programs[key]
+        if run_program(program) != 0:
+            return -1
+        return result
+    return wrapper
+
+
+def _gpiod_or_none():
+    try:
+        return Gpiod()
+    except (ImportError, OSError, RuntimeError) as e:
+        logger.debug("gpiod backend unavailable: %s", e)
+        return None
+
+
+def _is_raspberry_pi():
+    try:
+        with open('/proc/device-tree/model') as f:
+            return f.read().startswith('Raspberry Pi')
+    except OSError:
+        return os.path.exists('/sys/bus/platform/drivers/gpiomem-bcm2835')
+
+
+def _hardware():
+    if _is_raspberry_pi():
+        return _gpiod_or_none() or RaspberryPi()
+    if os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
+        return SunriseX3()
+    return JetsonNano()
+
+
+BACKENDS = {
+    'hardware'    : _hardware,
+    'gpiod'       : Gpiod,
+    'raspberrypi' : RaspberryPi,
+    'sunrisex3'   : SunriseX3,
+    'jetsonnano'  : JetsonNano,
+    'simulator'   : Simulator,
+    'null'        : Null,
+}
+
+# Pin definition shared by all backends, so the drivers can be constructed
+# before one is selected
+RST_PIN  = 17
+DC_PIN   = 25
+CS_PIN   = 8
+BUSY_PIN = 24
+PWR_PIN  = 18
+
+# The backend is picked on first use rather than at import time, so importing
+# a driver does not probe or import any hardware support.
+implementation = None
+_bound = []
+
+# (width, height, controller family) of the panel being driven, see
+# configure_panel()
+_panel = None
+
+
+def _deferred(name):
+    def call(*args, **kwargs):
+        select_backend()
+        return getattr(implementation, name)(*args, **kwargs)
+    call.__name__ = name
+    return call
+
+
+for _name in ('digital_write', 'digital_read', 'delay_ms', 'spi_writebyte', 'spi_writebyte2',
+              'module_init', 'module_exit'):
+    globals()[_name] = _deferred(_name)
+
+
+def select_backend(name=None):
+    """Instantiate a backend and bind its methods as this module's functions.
+
+    `name` is one of BACKENDS; without it the EPD_BACKEND environment
+    variable is used, defaulting to 'hardware' (probe the board). Called
+    implicitly by the first module_init() or other backend access; calling it
+    again with a name replaces the current backend.
+    """
+    if name is None:
+        if implementation is not None:
+            return implementation
+        name = os.environ.get('EPD_BACKEND', 'hardware')
+    try:
+        factory = BACKENDS[name.lower()]
+    except KeyError:
+        raise ValueError('Unknown e-Paper backend: %s' % name)
+    return _bind(factory())
+
+
+def configure_panel(width, height, family):
+    """Tell the backends which panel they drive, done by panels.create().
+
+    Backends that model the panel, i.e. the Simulator, take its size and
+    controller family ('SSD16xx' or 'UC81xx') from it, now and whenever a
+    backend is selected later.
+    """
+    global _panel
+    _panel = (width, height, family)
+    if implementation is not None and hasattr(implementation, 'configure'):
+        implementation.configure(width, height, family)
+
+
+def _bind(backend):
+    global implementation
+    module = sys.modules[__name__]
+    _unwrap()
+    for attr in _bound:
+        if attr in _defaults:
+            setattr(module, attr, _defaults[attr])
+        else:
+            delattr(module, attr)
+    del _bound[:]
+    implementation = backend
+    if backend is not None and _panel is not None and hasattr(backend, 'configure'):
+        backend.configure(*_panel)
+    if backend is not None:
+        for func in [x for x in dir(implementation) if not x.startswith('_')]:
+            setattr(module, func, getattr(implementation, func))
+            _bound.append(func)
+        logger.debug("e-Paper backend: %s", type(implementation).__name__)
+    if _instrumentation is not None:
+        _wrap()
+    return implementation
+
+
+def __getattr__(name):
+    # backend specific attributes, e.g. the simulator's save_png
+    if name.startswith('__') or implementation is not None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    select_backend()
+    try:
+        return globals()[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+_defaults = {name: value for name, value in globals().items() if not name.startswith('_')}
+
+if os.environ.get('EPD_INSTRUMENT') == '1':
+    instrument()
+
+### END OF FILE ###
@@ -0,0 +1,395 @@
+# /*****************************************************************************
+# * | File        :	  packing.py
+# * | Function    :   Frame buffer packing shared by the drivers
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Date        :   2026-10-18
+# * | Info        :
+# ******************************************************************************
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import functools
+
+from PIL import Image, ImageChops
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def linewidth(width):
+    """Bytes per row of a 1bpp frame, rows are padded to a whole byte"""
+    return (width + 7) // 8
+
+
+def pack_1bpp(image, width, height):
+    """Pack an image into the controllers' 1bpp layout.
+
+    Rows of `width` pixels, most significant bit first, padded to a byte
+    with white, 1 = white. `image` is either
+      - a PIL image of width x height, or height x width which is rotated 90
+        degrees counter-clockwise onto the panel (after the conversion to 1
+        bit, so dithering matches the drivers' per-pixel loops),
+      - a NumPy array shaped (height, width) or (width, height), where
+        nonzero is white,
+      - an already packed buffer, which is copied.
+    Returns a bytearray, or None if the size matches neither orientation.
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        buf = bytearray(image)
+        return buf if len(buf) == linewidth(width) * height else None
+    if np is not None and isinstance(image, np.ndarray):
+        if image.shape != (height, width):
+            if image.shape != (width, height):
+                return None
+            image = np.rot90(image)
+        return _pad_white(bytearray(np.packbits(image != 0, axis=1).tobytes()), width)
+    image = image.convert('1')
+    if image.size != (width, height):
+        if image.size != (height, width):
+            return None
+        image = image.rotate(90, expand=True)
+    return _pad_white(bytearray(image.tobytes('raw')), width)
+
+
+def _pad_white(buf, width):
+    # the padding bits at the end of each row are left white
+    if width % 8:
+        pad = 0xFF >> (width % 8)
+        row = linewidth(width)
+        buf[row - 1::row] = bytes(buf[row - 1::row]).translate(bytes(value | pad for value in range(256)))
+    return buf
+
+
+# 4-gray frames hold 4 pixels per byte, MSB first, as the top two bits of
+# the GRAY1..GRAY4 levels 0xFF, 0xC0, 0x80, 0x00 after 0xC0 is moved to 0x80
+# and 0x80 to 0x40: 3 white, 2 light gray, 1 dark gray, 0 black.
+_GRAY_LEVELS = [(0x80 if value == 0xC0 else 0x40 if value == 0x80 else value) >> 6
+                for value in range(256)]
+_SHIFT = {shift: bytes((value << shift) & 0xFF for value in range(256)) for shift in (2, 4, 6)}
+
+
+def _or_bytes(parts, length):
+    # bitwise OR of equally long byte strings whose set bits never overlap
+    value = 0
+    for part in parts:
+        value |= int.from_bytes(part, 'big')
+    return bytearray(value.to_bytes(length, 'big'))
+
+
+def pack_2bpp_gray(image, width, height):
+    """Quantize an image to 4 gray levels and pack it 4 pixels per byte.
+
+    Orientation is handled like pack_1bpp(). Returns a bytearray, or None
+    if the size matches neither orientation.
+    """
+    image = image.convert('L')
+    if image.size != (width, height):
+        if image.size != (height, width):
+            return None
+        image = image.rotate(90, expand=True)
+    levels = image.point(_GRAY_LEVELS).tobytes()
+    return _or_bytes([levels[0::4].translate(_SHIFT[6]), levels[1::4].translate(_SHIFT[4]),
+                      levels[2::4].translate(_SHIFT[2]), levels[3::4]], len(levels) // 4)
+
+
+def plane_table(bits):
+    """Table for split_2bpp(): `bits` is the plane bit for black, dark gray, light gray and white"""
+    table = []
+    for value in range(256):
+        out = 0
+        for shift in (6, 4, 2, 0):
+            out = (out << 1) | bits[(value >> shift) & 0x3]
+        table.append(out)
+    return (bytes((nibble << 4) for nibble in table), bytes(table))
+
+
+def split_2bpp(buf, table):
+    """Extract one bit plane of a 4-gray frame, 8 pixels per byte"""
+    buf = bytes(buf)
+    high, low = table
+    return _or_bytes([buf[0::2].translate(high), buf[1::2].translate(low)], len(buf) // 2)
+
+
+@functools.lru_cache(maxsize=None)
+def palette_image(colors):
+    """P image carrying `colors` (a tuple of RGB tuples) for Image.quantize()
+
+    The rest of the 256 entries is black. Built once per palette.
+    """
+    image = Image.new('P', (1, 1))
+    image.putpalette(sum(colors, ()) + (0, 0, 0) * (256 - len(colors)))
+    return image
+
+
+def on_palette(image, colors):
+    """True if `image` is a P image that only uses the first entries of `colors`"""
+    if image.mode != 'P':
+        return False
+    palette = image.getpalette()
+    return (palette is not None and palette[:3 * len(colors)] == list(sum(colors, ()))
+            and image.getextrema()[1] < len(colors))
+
+
+def quantize(image, colors):
+    """Map an image onto `colors` with Floyd-Steinberg dithering.
+
+    P images already on the panel palette are returned as they are, their
+    quantization would not change a pixel.
+    """
+    if on_palette(image, colors):
+        return image
+    return image.convert('RGB').quantize(palette=palette_image(colors))
+
+
+def exact_palette(image, colors):
+    """Map the pixels that are exactly one of `colors` to its index, any other to 0"""
+    image = image.convert('RGB')
+    bands = image.split()
+    indices = Image.new('P', image.size, 0)
+    for index, color in enumerate(colors):
+        if index == 0:
+            continue
+        mask = None
+        for band, level in zip(bands, color):
+            match = band.point([255 if value == level else 0 for value in range(256)])
+            mask = match if mask is None else ImageChops.multiply(mask, match)
+        indices.paste(index, mask=mask)
+    return indices
+
+
+def pack_indices(image, bits):
+    """Pack the pixel values of a P image `bits` (2 or 4) per byte, MSB first
+
+    Rows are padded to a whole byte with index 0.
+    """
+    per_byte = 8 // bits
+    width, height = image.size
+    if width % per_byte:
+        padded = Image.new('P', (width + per_byte - width % per_byte, height), 0)
+        padded.paste(image, (0, 0))
+        image = padded
+    indices = image.tobytes()
+    parts = [indices[i::per_byte].translate(_SHIFT[8 - bits * (i + 1)]) for i in range(per_byte - 1)]
+    parts.append(indices[per_byte - 1::per_byte])
+    return _or_bytes(parts, len(indices) // per_byte)
+
+
+def expand_table(bits, white, black):
+    """Table mapping a packed 1bpp byte to 8 pixels of `bits` bits each"""
+    table = []
+    for value in range(256):
+        out = 0
+        for bit in range(8):
+            out = (out << bits) | (white if value & (0x80 >> bit) else black)
+        table.append(out.to_bytes(bits, 'big'))
+    return table
+
+
+def expand_1bpp(buf, table):
+    """Widen a packed buffer byte by byte with a table from expand_table() or alike"""
+    return bytearray(b''.join(map(table.__getitem__, buf)))
+
+
+def select(mask, ones, zeros):
+    """Take the bits of `ones` where `mask` is set and those of `zeros` elsewhere
+
+    All three are equally long byte strings.
+    """
+    mask = int.from_bytes(mask, 'big')
+    value = (int.from_bytes(ones, 'big') & mask) | (int.from_bytes(zeros, 'big') & ~mask)
+    return bytearray(value.to_bytes(len(zeros), 'big'))
+
+
+@functools.lru_cache(maxsize=32)
+def solid(value, size):
+    """Immutable buffer of `size` bytes all set to `value`
+
+    Built once per panel, value and size, for Clear() and blank frames.
+    """
+    return bytes((value & 0xFF,)) * size
+
+
+_INVERT = bytes(0xFF - value for value in range(256))
+
+
+def invert(buf):
+    """Return a copy of a packed buffer with every bit flipped"""
+    return bytearray(bytes(buf).translate(_INVERT))
+
+
+# PIL transpose taking an image to an orientation: mirrored left to right
+# first if asked, then rotated counter-clockwise by the angle
+_TRANSPOSE = {
+    (0, False): None,
+    (90, False): Image.ROTATE_90,
+    (180, False): Image.ROTATE_180,
+    (270, False): Image.ROTATE_270,
+    (0, True): Image.FLIP_LEFT_RIGHT,
+    (90, True): Image.TRANSPOSE,
+    (180, True): Image.FLIP_TOP_BOTTOM,
+    (270, True): Image.TRANSVERSE,
+}
+
+
+def transpose_method(rotation, mirror=False):
+    """The Image.transpose() method for an orientation, None for no change
+
+    `rotation` is 0, 90, 180 or 270 degrees counter-clockwise, applied after
+    mirroring left to right when `mirror` is set.
+    """
+    try:
+        return _TRANSPOSE[rotation, bool(mirror)]
+    except KeyError:
+        raise ValueError("Rotation must be 0, 90, 180 or 270, not %r" % (rotation,))
+
+
+def pack_1bpp_oriented(image, rotation, mirror=False):
+    """Pack an image turned by an orientation (see transpose_method()) in one pass
+
+    With NumPy the pixels are mirrored and rotated as array views and packed
+    once, without NumPy the image gets one transpose. Rows are padded like
+    pack_1bpp() does; for 90 and 270 degrees the frame is image.height pixels
+    wide. Returns a bytearray.
+    """
+    method = transpose_method(rotation, mirror)
+    image = image.convert('1')
+    if np is not None:
+        return pack_pixels_oriented(np.asarray(image), rotation, mirror)
+    if method is not None:
+        image = image.transpose(method)
+    return _pad_white(bytearray(image.tobytes('raw')), image.width)
+
+
+def pack_pixels_oriented(pixels, rotation, mirror=False):
+    """pack_1bpp_oriented() for a NumPy array of pixels, rows first, 0 = black
+
+    Views such as flipped or strided ones are fine, they are only copied
+    once, into the packed frame.
+    """
+    transpose_method(rotation, mirror)
+    if mirror:
+        pixels = pixels[:, ::-1]
+    pixels = np.ascontiguousarray(np.rot90(pixels, rotation // 90))
+    return _pad_white(bytearray(np.packbits(pixels, axis=1).tobytes()), pixels.shape[1])
+
+
+def region_bytes(rect):
+    """First byte column, byte columns and rows of a rectangle of a 1bpp frame
+
+    `rect` is (x0, y0, x1, y1) in pixels, ends exclusive; x is widened to
+    whole bytes.
+    """
+    x0, y0, x1, y1 = rect
+    first = x0 // 8
+    return first, linewidth(x1) - first, y1 - y0
+
+
+def _region_array(buf, width, rect):
+    # rows x columns NumPy view of the region's bytes inside `buf`, no copy
+    row = linewidth(width)
+    first, columns, rows = region_bytes(rect)
+    flat = np.frombuffer(buf, np.uint8, (rows - 1) * row + columns, rect[1] * row + first)
+    return np.lib.stride_tricks.as_strided(flat, (rows, columns), (row, 1),
+                                           writeable=flat.flags.writeable)
+
+
+def copy_region(buf, width, rect, out=None, inverted=False):
+    """Copy the bytes of a packed 1bpp frame inside a rectangle, row after row
+
+    `out` is a bytearray reused between calls, large enough for the region
+    (a frame sized one always is); None allocates one. With `inverted` every
+    copied bit is flipped. Returns a memoryview of the region's bytes at the
+    start of `out`; the work done scales with the region, not with the frame.
+    """
+    row = linewidth(width)
+    first, columns, rows = region_bytes(rect)
+    size = columns * rows
+    if out is None:
+        out = bytearray(size)
+    if size == 0:
+        return memoryview(out)[:0]
+    if not isinstance(buf, (bytes, bytearray, memoryview)):
+        buf = bytes(buf)
+    if np is not None:
+        src = _region_array(buf, width, rect)
+        dst = np.frombuffer(out, np.uint8, size).reshape(rows, columns)
+        if inverted:
+            np.invert(src, out=dst)
+        else:
+            dst[...] = src
+        return memoryview(out)[:size]
+    src, dst = memoryview(buf), memoryview(out)
+    start = rect[1] * row + first
+    for y in range(rows):
+        dst[y * columns:(y + 1) * columns] = src[start + y * row:start + y * row + columns]
+    if inverted:
+        dst[:size] = bytes(dst[:size]).translate(_INVERT)
+    return dst[:size]
+
+
+def paste_region(buf, width, rect, region):
+    """Write the bytes copy_region() returned for `rect` back into the bytearray `buf`"""
+    row = linewidth(width)
+    first, columns, rows = region_bytes(rect)
+    if columns * rows == 0:
+        return
+    if np is not None:
+        _region_array(buf, width, rect)[...] = np.frombuffer(region, np.uint8, columns * rows).reshape(rows, columns)
+        return
+    dst, src = memoryview(buf), memoryview(region)
+    start = rect[1] * row + first
+    for y in range(rows):
+        dst[start + y * row:start + y * row + columns] = src[y * columns:(y + 1) * columns]
+
+
+def dirty_rects(old, new, width, height):
+    """Rectangles covering the bytes that differ between two packed 1bpp frames
+
+    Runs of changed rows are merged into one rectangle spanning their changed
+    bytes, so x is byte aligned. Returns a list of (x0, y0, x1, y1) in pixels,
+    ends exclusive, empty if the frames are equal.
+    """
+    old, new = bytes(old), bytes(new)
+    if old == new:
+        return []
+    row = linewidth(width)
+    rects = []
+    band = None
+    for y in range(height):
+        a = old[y * row:(y + 1) * row]
+        b = new[y * row:(y + 1) * row]
+        if a == b:
+            if band is not None:
+                rects.append(band)
+                band = None
+            continue
+        diff = int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')
+        first = row - 1 - (diff.bit_length() - 1) // 8
+        last = row - 1 - ((diff & -diff).bit_length() - 1) // 8
+        if band is None:
+            band = [first, y, last, y]
+        else:
+            band = [min(band[0], first), band[1], max(band[2], last), y]
+    if band is not None:
+        rects.append(band)
+    return [(x0 * 8, y0, min((x1 + 1) * 8, width), y1 + 1) for x0, y0, x1, y1 in rects]
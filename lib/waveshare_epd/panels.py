@@ -0,0 +1,165 @@
+# /*****************************************************************************
+# * | File        :	  panels.py
+# * | Function    :   Registry of the supported e-Paper panels
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Date        :   2026-10-18
+# * | Info        :
+# ******************************************************************************
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import collections
+import importlib
+
+from . import epdconfig
+
+# controller families, see controller.py
+SSD16XX = 'SSD16xx'
+UC81XX = 'UC81xx'
+
+# colors a panel can show
+BW = ('black', 'white')
+BWR = ('black', 'white', 'red')
+BWY = ('black', 'white', 'yellow')
+G4 = ('black', 'white', 'yellow', 'red')
+F7 = ('black', 'white', 'green', 'blue', 'red', 'yellow', 'orange')
+
+# name      driver module in this package
+# width     panel width in pixels, height in pixels (portrait, as the driver)
+# bits      bits per pixel of the buffer getbuffer() returns
+# planes    number of frame buffers display() takes
+# colors    colors the panel can show
+# family    controller family
+# ram       RAM write opcodes display() sends the frame with
+# partial   name of the driver's partial refresh method, None without one
+# gray      Gray() of the driver's 4-gray mode, None without one
+# init      name of the method that initializes the controller for full
+#           refreshes, init_args its arguments
+# display   name of the method drawing a full frame of `planes` buffers
+# clear     name of the method blanking the panel, clear_args its arguments
+# sleep     name of the method putting the panel into deep sleep
+Panel = collections.namedtuple('Panel', 'name width height bits planes colors family ram partial gray '
+                                        'init init_args display clear clear_args sleep')
+
+# a driver's 4-gray mode: `init` is the name of the method initializing the
+# controller for it, init_args its arguments, clear_args those of the panel's
+# clear method in it. Its frames come from getbuffer_4Gray() and are drawn with
+# display_4Gray().
+Gray = collections.namedtuple('Gray', 'init init_args clear_args', defaults=((), ()))
+
+# an argument in init_args or clear_args that is an attribute of the driver's
+# EPD instance, e.g. Attr('lut_full_update')
+Attr = collections.namedtuple('Attr', 'name')
+
+PANELS = {}
+
+
+def register(name, width, height, bits=1, planes=1, colors=BW, family=UC81XX, ram=(), partial=None, gray=None,
+             init='init', init_args=(), display='display', clear='Clear', clear_args=(), sleep='sleep'):
+    """Add a panel to the registry, replacing one of the same name"""
+    PANELS[name] = Panel(name, width, height, bits, planes, colors, family, ram, partial, gray,
+                         init, tuple(init_args), display, clear, tuple(clear_args), sleep)
+    return PANELS[name]
+
+
+def get(name):
+    """Registry entry of a panel by driver name, e.g. 'epd2in13_V3'"""
+    try:
+        return PANELS[name]
+    except KeyError:
+        raise ValueError('Unknown e-Paper panel: %s' % name)
+
+
+def of(epd):
+    """Registry entry of a driver's EPD instance"""
+    return get(type(epd).__module__.rsplit('.', 1)[-1])
+
+
+def arguments(epd, args):
+    """`args` (init_args or clear_args of a panel) with each Attr resolved on `epd`"""
+    return tuple(getattr(epd, arg.name) if isinstance(arg, Attr) else arg for arg in args)
+
+
+def create(name):
+    """Import the driver of a registered panel and return a new EPD instance
+
+    The backend is told the panel's size and controller family, so the
+    simulator decodes and times it like the real one.
+    """
+    panel = get(name)
+    epd = importlib.import_module('.' + panel.name, __package__).EPD()
+    epdconfig.configure_panel(panel.width, panel.height, panel.family)
+    return epd
+
+
+register('epd1in02', 80, 128, family=UC81XX, ram=(0x10, 0x13), partial='DisplayPartial', init='Init',
+         sleep='Sleep')
+register('epd1in54', 200, 200, family=SSD16XX, ram=(0x24,), init_args=(Attr('lut_full_update'),))
+register('epd1in54_V2', 200, 200, family=SSD16XX, ram=(0x24,), partial='displayPart', init_args=(False,))
+register('epd1in54b', 200, 200, planes=2, colors=BWR, family=UC81XX, ram=(0x10, 0x13))
+register('epd1in54b_V2', 200, 200, planes=2, colors=BWR, family=SSD16XX, ram=(0x24, 0x26))
+register('epd1in54c', 152, 152, planes=2, colors=BWY, family=UC81XX, ram=(0x10, 0x13))
+register('epd1in64g', 168, 168, bits=2, colors=G4, family=UC81XX, ram=(0x10,))
+register('epd2in13', 122, 250, family=SSD16XX, ram=(0x24,), init_args=(Attr('lut_full_update'),))
+register('epd2in13_V2', 122, 250, family=SSD16XX, ram=(0x24,), partial='displayPartial',
+         init_args=(Attr('FULL_UPDATE'),))
+register('epd2in13_V3', 122, 250, family=SSD16XX, ram=(0x24,), partial='displayPartial')
+register('epd2in13b_V3', 104, 212, planes=2, colors=BWR, family=UC81XX, ram=(0x10, 0x13))
+register('epd2in13b_V4', 122, 250, planes=2, colors=BWR, family=SSD16XX, ram=(0x24, 0x26))
+register('epd2in13bc', 104, 212, planes=2, colors=BWR, family=UC81XX, ram=(0x10, 0x13))
+register('epd2in13d', 104, 212, family=UC81XX, ram=(0x10, 0x13), partial='DisplayPartial')
+register('epd2in13g', 122, 250, bits=2, colors=G4, family=UC81XX, ram=(0x10,))
+register('epd2in36g', 168, 296, bits=2, colors=G4, family=UC81XX, ram=(0x10,))
+register('epd2in66', 152, 296, family=SSD16XX, ram=(0x24,), init_args=(0,))
+register('epd2in66b', 152, 296, planes=2, colors=BWR, family=SSD16XX, ram=(0x24, 0x26))
+register('epd2in7', 176, 264, family=UC81XX, ram=(0x10, 0x13), gray=Gray('Init_4Gray'))
+register('epd2in7_V2', 176, 264, family=SSD16XX, ram=(0x24,), partial='display_Partial', gray=Gray('Init_4Gray'))
+register('epd2in7b', 176, 264, planes=2, colors=BWR, family=UC81XX, ram=(0x10, 0x13))
+register('epd2in7b_V2', 176, 264, planes=2, colors=BWR, family=SSD16XX, ram=(0x24, 0x26))
+register('epd2in9', 128, 296, family=SSD16XX, ram=(0x24,), init_args=(Attr('lut_full_update'),))
+register('epd2in9_V2', 128, 296, family=SSD16XX, ram=(0x24,), partial='display_Partial')
+register('epd2in9b_V3', 128, 296, planes=2, colors=BWR, family=UC81XX, ram=(0x10, 0x13))
+register('epd2in9bc', 128, 296, planes=2, colors=BWR, family=UC81XX, ram=(0x10, 0x13))
+register('epd2in9d', 128, 296, family=UC81XX, ram=(0x10, 0x13), partial='DisplayPartial')
+register('epd3in0g', 168, 400, bits=2, colors=G4, family=UC81XX, ram=(0x10,))
+register('epd3in52', 240, 360, family=UC81XX, ram=(0x13,))
+register('epd3in7', 280, 480, family=SSD16XX, ram=(0x24, 0x26), gray=Gray('init', (0,), (0xFF, 0)),
+         init_args=(1,), display='display_1Gray', clear_args=(0xFF, 1))
+register('epd4in01f', 640, 400, bits=4, colors=F7, family=UC81XX, ram=(0x10,))
+register('epd4in2', 400, 300, family=UC81XX, ram=(0x10, 0x13), partial='EPD_4IN2_PartialDisplay',
+         gray=Gray('Init_4Gray'))
+register('epd4in2b_V2', 400, 300, planes=2, colors=BWR, family=UC81XX, ram=(0x10, 0x13))
+register('epd4in2bc', 400, 300, planes=2, colors=BWR, family=UC81XX, ram=(0x10, 0x13))
+register('epd4in37g', 512, 368, bits=2, colors=G4, family=UC81XX, ram=(0x10,))
+register('epd5in65f', 600, 448, bits=4, colors=F7, family=UC81XX, ram=(0x10,))
+register('epd5in83', 600, 448, bits=2, family=UC81XX, ram=(0x10,))
+register('epd5in83_V2', 648, 480, family=UC81XX, ram=(0x10, 0x13))
+register('epd5in83b_V2', 648, 480, planes=2, colors=BWR, family=UC81XX, ram=(0x10, 0x13))
+register('epd5in83bc', 600, 448, planes=2, colors=BWR, family=UC81XX, ram=(0x10,))
+register('epd7in3f', 800, 480, bits=4, colors=F7, family=UC81XX, ram=(0x10,))
+register('epd7in3g', 800, 480, bits=2, colors=G4, family=UC81XX, ram=(0x10,))
+register('epd7in5', 640, 384, bits=4, family=UC81XX, ram=(0x10,))
+register('epd7in5_HD', 880, 528, family=SSD16XX, ram=(0x24,))
+register('epd7in5_V2', 800, 480, family=UC81XX, ram=(0x13,))
+register('epd7in5_V2_fast', 800, 480, family=UC81XX, ram=(0x13,))
+register('epd7in5b_HD', 880, 528, planes=2, colors=BWR, family=SSD16XX, ram=(0x24, 0x26))
+register('epd7in5b_V2', 800, 480, planes=2, colors=BWR, family=UC81XX, ram=(0x10, 0x13))
+register('epd7in5bc', 640, 384, planes=2, colors=BWR, family=UC81XX, ram=(0x10,))
@@ -0,0 +1,29 @@
+/*****************************************************************************
+* | File        :   sysfs_software_spi_buffer.c
+* | Function    :   Whole-buffer transfer for the Jetson Nano software SPI
+* | Info        :
+*----------------
+* | This version:   V1.0
+* | Date        :   2026-10-18
+* | Info        :
+******************************************************************************
+* sysfs_software_spi.so bit-bangs one byte per SYSFS_software_spi_transfer()
+* call, so a frame sent from Python costs one ctypes call per byte. This
+* helper runs that loop in C: epdconfig.JetsonNano passes it the library's
+* transfer function and the whole buffer, and uses it when it finds
+* sysfs_software_spi_buffer.so next to epdconfig.py. Build it on the Jetson:
+*
+*     gcc -O2 -shared -fPIC -o sysfs_software_spi_buffer.so sysfs_software_spi_buffer.c
+******************************************************************************/
+#include <stddef.h>
+#include <stdint.h>
+
+typedef uint8_t (*transfer_fn)(uint8_t value);
+
+void SYSFS_software_spi_transfer_buffer(transfer_fn transfer, const uint8_t *buf, size_t len)
+{
+    size_t i;
+
+    for (i = 0; i < len; i++)
+        transfer(buf[i]);
+}
@@ -0,0 +1,130 @@
+# -*- coding:utf-8 -*-
+
+import threading
+from contextlib import contextmanager
+
+from waveshare_epd import panels
+
+# `loaded_args` after a partial refresh: the driver loaded its own partial
+# waveform, so the next wake() for a full refresh has to run init() again
+PARTIAL = ('partial',)
+
+# Keeps the panel controller initialized between frames and puts it into deep
+# sleep only once no frame has been drawn for idle_timeout seconds.
+#
+# init() costs a hardware reset, a software reset and a LUT upload, sleep()
+# a 2 s delay before the GPIOs are released, so doing both around every frame
+# dominates a short rotation. Deep sleep loses the registers and the LUT, as
+# does anything that goes wrong halfway through a refresh, so `registers_valid`
+# tracks whether the next frame can skip init().
+#
+# The controller is initialized with the panel's init method and init_args from
+# waveshare_epd.panels, unless `init_args` is given. With `gray` it is
+# initialized for the panel's 4-gray mode instead (panels.Gray).
+class PowerManager:
+    def __init__(self, epd, idle_timeout, init_args=None, gray=False):
+        self.epd = epd
+        self.idle_timeout = idle_timeout
+        panel = panels.of(epd)
+        if gray and panel.gray is None:
+            raise ValueError("%s has no 4-gray mode" % panel.name)
+        self.gray = gray
+        self.init_method = panel.gray.init if gray else panel.init
+        self.sleep_method = panel.sleep
+        if init_args is None:
+            init_args = panels.arguments(epd, panel.gray.init_args if gray else panel.init_args)
+        self.init_args = tuple(init_args)
+        self.registers_valid = False
+        # arguments of the init() that loaded the current registers/LUT
+        self.loaded_args = None
+        self.lock = threading.RLock()
+        self.timer = None
+
+    def _cancel_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    # make sure the controller is initialized for `init_args` (defaults to the
+    # ones given to the constructor), re-running init() only when needed
+    def wake(self, *init_args):
+        init_args = init_args or self.init_args
+        with self.lock:
+            self._cancel_timer()
+            if not self.registers_valid or self.loaded_args != init_args:
+                if getattr(self.epd, self.init_method)(*init_args) == -1:
+                    raise RuntimeError("e-Paper init failed")
+                self.registers_valid = True
+                self.loaded_args = init_args
+            return self.epd
+
+    # start the idle countdown; a timeout of 0 or less sleeps right away
+    def release(self):
+        with self.lock:
+            self._cancel_timer()
+            if self.idle_timeout <= 0:
+                self.sleep()
+                return
+            self.timer = threading.Timer(self.idle_timeout, self.sleep)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def sleep(self):
+        with self.lock:
+            self._cancel_timer()
+            if self.registers_valid:
+                getattr(self.epd, self.sleep_method)()
+                self.registers_valid = False
+                self.loaded_args = None
+
+    # forget the controller state, e.g. after a driver call that was
+    # interrupted or that loaded a different LUT behind our back
+    def invalidate(self):
+        with self.lock:
+            self.registers_valid = False
+            self.loaded_args = None
+
+    # hold the panel awake for the duration of the block:
+    #     with power.session() as epd:
+    #         epd.display(...)
+    @contextmanager
+    def session(self, *init_args):
+        with self.lock:
+            epd = self.wake(*init_args)
+            try:
+                yield epd
+            except BaseException:
+                self.invalidate()
+                raise
+            finally:
+                self.release()
+
+    # like session(), for a driver's partial refresh: the controller only has
+    # to be initialized, in whatever mode, as the partial refresh method loads
+    # its own waveform. Drivers that load it in a separate method name it as
+    # `init`, called with `init_args`, which runs unless the registers are
+    # already PARTIAL. Marks the registers as PARTIAL afterwards.
+    @contextmanager
+    def partial_session(self, init=None, *init_args):
+        with self.lock:
+            if init is not None and not (self.registers_valid and self.loaded_args == PARTIAL):
+                self._cancel_timer()
+                self.registers_valid = False
+                if getattr(self.epd, init)(*init_args) == -1:
+                    raise RuntimeError("e-Paper init failed")
+                self.registers_valid = True
+                epd = self.epd
+            elif self.registers_valid:
+                self._cancel_timer()
+                epd = self.epd
+            else:
+                epd = self.wake()
+            try:
+                yield epd
+            except BaseException:
+                self.invalidate()
+                raise
+            else:
+                self.loaded_args = PARTIAL
+            finally:
+                self.release()
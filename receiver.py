@@ -3,15 +3,23 @@
 
 import os, sys, configparser, random, time, logging, io, math, sqlite3, threading, datetime
 from enum import Enum
-from PIL import Image, ImageFont
-from waveshare_epd import epd2in13_V3
+from PIL import Image, ImageFont, UnidentifiedImageError
+from waveshare_epd import dither, epdconfig, panels
 from paho.mqtt import client as mqtt_client
 from queue import Queue
 
 import display
+from power import PowerManager
+from refresh import Screen
+from render_cache import RenderCache
 
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
 
+# what decoding a received image can raise: too large, not an image Pillow
+# knows, truncated or otherwise corrupt data, or a mode or size Pillow cannot
+# process
+IMAGE_ERRORS = (display.ImageTooLarge, UnidentifiedImageError, OSError, ValueError)
+
 def resolve_relative_path(path):
     if path.startswith("/"):
         return path
@@ -36,6 +44,27 @@ FIRST_RECONNECT_DELAY = config.get("mqtt", "first_connect_delay")
 RECONNECT_RATE = int(config.get("mqtt", "reconnect_rate"))
 MAX_RECONNECT_DELAY = config.get("mqtt", "max_reconnect_delay")
 
+spi_speed_hz = config.getint("display", "spi_speed_hz", fallback=epdconfig.SPI_SPEED_HZ)
+panel_name = config.get("display", "panel", fallback="epd2in13_V3")
+display_backend = os.environ.get("EPD_BACKEND") or config.get("display", "backend", fallback="hardware")
+idle_sleep_s = config.getfloat("display", "idle_sleep_s", fallback=60)
+full_refresh_every = config.getint("display", "full_refresh_every", fallback=10)
+partial_max = config.getfloat("display", "partial_max", fallback=0.5)
+# images used to be drawn in landscape and turned upside down, i.e. 270;
+# square panels were never turned to landscape, which leaves 180
+panel = panels.get(panel_name)
+default_orientation = 180 if panel.width == panel.height else 270
+orientation = (config.getint("display", "orientation", fallback=default_orientation),
+               config.getboolean("display", "mirror", fallback=False))
+dither_mode = config.get("display", "dither", fallback="floyd-steinberg")
+gray_mode = config.getboolean("display", "gray", fallback=False)
+render_cache_entries = config.getint("display", "render_cache_entries", fallback=32)
+render_cache_bytes = config.getint("display", "render_cache_bytes", fallback=4 * 1024 * 1024)
+max_image_pixels = config.getint("display", "max_image_pixels", fallback=display.MAX_IMAGE_PIXELS)
+max_image_bytes = config.getint("display", "max_image_bytes", fallback=display.MAX_IMAGE_BYTES)
+if config.getboolean("display", "instrument", fallback=False):
+    epdconfig.instrument()
+
 class SystemState(Enum):
     STARTUP = 0
     QR_CODE = 1
@@ -50,28 +79,55 @@ def next_drawing_available(cur):
     count = res.fetchone()[0]
     return int(count) > 0
 
+def log_display_timing():
+    logging.debug("Refreshes: %s, render cache: %s", screen.counts, render_cache.counts)
+    report = epdconfig.instrumentation_report()
+    if report is not None:
+        logging.info("Display timing:\n%s", report)
+        epdconfig.reset_instrumentation()
+
+# drawings can come with their own dither mode, kept in a column added to
+# databases from before it
+def add_dither_column(cur):
+    columns = [column[1] for column in cur.execute("PRAGMA table_info(`drawings`)")]
+    if "dither" not in columns:
+        cur.execute("ALTER TABLE `drawings` ADD COLUMN `dither` TEXT")
+
 def display_qr_from_disk():
     try:
-        image = Image.open(cur_qr_path)
+        with open(cur_qr_path, 'rb') as f:
+            payload = f.read()
     except:
         logging.error("Unable to open QR code image. Something wrong with state.")
         return
-    display.image_full(image, epd)
+    # the QR code is shown again whenever no drawing is queued
+    try:
+        render_cache.pin('qr', display.image_from_bytes(payload, screen, render_cache))
+    except IMAGE_ERRORS as error:
+        logging.error("Unable to display QR code image: %s", error)
+        return
+    log_display_timing()
 
 def display_next_drawing(cur, con):
     global last_drawing_displayed_id
-    res = cur.execute("SELECT * FROM `drawings` WHERE `displayed_time` IS NULL AND `removed` = 0 ORDER BY `created_time` ASC LIMIT 1;")
+    res = cur.execute("SELECT `id`, `data`, `dither` FROM `drawings` WHERE `displayed_time` IS NULL AND `removed` = 0 ORDER BY `created_time` ASC LIMIT 1;")
     row = res.fetchone()
     if row == None:
         logging.error("Couldn't display next drawing because none are available. Something's wrong with the state.")
         return
-    display.image_full(Image.open(io.BytesIO(row[4])), epd)
-    last_drawing_displayed_id = row[0]
+    drawing_id, data, drawing_dither = row
+    try:
+        display.image_from_bytes(data, screen, render_cache, drawing_dither)
+    except IMAGE_ERRORS as error:
+        # stored before the limits were set, or corrupt; marked displayed below so it is skipped
+        logging.error("Not displaying drawing %s: %s", drawing_id, error)
+    log_display_timing()
+    last_drawing_displayed_id = drawing_id
     
     # mark the selected drawing as having been displayed
     cur.execute(
         "UPDATE `drawings` SET `displayed_time` = datetime('now') WHERE `id` = ?",
-        (str(row[0]), )
+        (str(drawing_id), )
     )
     con.commit()
 
@@ -121,36 +177,53 @@ def mqtt_connect():
         def on_message(client, userdata, message):
             global system_state, cur, con, last_drawing_displayed_id
             if message.topic == "epaper/cmnd/update-qr":
+                try:
+                    display.open_image(message.payload)
+                    # If we are currently showing the QR code or have just
+                    # started up, update the screen now; data that only fails
+                    # to decode here is not stored either
+                    if system_state in (SystemState.QR_CODE, SystemState.STARTUP):
+                        display.image_from_bytes(message.payload, screen, render_cache)
+                except IMAGE_ERRORS as error:
+                    logging.error("Ignoring QR code update: %s", error)
+                    return
+                if system_state == SystemState.STARTUP:
+                    system_state = SystemState.QR_CODE
                 # Overwrite the current QR code on disk
                 f = open(cur_qr_path, 'wb')
                 f.write(message.payload)
                 f.close()
                 logging.info("Updated locally stored QR code")
-
-                # If we are currently showing the QR code or have just started
-                # up, update the screen now
-                if system_state == SystemState.QR_CODE:
-                    display.image_from_bytes(message.payload, epd)
-                elif system_state == SystemState.STARTUP:
-                    system_state = SystemState.QR_CODE
-                    display.image_from_bytes(message.payload, epd)
+                render_cache.pin('qr', display.frame_key(message.payload, screen))
             elif message.topic.startswith("epaper/cmnd/image/add/"):
-                # save the image locally
-                drawing_id = int(message.topic[message.topic.rfind("/") + 1:])
+                # save the image locally; the topic is
+                # epaper/cmnd/image/add/<n>[/<dither mode>]
+                fields = message.topic[len("epaper/cmnd/image/add/"):].split("/")
+                drawing_id = int(fields[0])
+                drawing_dither = fields[1] if len(fields) > 1 else None
+                if drawing_dither is not None and drawing_dither not in dither.MODES:
+                    logging.error("Ignoring drawing %d: unknown dither mode %s", drawing_id, drawing_dither)
+                    return
+                try:
+                    display.open_image(message.payload)
+                    if system_state == SystemState.QR_CODE:
+                        display.image_from_bytes(message.payload, screen, render_cache, drawing_dither)
+                except IMAGE_ERRORS as error:
+                    logging.error("Ignoring drawing %d: %s", drawing_id, error)
+                    return
                 if system_state == SystemState.QR_CODE:
-                    # if we're waiting for a drawing, show it immediately and then save it already marked as displaye
+                    # if we're waiting for a drawing, it was shown immediately; save it already marked as displaye
                     system_state = SystemState.DRAWING
                     last_drawing_displayed_id = drawing_id
-                    display.image_from_bytes(message.payload, epd)
                     cur.execute(
-                        "INSERT INTO `drawings` (id, created_time, displayed_time, removed, data) VALUES (?, datetime('now'), datetime('now'), 0, ?)",
-                        (drawing_id, message.payload)
+                        "INSERT INTO `drawings` (id, created_time, displayed_time, removed, data, dither) VALUES (?, datetime('now'), datetime('now'), 0, ?, ?)",
+                        (drawing_id, message.payload, drawing_dither)
                     )
                 else:
                     # just save it
                     cur.execute(
-                        "INSERT INTO `drawings` (id, created_time, removed, data) VALUES (?, datetime('now'), 0, ?)",
-                        (drawing_id, message.payload)
+                        "INSERT INTO `drawings` (id, created_time, removed, data, dither) VALUES (?, datetime('now'), 0, ?, ?)",
+                        (drawing_id, message.payload, drawing_dither)
                     )
                 con.commit()
             elif message.topic == "epaper/cmnd/image/remove":
@@ -173,9 +246,9 @@ def mqtt_connect():
                 if payload_str == "true":
                     # Immediately enter blanked state
                     system_state = SystemState.BLANKED
-                    epd.init()
-                    epd.Clear(0xFF)
-                    epd.sleep()
+                    screen.clear()
+                    # nothing else is going to be drawn while blanked
+                    power.sleep()
                 elif payload_str == "false":
                     if(next_drawing_available(cur)):
                         system_state = SystemState.DRAWING
@@ -189,7 +262,7 @@ def mqtt_connect():
 
         if rc != 0:
             print("Failed to connect to MQTT broker: return code %d\n", rc)
-            display.text("Failed to connect to MQTT broker: return code " + str(rc), epd, hack16)
+            display.text("Failed to connect to MQTT broker: return code " + str(rc), screen, hack16)
             return
 
         # set up subscription
@@ -227,7 +300,7 @@ def mqtt_connect():
             client.connect(broker, port)
             return client
         except Exception as error:
-            display.text("Connection failed\n" + str(error), epd, hack16)
+            display.text("Connection failed\n" + str(error), screen, hack16)
             time.sleep(RECONNECT_RATE)
             # ... then loop again and try to connect
             continue
@@ -236,23 +309,29 @@ def mqtt_connect():
 # ==== Start up epaper display ====
 try:
     print("Starting up display")
-    epd = epd2in13_V3.EPD()
-    epd.init()
-    epd.Clear(0xFF)
+    epdconfig.select_backend(display_backend)
+    epdconfig.set_spi_speed(spi_speed_hz)
+    epd = panels.create(panel_name)
+    power = PowerManager(epd, idle_sleep_s, gray=gray_mode)
+    screen = Screen(power, full_refresh_every, partial_max, orientation, dither_mode)
+    render_cache = RenderCache(render_cache_entries, render_cache_bytes)
+    display.set_image_limits(max_image_pixels, max_image_bytes)
+    screen.clear()
     # don't go to sleep until init is complete
-    # epd.sleep()
 
     # read font files
     hack16 = ImageFont.truetype("res/Hack.ttf", 16)
 except IOError as e:
     logging.error(e)
 print("Display ready")
-display.text("Display ready", epd, hack16)
+display.text("Display ready", screen, hack16)
 
 try:
     # === Connect to database ===
     con = sqlite3.connect(database_file)
     cur = con.cursor()
+    add_dither_column(cur)
+    con.commit()
 
     # Start thread for choosing a new image every 5 minutes
     timer_thread = threading.Thread(target=image_timer_loop, args=(10,))
@@ -266,3 +345,4 @@ finally:
     print("Waiting for timer thread to exit!")
     timer_thread.join()
     con.close()
+    power.sleep()
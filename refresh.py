@@ -0,0 +1,176 @@
+# -*- coding:utf-8 -*-
+
+import collections
+import hashlib
+import logging
+
+from waveshare_epd import dither, packing, panels
+
+# Differential refresh: remembers the packed frame that is on the panel, XORs
+# every new frame against it and, for panels whose driver can do a partial
+# refresh, only redraws what changed. A partial refresh skips the flashing of
+# a full one and most of its wall time, but leaves some ghosting behind, so
+# every `full_every` partials a full refresh is forced.
+#
+# E-paper keeps its image without power, so a frame whose digest matches the
+# one on the glass is not sent at all, whatever the panel.
+
+# How to drive a panel's partial refresh:
+#   base    method for a full refresh that also loads the "old" RAM the partial
+#           waveform compares against, None to use display()
+#   send    function(epd, new, old, rect) drawing the packed frame `new` over
+#           `old`; rect is the (x0, y0, x1, y1) pixel box of the changes
+#   init    method loading the partial waveform before the first partial
+#           refresh, None when `send` loads it itself
+#   init_args  arguments of `init`, as in waveshare_epd.panels (panels.Attr
+#           for driver attributes); the full refresh after a run of partial
+#           ones initializes the controller for the panel's full waveform again
+PartialMode = collections.namedtuple('PartialMode', 'base send init init_args',
+                                     defaults=(None, ()))
+
+def _whole_frame(method):
+    # partial refresh methods that take the whole new frame
+    def send(epd, new, old, rect):
+        getattr(epd, method)(new)
+    return send
+
+def _windowed(method):
+    # partial refresh methods taking the frame and the rectangle to send
+    def send(epd, new, old, rect):
+        getattr(epd, method)(new, rect)
+    return send
+
+def _window_2in7_V2(epd, new, old, rect):
+    x0, y0, x1, y1 = rect
+    epd.display_Partial(new, x0, y0, x1, y1)
+
+def _window_4in2(epd, new, old, rect):
+    x0, y0, x1, y1 = rect
+    epd.EPD_4IN2_PartialDisplay(x0, y0, x1, y1, new)
+
+PARTIAL_MODES = {
+    'epd2in13_V3': PartialMode('displayPartBaseImage', _windowed('displayPartial')),
+    'epd2in13_V2': PartialMode('displayPartBaseImage', _windowed('displayPartial'),
+                               'init', (panels.Attr('PART_UPDATE'),)),
+    'epd1in54_V2': PartialMode('displayPartBaseImage', _windowed('displayPart'), 'init', (True,)),
+    'epd2in66': PartialMode(None, _windowed('display'), 'init', (1,)),
+    'epd2in9_V2': PartialMode('display_Base', _windowed('display_Partial')),
+    'epd2in7_V2': PartialMode('display_Base', _window_2in7_V2),
+    'epd2in13d': PartialMode(None, _whole_frame('DisplayPartial')),
+    'epd2in9d': PartialMode(None, _whole_frame('DisplayPartial')),
+    'epd4in2': PartialMode(None, _window_4in2, 'init_Partial'),
+}
+
+# digest identifying a frame by the content of all its buffers
+def frame_digest(buffers):
+    digest = hashlib.blake2b(digest_size=16)
+    for buf in buffers:
+        digest.update(bytes(buf))
+        digest.update(b'\0')
+    return digest.digest()
+
+# smallest box around a list of rectangles
+def bounding(rects):
+    return (min(r[0] for r in rects), min(r[1] for r in rects),
+            max(r[2] for r in rects), max(r[3] for r in rects))
+
+class Screen:
+    # `power` is the power.PowerManager of the panel. A refresh is partial when
+    # the changed bytes are at most `partial_max` of the frame. `orientation`
+    # is the (rotation, mirror) display.py turns the images it draws by, see
+    # packing.transpose_method(). `dither_mode` is how display.py dithers the
+    # images it draws unless told otherwise, one of waveshare_epd.dither.MODES.
+    # When the power manager runs the panel in its 4-gray mode, frames are
+    # getbuffer_4Gray() buffers and always get a full refresh.
+    def __init__(self, power, full_every=10, partial_max=0.5, orientation=(0, False),
+                 dither_mode='floyd-steinberg'):
+        self.power = power
+        self.epd = power.epd
+        self.panel = panels.of(self.epd)
+        packing.transpose_method(*orientation)
+        self.orientation = tuple(orientation)
+        dither.check(dither_mode)
+        self.dither_mode = dither_mode
+        self.gray = power.gray
+        self.mode = None if self.gray else PARTIAL_MODES.get(self.panel.name)
+        self.full_every = full_every
+        self.partial_max = partial_max
+        # packed frame on the panel, None when unknown
+        self.frame = None
+        # digest of all frame buffers on the glass, None when unknown
+        self.digest = None
+        # partial refreshes since the last full one
+        self.partials = 0
+        # True while the panel shows what Clear() left on it
+        self.blank = False
+        self.counts = {'full': 0, 'partial': 0, 'unchanged': 0, 'blank': 0}
+
+    # draw the frame buffers epd.display() takes, redrawing as little as possible
+    def display(self, buffers):
+        digest = frame_digest(buffers)
+        with self.power.lock:
+            if digest == self.digest:
+                logging.debug("Frame already on screen, refresh skipped")
+                self.counts['unchanged'] += 1
+                return
+            self._display(buffers)
+            self.digest = digest
+
+    def _display(self, buffers):
+        if self.mode is None or len(buffers) != 1:
+            self._full(buffers)
+            return
+        new = bytes(buffers[0])
+        if self.frame is None or len(self.frame) != len(new):
+            self._full(buffers)
+            return
+        rects = packing.dirty_rects(self.frame, new, self.epd.width, self.epd.height)
+        if not rects:
+            self.counts['unchanged'] += 1
+            return
+        box = bounding(rects)
+        dirty = packing.linewidth(box[2] - box[0]) * (box[3] - box[1])
+        if self.partials >= self.full_every or dirty > self.partial_max * len(new):
+            self._full(buffers)
+            return
+        logging.debug("Partial refresh of %s (%d bytes changed)", box, dirty)
+        old, self.frame = self.frame, None
+        self.digest = None
+        self.blank = False
+        init_args = panels.arguments(self.epd, self.mode.init_args)
+        with self.power.partial_session(self.mode.init, *init_args) as epd:
+            self.mode.send(epd, new, old, box)
+        self.frame = new
+        self.partials += 1
+        self.counts['partial'] += 1
+
+    def _full(self, buffers):
+        self.frame = None
+        self.digest = None
+        self.blank = False
+        with self.power.session() as epd:
+            if self.mode is not None and self.mode.base is not None:
+                getattr(epd, self.mode.base)(*buffers)
+            elif self.gray:
+                epd.display_4Gray(*buffers)
+            else:
+                getattr(epd, self.panel.display)(*buffers)
+        if len(buffers) == 1:
+            self.frame = bytes(buffers[0])
+        self.partials = 0
+        self.counts['full'] += 1
+
+    # blank the panel with the driver's Clear() (the panel's clear method, with
+    # the clear_args of the mode the panel is in), unless it already is blank
+    def clear(self):
+        with self.power.lock:
+            if self.blank:
+                self.counts['blank'] += 1
+                return
+            self.frame = None
+            self.digest = None
+            clear_args = self.panel.gray.clear_args if self.gray else self.panel.clear_args
+            with self.power.session() as epd:
+                getattr(epd, self.panel.clear)(*panels.arguments(epd, clear_args))
+            self.blank = True
+            self.partials = 0
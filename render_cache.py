@@ -0,0 +1,76 @@
+# -*- coding:utf-8 -*-
+
+import collections
+import hashlib
+import threading
+
+# Packed frames the receiver has rendered before, so an image that is shown
+# again (the QR code, every few seconds) skips decoding, letterboxing and
+# packing. Entries are keyed by what went into the render: a hash of the
+# encoded image plus the panel, orientation and dither mode. The least
+# recently used entries are dropped once there are more than `max_entries` or
+# their buffers take more than `max_bytes`; pinned entries are never dropped.
+
+# cache key of the frame `payload` renders to
+def key(payload, panel, orientation, dither):
+    return (hashlib.sha256(payload).digest(), panel, tuple(orientation), dither)
+
+class RenderCache:
+    def __init__(self, max_entries=32, max_bytes=4 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> tuple of frame buffers, least recently used first
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        # name -> key of an entry that is never evicted, e.g. 'qr'
+        self.pins = {}
+        self.lock = threading.Lock()
+        self.counts = {'hit': 0, 'miss': 0, 'evicted': 0}
+
+    # the frame buffers stored for `key`, None if there are none
+    def get(self, key):
+        with self.lock:
+            buffers = self.entries.get(key)
+            if buffers is None:
+                self.counts['miss'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counts['hit'] += 1
+            return buffers
+
+    # store the frame buffers rendered for `key`, returns them as immutable bytes
+    def put(self, key, buffers):
+        buffers = tuple(bytes(buf) for buf in buffers)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= _size(old)
+            self.entries[key] = buffers
+            self.size += _size(buffers)
+            self._evict()
+        return buffers
+
+    # keep the entry for `key` (now or once it is stored) under `name`,
+    # releasing the one pinned under that name before
+    def pin(self, name, key):
+        with self.lock:
+            self.pins[name] = key
+            self._evict()
+
+    def unpin(self, name):
+        with self.lock:
+            self.pins.pop(name, None)
+            self._evict()
+
+    def _evict(self):
+        pinned = set(self.pins.values())
+        for key in list(self.entries):
+            if len(self.entries) <= self.max_entries and self.size <= self.max_bytes:
+                break
+            if key in pinned:
+                continue
+            self.size -= _size(self.entries.pop(key))
+            self.counts['evicted'] += 1
+
+def _size(buffers):
+    return sum(len(buf) for buf in buffers)
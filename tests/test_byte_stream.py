@@ -0,0 +1,99 @@
+# -*- coding:utf-8 -*-
+
+# Conformance test for the drivers' frame uploads: every driver's init(),
+# Clear() and display*() methods run against epdconfig.Recorder, which compiles
+# the SPI traffic into a command program (opcodes with their whole payload, pin
+# writes, delays, BUSY waits). The SHA-256 of each program must match the one
+# in byte_streams.json, recorded from the drivers as they were before frames
+# were sent as bulk writes, so the panels receive exactly the same bytes.
+#
+#     python -m pytest tests
+#     python tests/test_byte_stream.py --record    rewrite byte_streams.json
+
+import glob, hashlib, inspect, json, logging, os, sys, unittest
+
+TESTS_DIR = os.path.dirname(os.path.realpath(__file__))
+LIB_DIR = os.path.join(os.path.dirname(TESTS_DIR), 'lib')
+EXPECTED = os.path.join(TESTS_DIR, 'byte_streams.json')
+sys.path.insert(0, LIB_DIR)
+
+os.environ.setdefault('EPD_BACKEND', 'null')
+
+from PIL import Image, ImageDraw
+from waveshare_epd import epdconfig
+
+DRIVERS = sorted(os.path.basename(path)[:-3]
+                 for path in glob.glob(os.path.join(LIB_DIR, 'waveshare_epd', 'epd*.py'))
+                 if not path.endswith('epdconfig.py'))
+
+def image(width, height, mode):
+    # a frame with black, white and, on gray panels, gray areas
+    im = Image.new(mode, (width, height), 255)
+    draw = ImageDraw.Draw(im)
+    draw.rectangle((3, 5, width // 2, height // 3), fill=0)
+    draw.ellipse((width // 3, height // 2, width - 4, height - 2), fill=128 if mode == 'L' else 0)
+    draw.line((0, 0, width - 1, height - 1), fill=0)
+    return im
+
+def required(method):
+    return [p for p in list(inspect.signature(method).parameters.values())[1:]
+            if p.default is p.empty]
+
+def calls(epd):
+    # (name, frame getter or None) of the methods recorded for a driver: the
+    # ones without required arguments, display*() with a frame per argument
+    for name, method in inspect.getmembers(type(epd), inspect.isfunction):
+        if name in ('init', 'Clear') and not required(method):
+            yield name, None
+        elif name.startswith('display') and required(method):
+            gray = '4gray' in name.lower()
+            getter = getattr(epd, 'getbuffer_4Gray' if gray else 'getbuffer', None)
+            if getter is not None:
+                yield name, lambda getter=getter, gray=gray: getter(
+                    image(epd.width, epd.height, 'L' if gray else 'RGB'))
+
+def record(name, methods=None):
+    # {method: sha256 of its program} for one driver. With `methods` only those
+    # are recorded and their errors propagate; without, as for --record, the
+    # methods that raise for these arguments are left out
+    module = __import__('waveshare_epd.' + name, fromlist=['EPD'])
+    programs = {}
+    for method, getter in calls(module.EPD()):
+        if methods is not None and method not in methods:
+            continue
+        epd = module.EPD()
+        args = []
+        if getter is not None:
+            frame = getter()
+            # a separate, writable copy per plane
+            args = [bytearray(frame) for _ in required(getattr(type(epd), method))]
+        try:
+            program = epdconfig.record_program(getattr(epd, method), *args)
+        except Exception:
+            if methods is not None:
+                raise
+            continue
+        programs[method] = hashlib.sha256(program).hexdigest()
+    return programs
+
+def record_all():
+    return {name: record(name) for name in DRIVERS}
+
+class ByteStreamTest(unittest.TestCase):
+    def test_drivers_send_the_recorded_byte_streams(self):
+        with open(EXPECTED) as f:
+            expected = json.load(f)
+        for name, programs in sorted(expected.items()):
+            with self.subTest(driver=name):
+                actual = record(name, programs)
+                for method, digest in programs.items():
+                    self.assertEqual(actual.get(method), digest, "%s.%s" % (name, method))
+
+if __name__ == '__main__':
+    logging.disable(logging.CRITICAL)
+    if '--record' in sys.argv:
+        with open(EXPECTED, 'w') as f:
+            json.dump(record_all(), f, indent=1, sort_keys=True)
+            f.write('\n')
+    else:
+        unittest.main()
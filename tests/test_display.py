@@ -0,0 +1,74 @@
+# -*- coding:utf-8 -*-
+
+# Decoding of received images: display.image_from_bytes() on the null backend
+# for images the bounded decode has to handle besides plain RGB and L ones.
+#
+#     python -m pytest tests
+
+import io, logging, os, struct, sys, unittest
+
+TESTS_DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'lib'))
+sys.path.insert(0, ROOT_DIR)
+
+os.environ.setdefault('EPD_BACKEND', 'null')
+
+from PIL import Image
+from waveshare_epd import panels
+
+import display
+from power import PowerManager
+from refresh import Screen
+
+def encoded(image, format='PNG'):
+    f = io.BytesIO()
+    image.save(f, format)
+    return f.getvalue()
+
+def screen(name='epd2in13_V3', gray=False):
+    return Screen(PowerManager(panels.create(name), 60, gray=gray))
+
+class DecodeTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_16_bit_grayscale(self):
+        # I;16 has no reduce(); larger than twice the canvas so decode() would
+        # reduce it
+        image = Image.linear_gradient('L').resize((1000, 600)).convert('I')
+        payload = encoded(image.point(lambda value: value * 256).convert('I;16'))
+        self.assertEqual(Image.open(io.BytesIO(payload)).mode, 'I;16')
+        display.image_from_bytes(payload, screen())
+
+    def test_header_beyond_pillow_limit(self):
+        # a BMP header announcing 20000 x 20000 pixels and no pixel data
+        header = struct.pack('<2sIHHI', b'BM', 62, 0, 0, 62)
+        info = struct.pack('<IiiHHIIiiII', 40, 20000, 20000, 1, 1, 0, 0, 0, 0, 0, 0)
+        with self.assertRaises(display.ImageTooLarge):
+            display.image_from_bytes(header + info + bytes(8), screen())
+
+    def test_narrow_image(self):
+        # letterboxed to less than a pixel wide
+        display.image_from_bytes(encoded(Image.new('L', (1, 5000), 0)), screen())
+        display.image_from_bytes(encoded(Image.new('L', (5000, 1), 0)), screen())
+
+    def test_4_gray(self):
+        # a gradient comes out in all 4 levels, 4 pixels per byte
+        for name in ('epd2in7', 'epd2in7_V2', 'epd3in7', 'epd4in2'):
+            with self.subTest(panel=name):
+                gray = screen(name, gray=True)
+                width, height = display.canvas_size(gray)
+                for mode in ('threshold', 'ordered', 'floyd-steinberg'):
+                    image = Image.linear_gradient('L').resize((width, height))
+                    buf, = display.frame(image, gray, mode)
+                    self.assertEqual(len(buf), width * height // 4)
+                    self.assertEqual({value >> 6 for value in buf}, {0, 1, 2, 3})
+                gray.display(display.frame(image, gray))
+                self.assertEqual(gray.counts['full'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
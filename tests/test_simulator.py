@@ -0,0 +1,70 @@
+# -*- coding:utf-8 -*-
+
+# The simulator's SSD16xx RAM model: a frame a driver draws with display() is
+# what framebuffer() gives back, whatever RAM window, address counter and data
+# entry mode the driver uses to write it.
+#
+#     python -m pytest tests
+
+import logging, os, sys, unittest
+
+TESTS_DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'lib'))
+sys.path.insert(0, ROOT_DIR)
+
+os.environ.setdefault('EPD_BACKEND', 'null')
+
+from PIL import Image, ImageDraw
+from waveshare_epd import epdconfig, panels
+
+import refresh
+from power import PowerManager
+
+class FramebufferTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.simulator = epdconfig.select_backend('simulator')
+        self.simulator.time_scale = 0
+
+    def tearDown(self):
+        epdconfig.select_backend(os.environ['EPD_BACKEND'])
+        logging.disable(logging.NOTSET)
+
+    def test_display_reads_back(self):
+        for name, panel in sorted(panels.PANELS.items()):
+            if panel.family != panels.SSD16XX or panel.bits != 1:
+                continue
+            with self.subTest(panel=name):
+                epd = panels.create(name)
+                image = Image.new('1', (epd.width, epd.height), 255)
+                draw = ImageDraw.Draw(image)
+                draw.rectangle((3, 5, epd.width // 2, epd.height // 3), fill=0)
+                draw.line((0, 0, epd.width - 1, epd.height - 1), fill=0)
+                frame = epd.getbuffer(image)
+                # init() sets up the RAM addressing
+                self.simulator.reset_log()
+                getattr(epd, panel.init)(*panels.arguments(epd, panel.init_args))
+                getattr(epd, panel.display)(*[frame] * panel.planes)
+                self.assertEqual(bytes(self.simulator.framebuffer()), bytes(frame))
+
+    def test_partial_reads_back(self):
+        # refresh.Screen's partial refreshes only send the changed window
+        for name in sorted(refresh.PARTIAL_MODES):
+            if panels.PANELS[name].family != panels.SSD16XX:
+                continue
+            with self.subTest(panel=name):
+                epd = panels.create(name)
+                screen = refresh.Screen(PowerManager(epd, 60))
+                image = Image.new('1', (epd.width, epd.height), 255)
+                self.simulator.reset_log()
+                screen.display([epd.getbuffer(image)])
+                for i in range(3):
+                    ImageDraw.Draw(image).rectangle((5 + 9 * i, 20 + 7 * i, 12 + 9 * i, 30 + 7 * i), fill=0)
+                    frame = epd.getbuffer(image)
+                    screen.display([frame])
+                    self.assertEqual(bytes(self.simulator.framebuffer()), bytes(frame))
+                self.assertEqual(screen.counts['partial'], 3)
+
+if __name__ == '__main__':
+    unittest.main()